@@ -0,0 +1,41 @@
+import argparse, gzip, io, os, sys, time
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "parsing"))
+import zstandard
+from syntheticCapture import write_capture
+from pcapReader import read_capture
+from fileParse import full_json, native_packets
+from parsedCapture import parse_capture
+
+def best_time(run, repeats: int) -> float:
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Read, /parsefile and parse_capture throughput of a capture uploaded "
+        "as is, gzip and zstd compressed")
+    parser.add_argument("--frames", type=int, default=20000)
+    parser.add_argument("--entities", type=int, default=20)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    stream = io.BytesIO()
+    write_capture(stream, args.frames, args.entities)
+    data = stream.getvalue()
+    captures = {"pcap": data, "pcap.gz": gzip.compress(data, 6), "pcap.zst": zstandard.ZstdCompressor(level=3).compress(data)}
+    stages = {
+        "read": lambda capture: sum(1 for _ in read_capture(io.BytesIO(capture))),
+        "parsefile": lambda capture: sum(1 for _ in map(full_json, native_packets(io.BytesIO(capture)))),
+        "parse_capture": lambda capture: parse_capture(io.BytesIO(capture)),
+    }
+    for stage, run in stages.items():
+        baseline = None
+        for name, capture in captures.items():
+            elapsed = best_time(lambda: run(capture), args.repeats)
+            baseline = baseline or elapsed
+            print(f"{stage:>13} {name:>8}: {len(capture) / 1e6:7.2f} MB uploaded {elapsed * 1000:8.1f} ms "
+                f"{len(data) / elapsed / 1e6:7.1f} MB/sec of capture {elapsed / baseline - 1:+6.1%}")
@@ -0,0 +1,55 @@
+import argparse, os, sys, tempfile, time
+import numpy as np
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "parsing"))
+from syntheticCapture import write_capture
+from captureDatabase import CaptureDatabase
+
+def latency(lookup, keys) -> tuple:
+    # p50 and p99 of lookup(key) in milliseconds
+    samples = []
+    for key in keys:
+        start = time.perf_counter()
+        lookup(key)
+        samples.append((time.perf_counter() - start) * 1e3)
+    return np.percentile(samples, 50), np.percentile(samples, 99)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingest rate of the SQLite capture store and latency of its pages")
+    parser.add_argument("--frames", type=int, default=20000)
+    parser.add_argument("--entities", type=int, default=20)
+    parser.add_argument("--copies", type=int, default=1, help="times the capture is ingested, to grow the database")
+    parser.add_argument("--database", default=None, help="database file, a temporary one by default")
+    parser.add_argument("--lookups", type=int, default=200)
+    args = parser.parse_args()
+
+    # On disk, so captures of tens of millions of rows do not have to fit in memory
+    stream = tempfile.TemporaryFile()
+    write_capture(stream, args.frames, args.entities, 0.01)
+    directory = tempfile.TemporaryDirectory()
+    database = CaptureDatabase(args.database or os.path.join(directory.name, "captures.sqlite3"))
+    for _ in range(args.copies):
+        stream.seek(0)
+        start = time.perf_counter()
+        capture_id = database.ingest(stream)
+        elapsed = time.perf_counter() - start
+        capture = database.capture(capture_id)
+        print(f"capture {capture_id}: {capture['rows']:,} CIGI packets in {elapsed:.2f}s, {capture['rows'] / elapsed:,.0f} CIGI packets/sec")
+    size = sum(os.path.getsize(database.path + suffix) for suffix in ("", "-wal") if os.path.exists(database.path + suffix))
+    print(f"database {size / 1e6:,.0f} MB, {sum(c['rows'] for c in database.captures()):,} rows")
+
+    rng = np.random.default_rng(0)
+    afters = rng.integers(0, capture["packet_count"], args.lookups).tolist()
+    benchmarks = [
+        ("page", {}),
+        ("op_code", {"op_code": 2}),
+        ("entity_id", {"entity_id": args.entities // 2}),
+        ("errors", {"error_only": True}),
+        ("host frames", {"frames": (args.frames // 4, args.frames // 2)}),
+        ("entity + op", {"entity_id": args.entities // 2, "op_code": 2}),
+    ]
+    for name, filters in benchmarks:
+        p50, p99 = latency(lambda after: database.page_packets(capture, after, 100, **filters), afters)
+        print(f"{name:>12}: page of 100 p50 {p50:7.2f}ms p99 {p99:7.2f}ms")
+    packets = database.page_packets(capture, afters[0], 100)
+    p50, p99 = latency(lambda _: database.packet_layers(capture, packets), range(20))
+    print(f"{'layers':>12}: 100 packets p50 {p50:7.2f}ms p99 {p99:7.2f}ms")
@@ -0,0 +1,26 @@
+import argparse, io, os, sys, time
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "parsing"))
+from syntheticCapture import write_capture
+from fileParse import PARSE_ENGINES
+
+def bench(engine: str, capture: bytes) -> float:
+    start = time.perf_counter()
+    count = sum(1 for _ in PARSE_ENGINES[engine](io.BytesIO(capture)))
+    return count / (time.perf_counter() - start)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Packets/sec of each /parsefile engine on a synthetic capture")
+    parser.add_argument("--frames", type=int, default=5000)
+    parser.add_argument("--entities", type=int, default=1)
+    parser.add_argument("--engines", nargs="+", default=list(PARSE_ENGINES))
+    args = parser.parse_args()
+
+    stream = io.BytesIO()
+    write_capture(stream, args.frames, args.entities)
+    capture = stream.getvalue()
+    print(f"{args.frames * 2} packets, {len(capture)} bytes")
+    for engine in args.engines:
+        try:
+            print(f"{engine:>8}: {bench(engine, capture):,.0f} packets/sec")
+        except Exception as error:
+            print(f"{engine:>8}: unavailable ({error})")
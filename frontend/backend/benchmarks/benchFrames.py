@@ -0,0 +1,34 @@
+import argparse, io, os, sys, time
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "parsing"))
+from syntheticCapture import write_capture
+from parsedCapture import frame_dict, parse_capture
+
+def best_time(run, repeats: int) -> float:
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="CIGI packets/sec of parse_capture on dense frames, every packet of a datagram kept")
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--entities", type=int, default=200)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    stream = io.BytesIO()
+    write_capture(stream, args.frames, args.entities)
+    data = stream.getvalue()
+    captures = []
+    elapsed = best_time(lambda: captures.append(parse_capture(io.BytesIO(data))), args.repeats)
+    capture = captures[-1]
+    rows = sum(len(table) for table in capture.tables.values())
+    print(f"{len(capture)} datagrams, {rows} CIGI packets in {capture.frame_count()} host frames")
+    print(f"{'parse':>12}: {elapsed * 1000:8.1f} ms {rows / elapsed:12,.0f} CIGI packets/sec {len(data) / elapsed / 1e6:6.1f} MB/sec")
+    elapsed = best_time(lambda: sum(1 for _ in capture.frames()), args.repeats)
+    print(f"{'frames':>12}: {elapsed * 1000:8.1f} ms {capture.frame_count() / elapsed:12,.0f} frames/sec")
+    elapsed = best_time(lambda: [frame_dict(frame) for frame in capture.frames()], args.repeats)
+    print(f"{'frame_dict':>12}: {elapsed * 1000:8.1f} ms {rows / elapsed:12,.0f} CIGI packets/sec")
@@ -0,0 +1,63 @@
+import argparse, io, os, sys, time
+import numpy as np
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "parsing"))
+from syntheticCapture import write_capture
+from parsedCapture import parse_capture
+
+def latency(lookup, keys) -> tuple:
+    # p50 and p99 of lookup(key) in microseconds
+    samples = []
+    for key in keys:
+        start = time.perf_counter()
+        lookup(key)
+        samples.append((time.perf_counter() - start) * 1e6)
+    return np.percentile(samples, 50), np.percentile(samples, 99)
+
+def scan_entity(capture, entity_id):
+    table = capture.tables["entity_control"]
+    return np.unique(table["packet_index"][table["entity_id"] == entity_id])
+
+def scan_frames(capture, frames):
+    # Packets from the first IG Control of frames[0] up to the one after frames[1]
+    table = capture.tables["ig_control"]
+    selected = np.flatnonzero((table["host_frame_number"] >= frames[0]) & (table["host_frame_number"] <= frames[1]))
+    if not len(selected):
+        return np.empty(0, dtype=np.int64)
+    stop = table["packet_index"][selected[-1] + 1] if selected[-1] + 1 < len(table) else len(capture)
+    return np.arange(table["packet_index"][selected[0]], stop)
+
+def scan_op_code(capture, op_code):
+    return np.unique(np.concatenate([table["packet_index"][table["op_code"] == op_code] for table in capture.tables.values()]))
+
+def scan_errors(capture, _):
+    return np.unique(np.concatenate([table["packet_index"][table["error_mask"] != 0]
+        for name, table in capture.tables.items() if name != 'user_defined']))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Lookup latency of the capture indexes against a scan of the packet tables")
+    parser.add_argument("--frames", type=int, default=50000)
+    parser.add_argument("--entities", type=int, default=10)
+    parser.add_argument("--lookups", type=int, default=200)
+    args = parser.parse_args()
+
+    stream = io.BytesIO()
+    write_capture(stream, args.frames, args.entities)
+    start = time.perf_counter()
+    capture = parse_capture(stream)
+    print(f"{len(capture)} packets parsed in {time.perf_counter() - start:.2f}s, indexes use {capture.index.nbytes:,} bytes")
+
+    rng = np.random.default_rng(0)
+    index = capture.index
+    entity_keys = rng.integers(0, args.entities, args.lookups)
+    frame_keys = [(first, first + 1000) for first in rng.integers(0, max(args.frames - 1000, 1), args.lookups)]
+    op_code_keys = rng.choice([1, 2, 101], args.lookups)
+    benchmarks = [
+        ("op_code", lambda op_code: index.op_codes[op_code], lambda op_code: scan_op_code(capture, op_code), op_code_keys),
+        ("entity_id", lambda entity_id: index.entities[entity_id], lambda entity_id: scan_entity(capture, entity_id), entity_keys),
+        ("host frames", lambda frames: index.frames["host"].ranges(*frames), lambda frames: scan_frames(capture, frames), frame_keys),
+        ("errors", lambda _: index.error_packets(), lambda _: scan_errors(capture, _), range(args.lookups)),
+    ]
+    for name, lookup, scan, keys in benchmarks:
+        indexed_p50, indexed_p99 = latency(lookup, keys)
+        scan_p50, scan_p99 = latency(scan, keys)
+        print(f"{name:>12}: index p50 {indexed_p50:8.1f}us p99 {indexed_p99:8.1f}us | scan p50 {scan_p50:8.1f}us p99 {scan_p99:8.1f}us")
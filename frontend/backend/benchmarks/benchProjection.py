@@ -0,0 +1,42 @@
+import argparse, io, os, sys, time
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "parsing"))
+from syntheticCapture import write_capture
+from decodeProjection import parse_projection
+from fileParse import OUTPUT_FORMATS, native_packets
+
+def best_time(run, repeats: int) -> float:
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="/parsefile decode and serialize time of a whole capture against a graph "
+        "query projected to a few Entity Control fields")
+    parser.add_argument("--frames", type=int, default=5000)
+    parser.add_argument("--entities", type=int, default=20)
+    parser.add_argument("--fields", default="entity_control.lat_xoff,entity_control.lon_yoff,entity_control.alt_zoff")
+    parser.add_argument("--entity-ids", default=None, help="e.g. 3, also keep only the packets of these entities")
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    stream = io.BytesIO()
+    write_capture(stream, args.frames, args.entities)
+    data = stream.getvalue()
+    projection = parse_projection(fields=args.fields, entity_ids=args.entity_ids)
+    runs = {
+        "full": (None, "full"),
+        "compact": (None, "compact"),
+        "projected": (projection, "compact"),
+    }
+    baseline = None
+    for name, (projected, output) in runs.items():
+        serialize = OUTPUT_FORMATS[output]
+        lines = []
+        elapsed = best_time(lambda: lines.append([serialize(layers) for layers in native_packets(io.BytesIO(data), None, projected)]), args.repeats)
+        baseline = baseline or elapsed
+        print(f"{name:>10}: {elapsed * 1000:8.1f} ms {len(lines[-1]):8} packets {sum(map(len, lines[-1])) / 1e6:7.2f} MB "
+            f"{baseline / elapsed:5.1f}x")
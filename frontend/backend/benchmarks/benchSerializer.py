@@ -0,0 +1,40 @@
+import argparse, io, json, os, sys, time
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "parsing"))
+from syntheticCapture import write_capture
+from packet import *
+from fileParse import OUTPUT_FORMATS, full_packet, native_packets
+
+def legacy_full(layers) -> str:
+    # Dict of every layer serialized by the JSON encoder, what full did before the templates
+    return json.dumps(full_packet(layers), cls=CustomJSONEncoder)
+
+def rate(serialize, packets, repeats: int) -> float:
+    # Best packets/sec of repeats runs
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for layers in packets:
+            serialize(layers)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return len(packets) / best
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Packets/sec of the output formats against the dict + JSON encoder path")
+    parser.add_argument("--frames", type=int, default=2000)
+    parser.add_argument("--entities", type=int, default=20)
+    parser.add_argument("--error-rate", type=float, default=0.01)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    stream = io.BytesIO()
+    write_capture(stream, args.frames, args.entities, args.error_rate)
+    packets = list(native_packets(io.BytesIO(stream.getvalue())))
+    mismatches = sum(OUTPUT_FORMATS["full"](layers) != legacy_full(layers) for layers in packets)
+    print(f"{len(packets)} packets, {mismatches} differ from the legacy text")
+
+    legacy_rate = rate(legacy_full, packets, args.repeats)
+    print(f"{'legacy full':>12}: {legacy_rate:10,.0f} packets/sec")
+    for output, serialize in OUTPUT_FORMATS.items():
+        output_rate = rate(serialize, packets, args.repeats)
+        print(f"{output:>12}: {output_rate:10,.0f} packets/sec  {output_rate / legacy_rate:5.1f}x")
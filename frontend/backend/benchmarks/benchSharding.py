@@ -0,0 +1,40 @@
+import argparse, os, sys, tempfile, time
+from functools import partial
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "parsing"))
+from syntheticCapture import write_capture
+from fileParse import native_line, native_packets, full_json
+from shardedParse import ShardedParser
+
+def bench_serial(capture) -> float:
+    capture.seek(0)
+    start = time.perf_counter()
+    count = sum(1 for _ in map(full_json, native_packets(capture)))
+    return count / (time.perf_counter() - start)
+
+def bench_sharded(capture, workers: int) -> float:
+    parser = ShardedParser(workers)
+    parser.pool().submit(int).result() # Start the workers outside the timed region
+    capture.seek(0)
+    start = time.perf_counter()
+    count = sum(1 for _ in parser.parse(capture, partial(native_line, "full")))
+    rate = count / (time.perf_counter() - start)
+    parser.shutdown()
+    return rate
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Packets/sec of parallel /parsefile parses by number of workers")
+    parser.add_argument("--frames", type=int, default=50000)
+    parser.add_argument("--entities", type=int, default=10)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryFile() as capture:
+        write_capture(capture, args.frames, args.entities)
+        print(f"{args.frames * 2} packets, {capture.tell()} bytes, {os.cpu_count()} cores")
+        serial = bench_serial(capture)
+        print(f"  serial: {serial:,.0f} packets/sec")
+        for workers in args.workers:
+            if workers > os.cpu_count():
+                print(f"{workers:>2} workers: more workers than cores, the rate below does not show scaling")
+            rate = bench_sharded(capture, workers)
+            print(f"{workers:>2} workers: {rate:,.0f} packets/sec, {rate / serial:.2f}x serial")
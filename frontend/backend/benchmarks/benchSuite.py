@@ -0,0 +1,141 @@
+import argparse, io, json, os, resource, sys, tempfile, time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "parsing"))
+os.environ.setdefault("CIGI_CACHE_DIR", os.path.join(tempfile.gettempdir(), "cigi-bench-cache"))
+from syntheticCapture import write_capture
+from packet import *
+from cigiDecoder import LAYOUTS, byte_order, field_names, is_cigi, unpack_packet, walk_packets
+from pcapReader import read_capture
+import fileParse
+
+BASELINES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines.json")
+
+def decoded_datagrams(capture: bytes) -> list:
+    # Payload bytes of every CIGI datagram
+    return [bytes(datagram.payload) for datagram in read_capture(io.BytesIO(capture))
+        if datagram.payload is not None and is_cigi(datagram.payload)]
+
+def bench_decode(capture: bytes) -> list:
+    # Seconds to unpack every packet of each datagram
+    samples = []
+    for payload in decoded_datagrams(capture):
+        start = time.perf_counter()
+        order = byte_order(payload)
+        for op_code, offset, size in walk_packets(payload):
+            layout = LAYOUTS.get(op_code)
+            if layout is not None and size >= layout.size:
+                unpack_packet(layout, payload, offset, order, size)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+def bench_validate(capture: bytes) -> list:
+    # Seconds to validate the layers of each datagram, decoded beforehand
+    layers = [fileParse.decode_message(payload) for payload in decoded_datagrams(capture)]
+    samples = []
+    for message in layers:
+        start = time.perf_counter()
+        for records in message.values():
+            for packet_record in records:
+                packet_record.validate()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+def bench_serialize(capture: bytes) -> list:
+    # Seconds to render and serialize each packet in the default /parsefile format
+    packets = list(fileParse.native_packets(io.BytesIO(capture)))
+    samples = []
+    for layers in packets:
+        start = time.perf_counter()
+        fileParse.OUTPUT_FORMATS["full"](layers)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+def bench_end_to_end(capture: bytes, repeats: int = 5) -> list:
+    # Seconds per POST /parsefile, with the parse cache emptied before each
+    from fastapi.testclient import TestClient
+    client = TestClient(fileParse.app)
+    samples = []
+    for _ in range(repeats):
+        fileParse.parse_cache.clear()
+        start = time.perf_counter()
+        response = client.post("/parsefile", files={"file": ("capture.pcap", capture)})
+        response.raise_for_status()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+BENCHMARKS = {
+    "decode": (bench_decode, "datagrams"),
+    "validate": (bench_validate, "datagrams"),
+    "serialize": (bench_serialize, "packets"),
+    "end_to_end": (bench_end_to_end, "requests"),
+}
+
+def run_benchmark(name: str, capture: bytes) -> dict:
+    # Runs in a fresh worker process, so the peak RSS is this benchmark's own
+    bench, unit = BENCHMARKS[name]
+    samples = np.array(bench(capture))
+    return {
+        "unit": unit,
+        "throughput": len(samples) / samples.sum(),
+        "p50_ms": np.percentile(samples, 50) * 1e3,
+        "p99_ms": np.percentile(samples, 99) * 1e3,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+def regressions(results: dict, baselines: dict, threshold: float) -> list:
+    # Benchmarks slower, or using more memory, than their baseline by more than threshold
+    failures = []
+    for name, result in results.items():
+        baseline = baselines.get(name)
+        if baseline is None:
+            continue
+        if result["throughput"] < baseline["throughput"] * (1 - threshold):
+            failures.append(f"{name}: {result['throughput']:,.0f} {result['unit']}/sec, baseline {baseline['throughput']:,.0f}")
+        if result["p99_ms"] > baseline["p99_ms"] * (1 + threshold):
+            failures.append(f"{name}: p99 {result['p99_ms']:.3f}ms, baseline {baseline['p99_ms']:.3f}ms")
+        if result["peak_rss_mb"] > baseline["peak_rss_mb"] * (1 + threshold):
+            failures.append(f"{name}: peak RSS {result['peak_rss_mb']:.0f}MB, baseline {baseline['peak_rss_mb']:.0f}MB")
+    return failures
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Decode, validate, serialize and /parsefile benchmarks on a synthetic capture")
+    parser.add_argument("--frames", type=int, default=2000)
+    parser.add_argument("--entities", type=int, default=20)
+    parser.add_argument("--error-rate", type=float, default=0.01)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--benchmarks", nargs="+", default=list(BENCHMARKS), choices=list(BENCHMARKS))
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed fraction of regression against the baseline")
+    parser.add_argument("--save", action="store_true", help="Store the results as the new baselines")
+    args = parser.parse_args()
+
+    stream = io.BytesIO()
+    write_capture(stream, args.frames, args.entities, args.error_rate, args.seed)
+    capture = stream.getvalue()
+    print(f"{args.frames * 2} packets, {len(capture)} bytes, {args.entities} entities, error rate {args.error_rate}")
+
+    results = {}
+    for name in args.benchmarks:
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            result = results[name] = executor.submit(run_benchmark, name, capture).result()
+        print(f"{name:>10}: {result['throughput']:12,.0f} {result['unit']}/sec  p50 {result['p50_ms']:8.3f}ms  "
+            f"p99 {result['p99_ms']:8.3f}ms  peak RSS {result['peak_rss_mb']:6.0f}MB")
+
+    # Baselines hold one entry per workload, so differently sized runs are not compared
+    workload = f"frames={args.frames},entities={args.entities},error_rate={args.error_rate},seed={args.seed}"
+    baselines = {}
+    if os.path.exists(BASELINES):
+        with open(BASELINES) as stored:
+            baselines = json.load(stored)
+    if args.save:
+        baselines[workload] = {**baselines.get(workload, {}), **results}
+        with open(BASELINES, "w") as stored:
+            json.dump(baselines, stored, indent=2, sort_keys=True)
+        print(f"Baselines saved to {BASELINES}")
+    elif workload in baselines:
+        failures = regressions(results, baselines[workload], args.threshold)
+        for failure in failures:
+            print(f"REGRESSION {failure}")
+        sys.exit(1 if failures else 0)
+    else:
+        print("No baseline for this workload, run with --save to store one")
@@ -0,0 +1,65 @@
+import argparse, os, sys, time
+import numpy as np
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "parsing"))
+from packet import *
+from cigiDecoder import LAYOUTS
+from parsedCapture import _python_value, table_dtype
+from batchValidation import validate_table
+
+def random_table(layout, rows: int, rng) -> np.ndarray:
+    # Values clustered around the declared bounds, plus NaN and infinities for floats
+    table = np.zeros(rows, dtype=table_dtype(layout))
+    for name, default in layer_schema(layout.layer_type).items():
+        column = table[name]
+        if column.dtype.kind not in "iuf":
+            continue
+        bounds = [bound for bound in (default.valid_range or []) if bound is not None] or [0]
+        candidates = np.concatenate([np.array(bounds, dtype=float)[:, None] + [-1, -0.5, 0, 0.5, 1]]).ravel()
+        values = rng.choice(candidates, rows)
+        if column.dtype.kind == "f":
+            values[rng.random(rows) < 0.01] = rng.choice([np.nan, np.inf, -np.inf])
+            table[name] = values
+        else:
+            info = np.iinfo(column.dtype)
+            table[name] = np.clip(np.round(values), info.min, info.max)
+    return table
+
+def scalar_error_mask(layer_type, table: np.ndarray) -> np.ndarray:
+    error_mask = np.zeros(len(table), dtype=np.uint64)
+    schema = layer_schema(layer_type)
+    for row_number, row in enumerate(table):
+        layer = layer_type.__new__(layer_type)
+        for name, default in schema.items():
+            layer[name] = LayerField(value = _python_value(row[name]), valid_range = default.valid_range, validator = default.validator)
+        for bit, name in enumerate(schema):
+            layer[name].validate(layer)
+            if not layer[name].valid:
+                error_mask[row_number] |= np.uint64(1 << bit)
+    return error_mask
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare batch validation against the scalar validators")
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    scalar_time = batch_time = 0.0
+    for op_code, layout in sorted(LAYOUTS.items()):
+        if op_code > 201:
+            continue
+        table = random_table(layout, args.rows, rng)
+        start = time.perf_counter()
+        expected = scalar_error_mask(layout.layer_type, table)
+        scalar_time += time.perf_counter() - start
+        start = time.perf_counter()
+        actual = validate_table(layout.layer_type, table)
+        batch_time += time.perf_counter() - start
+        mismatches = int(np.count_nonzero(expected != actual))
+        if mismatches:
+            print(f"{layout.name}: {mismatches} rows differ from the scalar validators")
+            sys.exit(1)
+    rows = args.rows * len([op_code for op_code in LAYOUTS if op_code <= 201])
+    print(f"{rows} rows match the scalar validators")
+    print(f"scalar: {rows / scalar_time:,.0f} rows/sec")
+    print(f" batch: {rows / batch_time:,.0f} rows/sec")
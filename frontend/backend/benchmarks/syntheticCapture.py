@@ -0,0 +1,56 @@
+import argparse, os, random, struct, sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "parsing"))
+from cigiDecoder import pack_packet
+
+HOST_IP = bytes([192, 168, 1, 10])
+IG_IP = bytes([192, 168, 1, 20])
+HOST_PORT = 8004
+IG_PORT = 8005
+
+def udp_frame(source_ip: bytes, destination_ip: bytes, source_port: int, destination_port: int, payload: bytes) -> bytes:
+    # Ethernet + IPv4 + UDP, checksums left at zero
+    udp = struct.pack(">HHHH", source_port, destination_port, 8 + len(payload), 0) + payload
+    ip = struct.pack(">BBHHHBBH4s4s", 0x45, 0, 20 + len(udp), 0, 0, 64, 17, 0, source_ip, destination_ip)
+    return b"\x00\x11\x22\x33\x44\x55\x66\x77\x88\x99\xaa\xbb\x08\x00" + ip + udp
+
+# Out of range values written into packets chosen by the error rate
+INVALID_IG_MODE = 3
+INVALID_PITCH = 120.0
+
+def host_message(frame: int, entities: int, rng: random.Random = None, error_rate: float = 0.0) -> bytes:
+    # IG Control followed by one Entity Control per entity
+    invalid = lambda: rng is not None and rng.random() < error_rate
+    message = pack_packet(1, {"db_number": 1, "ig_mode": INVALID_IG_MODE if invalid() else 1, "timestamp_valid": 1, "minor_version": 2,
+        "host_frame_number": frame, "timestamp": frame * 1667, "last_ig_frame_number": max(frame - 1, 0)})
+    for entity in range(entities):
+        message += pack_packet(2, {"entity_id": entity, "entity_state": 1, "alpha": 255, "entity_type": 100,
+            "roll": (frame + entity) % 360 - 180.0, "pitch": INVALID_PITCH if invalid() else 5.0, "yaw": (frame * 2 + entity) % 360,
+            "lat_xoff": 28.0 + entity * 1e-3, "lon_yoff": -82.4 + frame * 1e-5, "alt_zoff": 1000.0 + frame})
+    return message
+
+def ig_message(frame: int) -> bytes:
+    return pack_packet(101, {"db_number": 1, "ig_mode": 1, "timestamp_valid": 1, "minor_version": 2,
+        "ig_frame_number": frame, "timestamp": frame * 1667, "last_host_frame_number": frame})
+
+def write_capture(stream, frames: int, entities: int = 1, error_rate: float = 0.0, seed: int = 0):
+    # Classic little endian pcap of host/IG traffic at 60 Hz. error_rate is the
+    # fraction of host packets given an out of range value, chosen from seed.
+    rng = random.Random(seed)
+    stream.write(struct.pack("<IHHiIII", 0xA1B2C3D4, 2, 4, 0, 0, 65535, 1))
+    for frame in range(frames):
+        seconds, microseconds = divmod(frame * 16667, 1000000)
+        for packet in (udp_frame(HOST_IP, IG_IP, HOST_PORT, IG_PORT, host_message(frame, entities, rng, error_rate)),
+                udp_frame(IG_IP, HOST_IP, IG_PORT, HOST_PORT, ig_message(frame))):
+            stream.write(struct.pack("<IIII", seconds, microseconds, len(packet), len(packet)) + packet)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a synthetic pcap of host/IG CIGI traffic")
+    parser.add_argument("output")
+    parser.add_argument("--frames", type=int, default=3600)
+    parser.add_argument("--entities", type=int, default=10)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with open(args.output, "wb") as output:
+        write_capture(output, args.frames, args.entities, args.error_rate, args.seed)
@@ -0,0 +1,118 @@
+import numpy as np
+from functools import lru_cache
+from types import SimpleNamespace
+from packet import *
+
+# Validators evaluated as NumPy comparisons. Anything else, like the View
+# Definition rules relative to sibling fields, runs row by row through the
+# scalar validator.
+RANGE_VALIDATORS = {
+    inclusiveRangeValidator: np.less, # Invalid below the low bound, inverted for the high bound
+    exclusiveRangeValidator: np.less_equal,
+}
+
+def _numeric(values: np.ndarray) -> np.ndarray:
+    # Compare in the precision the scalar validators see: Python ints and floats
+    if values.dtype.kind in "biu":
+        return values.astype(np.int64)
+    if values.dtype.kind == "f":
+        return values.astype(np.float64)
+    return values
+
+def _range_check(below, valid_range):
+    low, high = valid_range
+    def check(values, table = None):
+        values = _numeric(values)
+        invalid = np.zeros(len(values), dtype=bool)
+        if low is not None:
+            invalid |= below(values, low)
+        if high is not None:
+            invalid |= below(high, values)
+        return invalid
+    return check
+
+def _discrete_check(valid_range):
+    def check(values, table = None):
+        return ~np.isin(_numeric(values), valid_range)
+    return check
+
+def _scalar_check(layer_type, name, validator, valid_range):
+    # The rules left to the scalar validator compare a field with its siblings, so they need the table
+    def check(values, table = None):
+        if table is None:
+            raise ValueError(f"{layer_type.__name__}.{name} is validated against its sibling fields, pass their columns as table")
+        present = table.dtype.names if isinstance(table, np.ndarray) else table
+        names = [field_name for field_name in layer_fields(layer_type) if field_name in present]
+        columns = {field_name: np.asarray(table[field_name]).tolist() for field_name in names}
+        columns[name] = np.asarray(values).tolist()
+        invalid = np.zeros(len(values), dtype=bool)
+        for row in range(len(values)):
+            layer = SimpleNamespace(**{field_name: LayerField(value = column[row]) for field_name, column in columns.items()})
+            invalid[row] = not validator(LayerField(value = columns[name][row], valid_range = valid_range), layer)
+        return invalid
+    return check
+
+@lru_cache(maxsize=None)
+def compile_rules(layer_type) -> tuple:
+    # (bit, field name, check) for every validated LayerField of a packet.py
+    # class. check(values, table) returns True where the row is invalid.
+    rules = []
+    for bit, (name, default) in enumerate(layer_schema(layer_type).items()):
+        validator, valid_range = default.validator, default.valid_range
+        if validator is None:
+            continue
+        if validator in RANGE_VALIDATORS and valid_range is not None:
+            check = _range_check(RANGE_VALIDATORS[validator], valid_range)
+        elif validator is discreteValueValidator and valid_range is not None:
+            check = _discrete_check(valid_range)
+        elif validator is discreteValueValidator or validator in RANGE_VALIDATORS:
+            continue # No range declared, every value passes
+        else:
+            check = _scalar_check(layer_type, name, validator, valid_range)
+        rules.append((bit, name, check))
+    return tuple(rules)
+
+def validate_column(layer_type, name: str, values, table = None) -> np.ndarray:
+    # Invalid rows of one column, e.g. validate_column(EntityControl, "roll", rolls).
+    # Fields validated relative to their siblings, like the View Definition
+    # bounds, need table: a structured array or a dict of the sibling columns.
+    # Without it they raise ValueError.
+    values = np.asarray(values)
+    for _, rule_name, check in compile_rules(layer_type):
+        if rule_name == name:
+            return check(values, table)
+    return np.zeros(len(values), dtype=bool)
+
+def validate_table(layer_type, table: np.ndarray) -> np.ndarray:
+    # Per row bitmask of failing fields, bit i being layer_fields(layer_type)[i]
+    error_mask = np.zeros(len(table), dtype=np.uint64)
+    for bit, name, check in compile_rules(layer_type):
+        invalid = check(table[name], table)
+        error_mask |= invalid.astype(np.uint64) << np.uint64(bit)
+    return error_mask
+
+def row_layer(layer_type, row):
+    # Fresh layer instance holding one row, never touching the shared class defaults.
+    # Attributes are set directly, projected_layer classes have no item access.
+    layer = layer_type.__new__(layer_type)
+    layer.control_error = False
+    for name, default in layer_schema(layer_type).items():
+        value = row[name]
+        setattr(layer, name, LayerField(value = value.item() if isinstance(value, np.generic) else value,
+            valid_range = default.valid_range, validator = default.validator))
+    return layer
+
+def error_messages(layer_type, row) -> dict:
+    # Error strings of the fields flagged in a row's error_mask, built only when
+    # someone looks at that row
+    error_mask = int(row["error_mask"])
+    if not error_mask:
+        return {}
+    layer = row_layer(layer_type, row)
+    messages = {}
+    for bit, name in enumerate(layer_fields(layer_type)):
+        if error_mask & (1 << bit):
+            layer_field = getattr(layer, name)
+            layer_field.validate(layer)
+            messages[name] = layer_field.error_msg
+    return messages
@@ -0,0 +1,243 @@
+import heapq, json, os, sqlite3, tempfile, threading, time
+import numpy as np
+from packet import *
+from cigiDecoder import LAYOUTS
+from parsedCapture import DATAGRAM_DTYPE, CaptureBuilder, ip_layer_record, layer_record, table_dtype
+from captureIndex import ENTITY_OP_CODES, FRAME_COLUMNS
+from pcapReader import read_capture
+
+# Rows inserted between two commits while a capture is ingested
+COMMIT_ROWS = 1 << 20
+SQL_TYPES = {"i": "INTEGER", "u": "INTEGER", "f": "REAL", "S": "BLOB", "O": "BLOB"}
+ENTITY_TABLES = tuple(sorted({LAYOUTS[op_code].name for op_code in ENTITY_OP_CODES}))
+
+def _row_dtype(dtype: np.dtype) -> np.dtype:
+    # The same rows with the error_mask bits as the signed 64 bit value an
+    # SQLite INTEGER holds, so rows read back are viewed as the table without a copy
+    return np.dtype({"names": dtype.names, "formats": ["i8" if name == "error_mask" else dtype.fields[name][0] for name in dtype.names],
+        "offsets": [dtype.fields[name][1] for name in dtype.names], "itemsize": dtype.itemsize})
+
+def table_schema(table: str, name: str, dtype: np.dtype) -> tuple:
+    # (CREATE TABLE, CREATE INDEX statements) of the table of one packet type of
+    # a capture, its columns those of the ParsedCapture table
+    columns = ", ".join(f"{column} {SQL_TYPES[dtype[column].kind]}" for column in dtype.names)
+    indexes = [f"CREATE INDEX {table}_packet ON {table} (packet_index)"]
+    if "error_mask" in dtype.names:
+        indexes.append(f"CREATE INDEX {table}_error ON {table} (packet_index) WHERE error_mask != 0")
+    if name == 'user_defined':
+        indexes.append(f"CREATE INDEX {table}_op_code ON {table} (op_code, packet_index)")
+    if name in ENTITY_TABLES:
+        indexes.append(f"CREATE INDEX {table}_entity ON {table} (entity_id, packet_index)")
+    for frame_table, column in FRAME_COLUMNS.values():
+        if name == frame_table:
+            indexes.append(f"CREATE INDEX {table}_frame ON {table} ({column}, packet_index)")
+    return f"CREATE TABLE {table} ({columns})", indexes
+
+class CaptureDatabase:
+    # Parsed captures kept in an SQLite database: for every capture one table
+    # per CIGI packet type, with the columns of its packet.py class, plus
+    # ip_layer. Captures are inserted a chunk of rows at a time in large
+    # transactions, so they do not have to fit in memory, and stay on disk
+    # across restarts. Indexes are built once a capture is inserted, on the
+    # packet index, op code (user defined packets), entity id, frame number
+    # and rows failing validation. The database is in WAL mode, so captures are
+    # read while another one is written. Each thread uses its own connection.
+
+    def __init__(self, path: str):
+        # The database is only opened, created if needed, by the first query
+        self.path = path
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.opened = False
+
+    def _open(self, connection: sqlite3.Connection):
+        # Larger pages make bulk inserts faster, only applies to a new database
+        connection.execute("PRAGMA page_size=16384")
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("CREATE TABLE IF NOT EXISTS captures (id INTEGER PRIMARY KEY, name TEXT, created REAL, "
+            "state TEXT, packet_count INTEGER, rows INTEGER)")
+        connection.execute("CREATE TABLE IF NOT EXISTS capture_tables (capture INTEGER, name TEXT, rows INTEGER, "
+            "PRIMARY KEY (capture, name))")
+        # Captures whose ingest was interrupted by a restart
+        for capture_id, in connection.execute("SELECT id FROM captures WHERE state = 'ingesting'").fetchall():
+            self._remove(connection, capture_id)
+
+    def connection(self) -> sqlite3.Connection:
+        connection = getattr(self.local, "connection", None)
+        if connection is None:
+            # Transactions are begun and committed explicitly
+            connection = self.local.connection = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute("PRAGMA cache_size=-65536")
+        if not self.opened:
+            with self.lock:
+                if not self.opened:
+                    self._open(connection)
+                    self.opened = True
+        return connection
+
+    def ingest(self, stream, name: str = None, progress = None) -> int:
+        # Parses a capture into the database and returns its id. A capture that
+        # fails to parse, or whose progress callback raises, is removed again.
+        connection = self.connection()
+        capture_id = connection.execute("INSERT INTO captures (name, created, state, packet_count, rows) VALUES (?, ?, 'ingesting', 0, 0)",
+            (name, time.time())).lastrowid
+        tables = {} # Packet field name -> (INSERT statement, CREATE INDEX statements)
+        counts = {}
+        pending = 0
+        def insert(name, chunk):
+            nonlocal pending
+            if name not in tables:
+                table = f"capture{capture_id}_{name}"
+                create, indexes = table_schema(table, name, chunk.dtype)
+                connection.execute(create)
+                connection.execute("INSERT INTO capture_tables (capture, name, rows) VALUES (?, ?, 0)", (capture_id, name))
+                tables[name] = (f"INSERT INTO {table} VALUES ({', '.join('?' * len(chunk.dtype.names))})", indexes)
+            # Rows are zipped from typed columns, each converted to Python values at
+            # once, with the error_mask bits as the signed 64 bit value an SQLite INTEGER holds
+            columns = [chunk[column].view(np.int64) if column == "error_mask" else chunk[column] for column in chunk.dtype.names]
+            connection.executemany(tables[name][0], zip(*(column.tolist() for column in columns)))
+            counts[name] = counts.get(name, 0) + len(chunk)
+            pending += len(chunk)
+            if pending >= COMMIT_ROWS:
+                connection.execute("COMMIT")
+                connection.execute("BEGIN")
+                pending = 0
+
+        builder = CaptureBuilder(insert)
+        try:
+            connection.execute("BEGIN")
+            for datagram in read_capture(stream, progress):
+                builder.add_datagram(datagram)
+            builder.flush()
+            for _, indexes in tables.values():
+                for statement in indexes:
+                    connection.execute(statement)
+            connection.executemany("UPDATE capture_tables SET rows = ? WHERE capture = ? AND name = ?",
+                [(rows, capture_id, name) for name, rows in counts.items()])
+            connection.execute("UPDATE captures SET state = 'done', packet_count = ?, rows = ? WHERE id = ?",
+                (builder.packet_count, sum(rows for name, rows in counts.items() if name != 'ip_layer'), capture_id))
+            connection.execute("COMMIT")
+        except BaseException:
+            if connection.in_transaction:
+                connection.execute("ROLLBACK")
+            self.remove(capture_id)
+            raise
+        return capture_id
+
+    def remove(self, capture_id: int) -> bool:
+        return self._remove(self.connection(), capture_id)
+
+    def _remove(self, connection: sqlite3.Connection, capture_id: int) -> bool:
+        connection.execute("BEGIN")
+        for name, in connection.execute("SELECT name FROM capture_tables WHERE capture = ?", (capture_id,)).fetchall():
+            connection.execute(f"DROP TABLE IF EXISTS capture{capture_id}_{name}")
+        connection.execute("DELETE FROM capture_tables WHERE capture = ?", (capture_id,))
+        removed = connection.execute("DELETE FROM captures WHERE id = ?", (capture_id,)).rowcount > 0
+        connection.execute("COMMIT")
+        return removed
+
+    def captures(self) -> list:
+        return [self.capture(capture_id) for capture_id, in self.connection().execute("SELECT id FROM captures ORDER BY id").fetchall()]
+
+    def capture(self, capture_id: int) -> dict:
+        # None for an unknown capture
+        connection = self.connection()
+        row = connection.execute("SELECT id, name, created, state, packet_count, rows FROM captures WHERE id = ?", (capture_id,)).fetchone()
+        if row is None:
+            return None
+        capture = dict(zip(("id", "name", "created", "state", "packet_count", "rows"), row))
+        capture["tables"] = dict(connection.execute("SELECT name, rows FROM capture_tables WHERE capture = ? ORDER BY rowid", (capture_id,)).fetchall())
+        return capture
+
+    def _frame_range(self, capture: dict, frames: tuple, frame_source: str) -> tuple:
+        # The packets [start, stop) from the first control packet of the frames
+        # numbered frames[0] to frames[1] up to the one after the last of them,
+        # frame numbers increasing through the capture
+        name, column = FRAME_COLUMNS[frame_source]
+        if name not in capture["tables"]:
+            return 0, 0
+        table = f"capture{capture['id']}_{name}"
+        connection = self.connection()
+        # One seek each into the frame number index, however many frames the range spans
+        first = connection.execute(f"SELECT packet_index FROM {table} WHERE {column} >= ? ORDER BY {column}, packet_index LIMIT 1",
+            (frames[0],)).fetchone()
+        last = connection.execute(f"SELECT packet_index FROM {table} WHERE {column} <= ? ORDER BY {column} DESC, packet_index DESC LIMIT 1",
+            (frames[1],)).fetchone()
+        if first is None or last is None or first[0] > last[0]:
+            return 0, 0
+        first, last = first[0], last[0]
+        stop, = connection.execute(f"SELECT MIN(packet_index) FROM {table} WHERE packet_index > ?", (last,)).fetchone()
+        return first, capture["packet_count"] if stop is None else stop
+
+    def page_packets(self, capture: dict, after: int = -1, size: int = 100, op_code: int = None, error_only: bool = False,
+            entity_id: int = None, frames: tuple = None, frame_source: str = "host") -> list:
+        # Indexes of the first size packets after the packet after matching every
+        # filter, found from the indexes so pages past any packet are as fast
+        start, stop = after + 1, capture["packet_count"]
+        if frames is not None:
+            frame_start, frame_stop = self._frame_range(capture, frames, frame_source)
+            start, stop = max(start, frame_start), min(stop, frame_stop)
+        tables = capture["tables"]
+        # Each filter is met by a row of one of its (table, condition, parameters).
+        # Rows of the first, usually the most selective, are scanned in packet
+        # order and the others checked for each of their packets.
+        filters = []
+        if entity_id is not None:
+            filters.append([(name, "entity_id = ?", (entity_id,)) for name in ENTITY_TABLES if name in tables])
+        if error_only:
+            filters.append([(name, "error_mask != 0", ()) for name in tables if name not in ('ip_layer', 'user_defined')])
+        if op_code is not None:
+            name = LAYOUTS[op_code].name if op_code in LAYOUTS else None
+            filters.append([(name, "op_code = ?", (op_code,))] if name in tables else [])
+        if not filters:
+            return list(range(start, min(stop, start + size)))
+        if start >= stop or not all(filters):
+            return []
+        exists, exists_parameters = [], []
+        for alternatives in filters[1:]:
+            exists.append(" OR ".join(f"EXISTS (SELECT 1 FROM capture{capture['id']}_{name} AS other "
+                f"WHERE other.packet_index = row.packet_index AND other.{condition})" for name, condition, _ in alternatives))
+            exists_parameters.extend(parameter for _, _, parameters in alternatives for parameter in parameters)
+        connection = self.connection()
+        runs = []
+        for name, condition, parameters in filters[0]:
+            query = (f"SELECT DISTINCT packet_index FROM capture{capture['id']}_{name} AS row WHERE {condition} "
+                "AND packet_index >= ? AND packet_index < ?" + "".join(f" AND ({clause})" for clause in exists)
+                + " ORDER BY packet_index LIMIT ?")
+            runs.append([index for index, in connection.execute(query, (*parameters, start, stop, *exists_parameters, size))])
+        packets = []
+        for index in heapq.merge(*runs):
+            if not packets or packets[-1] != index:
+                packets.append(index)
+        return packets[:size]
+
+    def _packet_rows(self, capture: dict, name: str, packets: list) -> np.ndarray:
+        # Every row of a table in the packets, in capture order
+        if name == 'ip_layer':
+            dtype = DATAGRAM_DTYPE
+        else:
+            dtype = table_dtype(next(layout for layout in LAYOUTS.values() if layout.name == name))
+        table = f"capture{capture['id']}_{name}"
+        rows = self.connection().execute(f"SELECT * FROM {table} WHERE packet_index IN (SELECT value FROM json_each(?)) "
+            "ORDER BY packet_index, rowid", (json.dumps(packets),)).fetchall()
+        rows = np.array(rows, dtype=_row_dtype(dtype))
+        return rows.astype(dtype) if dtype.hasobject else rows.view(dtype)
+
+    def packet_layers(self, capture: dict, packets: list) -> list:
+        # {Packet field name: [LayerRecord]} of each of the sorted packets, every
+        # row of each type like ParsedCapture.packet_layers
+        layers = [{} for _ in packets]
+        indexes = np.array(packets, dtype=np.int64)
+        for name in sorted(capture["tables"], key=lambda name: name != 'ip_layer'):
+            table = self._packet_rows(capture, name, packets)
+            for position, row in zip(np.searchsorted(indexes, table["packet_index"]).tolist(), table):
+                if name == 'ip_layer':
+                    record = ip_layer_record(row)
+                else:
+                    record = layer_record(LAYOUTS[int(row["op_code"])].layer_type, row)
+                layers[position].setdefault(name, []).append(record)
+        return layers
+
+def default_database() -> CaptureDatabase:
+    return CaptureDatabase(os.environ.get("CIGI_CAPTURE_DB", os.path.join(tempfile.gettempdir(), "cigi-captures.sqlite3")))
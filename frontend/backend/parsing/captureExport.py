@@ -0,0 +1,124 @@
+import os, socket, zipfile
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+from packet import *
+from batchValidation import compile_rules
+from parsedCapture import CaptureBuilder, table_layer_type
+from pcapReader import TRANSPORT_PROTOCOLS, read_capture
+
+# File extension of each export format
+EXPORT_FORMATS = {
+    "parquet": ".parquet",
+    "arrow": ".arrow",
+}
+
+def _column(values: np.ndarray) -> pa.Array:
+    if values.dtype.kind == "S":
+        return pa.FixedSizeBinaryArray.from_buffers(pa.binary(values.dtype.itemsize), len(values),
+            [None, pa.py_buffer(values.tobytes())])
+    if values.dtype.kind == "O":
+        return pa.array(values.tolist(), type=pa.binary())
+    return pa.array(np.ascontiguousarray(values))
+
+def _labels(values: np.ndarray, label, mask: np.ndarray = None) -> pa.Array:
+    # Strings of a column holding few distinct values, label(value) computed once per value
+    unique, inverse = np.unique(values, return_inverse=True)
+    labels = pa.array([label(int(value)) for value in unique], type=pa.string())
+    return labels.take(pa.array(inverse.astype(np.int32), mask=mask))
+
+def _address(address: int) -> str:
+    return socket.inet_ntoa(address.to_bytes(4, "big"))
+
+def layer_batch(layer_type, chunk: np.ndarray) -> pa.RecordBatch:
+    # Columns of a packet table chunk, typed after its binary layout. The
+    # error_mask is split into control_error and a <field>_error column per
+    # validated field.
+    names = [name for name in chunk.dtype.names if name != "error_mask"]
+    columns = [_column(chunk[name]) for name in names]
+    error_mask = chunk["error_mask"]
+    names.append("control_error")
+    columns.append(pa.array(error_mask != 0))
+    for bit, name, _ in compile_rules(layer_type):
+        names.append(f"{name}_error")
+        columns.append(pa.array((error_mask >> np.uint64(bit)) & np.uint64(1) == 1))
+    return pa.RecordBatch.from_arrays(columns, names)
+
+def ip_batch(chunk: np.ndarray) -> pa.RecordBatch:
+    # IP layer of a datagrams chunk, ports are null for datagrams that are neither UDP nor TCP
+    no_transport = chunk["protocol"] == 0
+    return pa.RecordBatch.from_arrays([
+        pa.array(np.ascontiguousarray(chunk["packet_index"])),
+        pa.array((chunk["timestamp"] * 1e6).astype(np.int64), type=pa.timestamp("us", tz="UTC")),
+        _labels(chunk["source_ip"], _address),
+        _labels(chunk["destination_ip"], _address),
+        _labels(chunk["protocol"], TRANSPORT_PROTOCOLS.get, no_transport),
+        pa.array(np.ascontiguousarray(chunk["source_port"]), mask=no_transport),
+        pa.array(np.ascontiguousarray(chunk["destination_port"]), mask=no_transport),
+    ], ["packet_index", "timestamp", "source_ip", "destination_ip", "protocol", "source_port", "destination_port"])
+
+class _TableWriter:
+    # Writes the record batches of one table to a Parquet or Arrow IPC file
+    def __init__(self, path: str, schema: pa.Schema, file_format: str):
+        self.file_format = file_format
+        self.writer = pq.ParquetWriter(path, schema) if file_format == "parquet" else pa.ipc.new_file(path, schema)
+        self.rows = 0
+
+    def write(self, batch: pa.RecordBatch):
+        if self.file_format == "parquet":
+            self.writer.write_table(pa.Table.from_batches([batch]))
+        else:
+            self.writer.write_batch(batch)
+        self.rows += batch.num_rows
+
+    def close(self):
+        self.writer.close()
+
+class CaptureExporter:
+    # CaptureBuilder sink writing the chunks of every table to one file per
+    # table in directory, created with the first chunk of the table
+
+    def __init__(self, directory: str, file_format: str = "parquet"):
+        self.directory = directory
+        self.file_format = file_format
+        self.writers = {}
+
+    def __call__(self, name, chunk):
+        batch = ip_batch(chunk) if name == 'ip_layer' else layer_batch(table_layer_type(int(chunk["op_code"][0]), chunk.dtype.names), chunk)
+        writer = self.writers.get(name)
+        if writer is None:
+            path = os.path.join(self.directory, name + EXPORT_FORMATS[self.file_format])
+            writer = self.writers[name] = _TableWriter(path, batch.schema, self.file_format)
+        writer.write(batch)
+
+    def close(self) -> dict:
+        # {table name: rows written}
+        for writer in self.writers.values():
+            writer.close()
+        return {name: writer.rows for name, writer in self.writers.items()}
+
+def export_capture(stream, directory: str, file_format: str = "parquet") -> dict:
+    # Writes one file per CIGI packet type plus ip_layer to directory and
+    # returns {table name: rows}. Tables are written a chunk of rows at a time,
+    # so memory does not grow with the capture.
+    exporter = CaptureExporter(directory, file_format)
+    builder = CaptureBuilder(exporter)
+    try:
+        for datagram in read_capture(stream):
+            builder.add_datagram(datagram)
+        builder.flush()
+    finally:
+        rows = exporter.close()
+    return rows
+
+def export_archive(stream, directory: str, file_format: str = "parquet") -> str:
+    # Exports into directory and returns the path of a zip holding the table files
+    tables = os.path.join(directory, "tables")
+    os.makedirs(tables, exist_ok=True)
+    export_capture(stream, tables, file_format)
+    path = os.path.join(directory, "capture.zip")
+    # Parquet pages are compressed already, the files are stored as they are
+    with zipfile.ZipFile(path, "w") as archive:
+        for name in sorted(os.listdir(tables)):
+            archive.write(os.path.join(tables, name), name)
+    return path
@@ -0,0 +1,126 @@
+import numpy as np
+from packet import *
+from cigiDecoder import LAYOUTS
+
+# Packets indexed by their entity_id
+ENTITY_OP_CODES = tuple(op_code for op_code, layout in LAYOUTS.items()
+    if layout.layer_type in (EntityControl, ConformalClampedEntityControl))
+# Packet tables and columns numbering the frames
+FRAME_COLUMNS = {"host": ("ig_control", "host_frame_number"), "ig": ("sof", "ig_frame_number")}
+# Op code of the packet starting the CIGI messages that anchor each frame source
+FRAME_OP_CODES = {"host": 1, "ig": 101}
+# Frame number jumps larger than this are treated as a restart, not a loss
+MAX_FRAME_GAP = 10000
+
+class KeyIndex:
+    # Sorted packet indexes of every key, laid out as one array sliced by offsets:
+    # packets[offsets[i]:offsets[i + 1]] are the packets holding keys[i]
+
+    def __init__(self, keys: np.ndarray, offsets: np.ndarray, packets: np.ndarray):
+        self.keys = keys
+        self.offsets = offsets
+        self.packets = packets
+
+    @classmethod
+    def build(cls, keys: list, packets: list):
+        # keys[i][j] is a key of packets[i][j]
+        keys = np.concatenate(keys) if keys else np.empty(0, dtype=np.int64)
+        packets = np.concatenate(packets).astype(np.int64) if packets else np.empty(0, dtype=np.int64)
+        order = np.lexsort((packets, keys))
+        keys, packets = keys[order], packets[order]
+        # A packet is listed once per key, even when it repeats the key
+        distinct = np.ones(len(keys), dtype=bool)
+        distinct[1:] = (keys[1:] != keys[:-1]) | (packets[1:] != packets[:-1])
+        keys, packets = keys[distinct], packets[distinct]
+        unique_keys, starts = np.unique(keys, return_index=True)
+        return cls(unique_keys, np.append(starts, len(keys)).astype(np.int64), packets)
+
+    def __getitem__(self, key) -> np.ndarray:
+        position = int(np.searchsorted(self.keys, key))
+        if position == len(self.keys) or self.keys[position] != key:
+            return self.packets[:0]
+        return self.packets[self.offsets[position]:self.offsets[position + 1]]
+
+    def counts(self) -> dict:
+        return {int(key): int(count) for key, count in zip(self.keys, np.diff(self.offsets))}
+
+    @property
+    def nbytes(self) -> int:
+        return self.keys.nbytes + self.offsets.nbytes + self.packets.nbytes
+
+class FrameIndex:
+    # Frame numbers in ascending order with the packet range [start, stop) each
+    # frame spans, from its control packet up to the next one
+
+    def __init__(self, frames: np.ndarray, starts: np.ndarray, stops: np.ndarray):
+        self.frames = frames
+        self.starts = starts
+        self.stops = stops
+
+    @classmethod
+    def build(cls, table: np.ndarray, column: str, packet_count: int):
+        # Tables of a projected capture may leave the frame number out
+        if table is None or not len(table) or column not in table.dtype.names:
+            return cls(np.empty(0, dtype=np.uint32), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64))
+        # A frame starts at the first of the control packets of its datagram
+        starts = np.unique(table["packet_index"]).astype(np.int64)
+        table = table[np.searchsorted(table["packet_index"], starts)]
+        stops = np.append(starts[1:], packet_count)
+        frames = table[column].astype(np.uint32)
+        order = np.argsort(frames, kind="stable")
+        return cls(frames[order], starts[order], stops[order])
+
+    def ranges(self, first: int, last: int) -> tuple:
+        # (starts, stops) of the frames numbered first to last
+        low = int(np.searchsorted(self.frames, first, "left"))
+        high = int(np.searchsorted(self.frames, last, "right"))
+        return self.starts[low:high], self.stops[low:high]
+
+    def packets(self, first: int, last: int) -> np.ndarray:
+        starts, stops = self.ranges(first, last)
+        if not len(starts):
+            return np.empty(0, dtype=np.int64)
+        packets = np.concatenate([np.arange(start, stop) for start, stop in zip(starts, stops)])
+        return packets if np.all(np.diff(starts) > 0) else np.unique(packets)
+
+    @property
+    def nbytes(self) -> int:
+        return self.frames.nbytes + self.starts.nbytes + self.stops.nbytes
+
+class CaptureIndex:
+    def __init__(self, packet_count: int, op_codes: KeyIndex, entities: KeyIndex, frames: dict, error_bitmap: np.ndarray):
+        self.packet_count = packet_count
+        self.op_codes = op_codes # op code -> packets
+        self.entities = entities # entity_id -> packets with an EntityControl or ConformalClampedEntityControl for it
+        self.frames = frames # "host"/"ig" -> FrameIndex
+        self.error_bitmap = error_bitmap # Bit i set when packet i has a packet_error
+        self._error_packets = None
+
+    def has_error(self, packets: np.ndarray) -> np.ndarray:
+        return ((self.error_bitmap[packets >> 3] >> (packets & 7).astype(np.uint8)) & 1).astype(bool)
+
+    def error_packets(self) -> np.ndarray:
+        if self._error_packets is None:
+            self._error_packets = np.flatnonzero(np.unpackbits(self.error_bitmap, count=self.packet_count, bitorder="little"))
+        return self._error_packets
+
+    @property
+    def nbytes(self) -> int:
+        return (self.op_codes.nbytes + self.entities.nbytes + self.error_bitmap.nbytes
+            + sum(frame_index.nbytes for frame_index in self.frames.values()))
+
+def build_index(packet_count: int, tables: dict) -> CaptureIndex:
+    # Indexes of a parsed capture, from its packet tables holding every CIGI packet
+    op_codes, op_code_packets, entity_ids, entity_packets = [], [], [], []
+    errors = np.zeros(packet_count, dtype=bool)
+    for name, table in tables.items():
+        op_codes.append(table["op_code"])
+        op_code_packets.append(table["packet_index"])
+        if len(table) and int(table["op_code"][0]) in ENTITY_OP_CODES:
+            entity_ids.append(table["entity_id"])
+            entity_packets.append(table["packet_index"])
+        if name != 'user_defined':
+            errors[table["packet_index"][table["error_mask"] != 0]] = True
+    frames = {source: FrameIndex.build(tables.get(name), column, packet_count) for source, (name, column) in FRAME_COLUMNS.items()}
+    return CaptureIndex(packet_count, KeyIndex.build(op_codes, op_code_packets), KeyIndex.build(entity_ids, entity_packets),
+        frames, np.packbits(errors, bitorder="little"))
@@ -0,0 +1,169 @@
+import os, shutil, tempfile, threading, uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+import numpy as np
+from packet import *
+from parsedCapture import ParsedCapture, ip_layer_record, page_rows
+from captureIndex import FRAME_COLUMNS
+from pcapReader import capture_buffer, capture_compression, decompressed_chunks, read_record
+
+# Filter combinations whose matching packets are remembered per session
+MATCH_CACHE_SIZE = 32
+
+class CaptureSession:
+    # A parsed capture kept on the server. Filters are answered from the indexes
+    # built while parsing, and the sorted packets matching a filter are kept so
+    # every further page is a slice of one array. The capture file is kept at
+    # path, so the detail of a packet is decoded again from its record.
+
+    def __init__(self, capture_id: str, capture: ParsedCapture, path: str = None):
+        self.capture_id = capture_id
+        self.capture = capture
+        self.index = capture.index
+        self.path = path
+        self.matches = OrderedDict()
+        self.lock = threading.Lock()
+
+    def close(self):
+        if self.path is not None:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+    def matching_packets(self, op_code: int = None, error_only: bool = False, entity_id: int = None,
+            frames: tuple = None, frame_source: str = "host") -> np.ndarray:
+        # frames is an inclusive (first, last) range of frame numbers
+        key = (op_code, error_only, entity_id, frames, frame_source)
+        with self.lock:
+            if key in self.matches:
+                self.matches.move_to_end(key)
+                return self.matches[key]
+        candidates = []
+        if op_code is not None:
+            candidates.append(self.index.op_codes[op_code])
+        if entity_id is not None:
+            candidates.append(self.index.entities[entity_id])
+        if frames is not None:
+            candidates.append(self.index.frames[frame_source].packets(*frames))
+        if not candidates:
+            packets = self.index.error_packets() if error_only else np.arange(len(self.capture), dtype=np.int64)
+        else:
+            candidates.sort(key=len)
+            packets = candidates[0]
+            for other in candidates[1:]:
+                packets = np.intersect1d(packets, other, assume_unique=True)
+            if error_only:
+                packets = packets[self.index.has_error(packets)]
+        with self.lock:
+            self.matches[key] = packets
+            while len(self.matches) > MATCH_CACHE_SIZE:
+                self.matches.popitem(last=False)
+        return packets
+
+    def page_packets(self, page: int, size: int, **filters):
+        # (number of matching packets, sorted indexes of the packets on the page)
+        matching = self.matching_packets(**filters)
+        return len(matching), matching[page * size:(page + 1) * size]
+
+    def page(self, page: int, size: int, **filters):
+        # (number of matching packets, {Packet field name: [LayerRecord]} of the packets on the page)
+        total, packets = self.page_packets(page, size, **filters)
+        return total, self.capture.page_layers(packets)
+
+    def summary_columns(self, packets: np.ndarray) -> dict:
+        # What the table shows of each of the sorted packets: numeric columns
+        # as arrays, NaN where a packet has no value, and the rest as lists
+        count = len(packets)
+        columns = {"index": packets, "timestamp": np.full(count, np.nan)}
+        addresses = {name: [None] * count for name in ("source_ip", "destination_ip", "protocol", "source_port", "destination_port")}
+        datagrams = self.capture.datagrams
+        datagram_index = self.capture.packet_index('ip_layer')
+        rows = page_rows(datagram_index, packets)
+        positions = np.searchsorted(packets, datagram_index[rows])
+        columns["timestamp"][positions] = datagrams["timestamp"][rows]
+        for position, datagram in zip(positions.tolist(), datagrams[rows]):
+            for name, value in zip(layer_fields(IPLayer), ip_layer_record(datagram).values):
+                if name in addresses:
+                    addresses[name][position] = value
+        columns.update(addresses)
+        op_codes = [[] for _ in range(count)]
+        for op_code in self.index.op_codes.keys.tolist():
+            for position in np.flatnonzero(np.isin(packets, self.index.op_codes[op_code], assume_unique=True)).tolist():
+                op_codes[position].append(op_code)
+        columns["op_codes"] = op_codes
+        columns["packet_error"] = self.index.has_error(packets)
+        for source, (name, field) in FRAME_COLUMNS.items():
+            frames = np.full(count, np.nan)
+            table = self.capture.tables.get(name)
+            if table is not None:
+                packet_index = self.capture.packet_index(name)
+                rows = page_rows(packet_index, packets)
+                frames[np.searchsorted(packets, packet_index[rows])] = table[field][rows]
+            columns[f"{source}_frame"] = frames
+        return columns
+
+    @contextmanager
+    def datagram(self, index: int):
+        # The Datagram of one packet, read from the end of the record before it.
+        # Its payload is a view of the file, only valid inside the with block.
+        record_ends = self.capture.record_ends
+        with open(self.path, "rb") as stream, capture_buffer(stream) as data:
+            yield read_record(data, index, int(record_ends[index - 1]) if index else None)
+
+    def summary(self) -> dict:
+        host_frames = self.index.frames["host"].frames
+        return {
+            "id": self.capture_id,
+            "packet_count": len(self.capture),
+            "error_count": len(self.index.error_packets()),
+            "op_codes": self.index.op_codes.counts(),
+            "entity_count": len(self.index.entities.keys),
+            "host_frames": [int(host_frames[0]), int(host_frames[-1])] if len(host_frames) else None,
+        }
+
+class CaptureStore:
+    # Sessions by id, dropping the least recently used beyond limit. Their
+    # capture files are copied to directory and removed along with them.
+
+    def __init__(self, limit: int, directory: str):
+        self.limit = limit
+        self.directory = directory
+        self.sessions = OrderedDict()
+        self.lock = threading.Lock()
+
+    def add(self, capture: ParsedCapture, stream) -> CaptureSession:
+        # stream is the capture file capture was parsed from. Compressed captures
+        # are kept decompressed, their packets are read again from record offsets.
+        compression = capture_compression(stream)
+        with tempfile.NamedTemporaryFile(prefix="cigi-capture-", dir=self.directory, delete=False) as kept:
+            if compression is None:
+                shutil.copyfileobj(stream, kept, 1 << 20)
+            else:
+                for chunk in decompressed_chunks(stream, compression):
+                    kept.write(chunk)
+        session = CaptureSession(uuid.uuid4().hex, capture, kept.name)
+        with self.lock:
+            self.sessions[session.capture_id] = session
+            while len(self.sessions) > self.limit:
+                self.sessions.popitem(last=False)[1].close()
+        return session
+
+    def get(self, capture_id: str) -> CaptureSession:
+        with self.lock:
+            session = self.sessions.get(capture_id)
+            if session is not None:
+                self.sessions.move_to_end(capture_id)
+            return session
+
+    def remove(self, capture_id: str) -> bool:
+        with self.lock:
+            session = self.sessions.pop(capture_id, None)
+        if session is None:
+            return False
+        session.close()
+        return True
+
+def default_store() -> CaptureStore:
+    return CaptureStore(int(os.environ.get("CIGI_CAPTURE_SESSIONS", 8)),
+        os.environ.get("CIGI_CAPTURE_DIR", tempfile.gettempdir()))
@@ -0,0 +1,101 @@
+from array import array
+import numpy as np
+from packet import *
+from cigiDecoder import LAYOUTS, is_cigi
+from batchValidation import compile_rules
+from parsedCapture import table_layer_type
+from captureIndex import FRAME_COLUMNS, FRAME_OP_CODES, MAX_FRAME_GAP
+
+class CaptureSummary:
+    # Statistics of a capture gathered while it is read: add_datagram sees
+    # every datagram and add_chunk is the CaptureBuilder sink, or is called by
+    # it, for every table chunk. Memory grows with the frames and the packets
+    # failing validation, not with the capture.
+
+    def __init__(self):
+        self.packet_count = 0
+        self.first_timestamp = None
+        self.last_timestamp = None
+        self.op_codes = {} # op code -> [packets, packets failing validation, {field: failures}]
+        self.error_packets = []
+        # Frame source -> packet indexes and timestamps of the datagrams starting a frame
+        self.anchors = {source: (array("q"), array("d")) for source in FRAME_COLUMNS}
+        # Frame source -> packet indexes and frame numbers from the first control packet of those datagrams
+        self.frames = {source: ([], []) for source in FRAME_COLUMNS}
+
+    def add_datagram(self, datagram):
+        self.packet_count = datagram.index + 1
+        if self.first_timestamp is None:
+            self.first_timestamp = datagram.timestamp
+        self.last_timestamp = datagram.timestamp
+        if datagram.payload is not None and is_cigi(datagram.payload):
+            for source, op_code in FRAME_OP_CODES.items():
+                if datagram.payload[0] == op_code:
+                    self.anchors[source][0].append(datagram.index)
+                    self.anchors[source][1].append(datagram.timestamp)
+
+    def add_chunk(self, name, chunk):
+        if name == 'ip_layer':
+            return
+        op_codes, inverse = np.unique(chunk["op_code"], return_inverse=True)
+        for position, op_code in enumerate(op_codes.tolist()):
+            rows = chunk["error_mask"][inverse == position]
+            counts = self.op_codes.setdefault(op_code, [0, 0, {}])
+            counts[0] += len(rows)
+            failed = rows[rows != 0]
+            counts[1] += len(failed)
+            for bit, field, _ in compile_rules(table_layer_type(op_code, chunk.dtype.names)):
+                failures = int(np.count_nonzero((failed >> np.uint64(bit)) & np.uint64(1)))
+                if failures:
+                    counts[2][field] = counts[2].get(field, 0) + failures
+        if name != 'user_defined':
+            self.error_packets.append(np.unique(chunk["packet_index"][chunk["error_mask"] != 0]))
+        for source, (table, column) in FRAME_COLUMNS.items():
+            if name == table:
+                packets, first_rows = np.unique(chunk["packet_index"], return_index=True)
+                self.frames[source][0].append(packets)
+                self.frames[source][1].append(chunk[column][first_rows].astype(np.int64))
+
+    def frame_stats(self, source: str) -> dict:
+        # Frame count and rate, the intervals between frames in milliseconds, and
+        # the frames missing from or repeated in the frame number sequence
+        packets, timestamps = self.anchors[source]
+        packets, timestamps = np.frombuffer(packets, dtype=np.int64), np.frombuffer(timestamps, dtype=np.float64)
+        frame_packets = np.concatenate(self.frames[source][0]) if self.frames[source][0] else np.empty(0, dtype=np.int64)
+        numbers = np.concatenate(self.frames[source][1]) if self.frames[source][1] else np.empty(0, dtype=np.int64)
+        # A datagram's control packets can straddle two chunks, its first row comes first
+        frame_packets, first_rows = np.unique(frame_packets, return_index=True)
+        numbers = numbers[first_rows]
+        _, anchor_rows, frame_rows = np.intersect1d(packets, frame_packets, assume_unique=True, return_indices=True)
+        timestamps, numbers = timestamps[anchor_rows], numbers[frame_rows]
+        if not len(numbers):
+            return {"frames": 0}
+        duration = float(timestamps[-1] - timestamps[0])
+        intervals = np.diff(timestamps) * 1e3
+        steps = np.diff(numbers)
+        gaps = steps[(steps > 1) & (steps <= MAX_FRAME_GAP)]
+        stats = {
+            "frames": len(numbers),
+            "first_frame": int(numbers[0]),
+            "last_frame": int(numbers[-1]),
+            "duration_seconds": duration,
+            "rate_hz": (len(numbers) - 1) / duration if duration > 0 else None,
+            "missing_frames": int(np.sum(gaps - 1)),
+            "repeated_frames": int(np.count_nonzero(steps == 0)),
+        }
+        if len(intervals):
+            stats["interval_ms"] = {"mean": float(intervals.mean()), "p50": float(np.percentile(intervals, 50)),
+                "p99": float(np.percentile(intervals, 99)), "max": float(intervals.max())}
+        return stats
+
+    def to_dict(self) -> dict:
+        error_packets = np.unique(np.concatenate(self.error_packets)) if self.error_packets else []
+        return {
+            "packets": self.packet_count,
+            "cigi_packets": sum(counts[0] for counts in self.op_codes.values()),
+            "error_packets": len(error_packets),
+            "duration_seconds": self.last_timestamp - self.first_timestamp if self.packet_count else 0.0,
+            "op_codes": {str(op_code): {"name": LAYOUTS[op_code].name, "packets": packets, "errors": errors, "fields": fields}
+                for op_code, (packets, errors, fields) in sorted(self.op_codes.items())},
+            "frames": {source: self.frame_stats(source) for source in FRAME_COLUMNS},
+        }
@@ -0,0 +1,333 @@
+import functools, re, struct
+from dataclasses import dataclass, fields
+from packet import *
+
+# Binary layouts of the CIGI 3.3 packets modelled in packet.py (ICD section 4).
+# Each entry is: op code, struct format (without byte order), and one item per
+# struct value. An item is either a LayerField name, None for values we do not
+# keep (op code, size, version, magic number), or a tuple of (name, shift, width)
+# bit fields packed into a single byte.
+LAYOUT_TABLE = {
+    1: ("BBBbBxHIII4x", (None, None, None, "db_number",
+        (("ig_mode", 0, 2), ("timestamp_valid", 2, 1), ("extrapolation_enable", 3, 1), ("minor_version", 4, 4)),
+        None, "host_frame_number", "timestamp", "last_ig_frame_number")),
+    2: ("BBHBBBxHHfffddd", (None, None, "entity_id",
+        (("entity_state", 0, 2), ("attach_state", 2, 1), ("coll_det_request", 3, 1), ("inherit_alpha", 4, 1), ("ground_ocean_clamp", 5, 2)),
+        (("animation_dir", 0, 1), ("animation_loop_mode", 1, 1), ("animation_state", 2, 2), ("extrapolation_enable", 4, 1)),
+        "alpha", "entity_type", "parent_id", "roll", "pitch", "yaw", "lat_xoff", "lon_yoff", "alt_zoff")),
+    3: ("BBHfdd", (None, None, "entity_id", "yaw", "latitude", "longitude")),
+    4: ("BBHHBB24s", (None, None, "component_id", "instance_id",
+        (("component_class", 0, 6),), "component_state", "component_data")),
+    5: ("BBHHBB8s", (None, None, "component_id", "instance_id",
+        (("component_class", 0, 6),), "component_state", "component_data")),
+    6: ("BBHBB2xffffff", (None, None, "entity_id", "part_id",
+        (("articulated_part_enable", 0, 1), ("x_offset_enable", 1, 1), ("y_offset_enable", 2, 1), ("z_offset_enable", 3, 1),
+         ("roll_enable", 4, 1), ("pitch_enable", 5, 1), ("yaw_enable", 6, 1)),
+        "x_offset", "y_offset", "z_offset", "roll", "pitch", "yaw")),
+    7: ("BBHBBBxff", (None, None, "entity_id", "part_id_1", "part_id_2",
+        (("dof_select_1", 0, 3), ("dof_select_2", 3, 3), ("part_enable_1", 6, 1), ("part_enable_2", 7, 1)),
+        "dof_1", "dof_2")),
+    8: ("BBHBB2xffffff", (None, None, "entity_id", "part_id",
+        (("apply_to_part", 0, 1), ("coordinate_system", 1, 1)),
+        "x_rate", "y_rate", "z_rate", "roll_rate", "pitch_rate", "yaw_rate")),
+    9: ("BBBBB3xIf", (None, None, "hour", "minute",
+        (("ephemeris_enable", 0, 1), ("sun_enable", 1, 1), ("moon_enable", 2, 1), ("star_enable", 3, 1), ("date_time_valid", 4, 1)),
+        "date", "star_intensity")),
+    10: ("BBBBffffff4x", (None, None, (("atmospheric_model_enable", 0, 1),), "humidity",
+        "air_temp", "visibility_range", "horiz_wind", "vert_wind", "wind_direction", "barometric_pressure")),
+    11: ("BBHB3xddfffff4x", (None, None, "region_id",
+        (("region_state", 0, 2), ("merge_weather_properties", 2, 1), ("merge_aerosol_concentrations", 3, 1),
+         ("merge_maritime_surface_conditions", 4, 1), ("merge_terrestrial_surface_conditions", 5, 1)),
+        "latitude", "longitude", "size_x", "size_y", "corner_radius", "rotation", "transition_perimeter")),
+    12: ("BBHBBBB12f", (None, None, "entity_region_id", "layer_id", "humidity",
+        (("weather_enable", 0, 1), ("scud_enable", 1, 1), ("random_winds_enable", 2, 1), ("random_lightning_enable", 3, 1), ("cloud_type", 4, 4)),
+        (("scope", 0, 2), ("severity", 2, 3)),
+        "air_temp", "visibility_range", "scud_frequency", "coverage", "base_elevation", "thickness", "transition_band",
+        "horiz_wind", "vert_wind", "wind_direction", "barometric_pressure", "aerosol_concentration")),
+    13: ("BBHB3xfff4x", (None, None, "entity_id",
+        (("surface_conditions_enable", 0, 1), ("whitecap_enable", 1, 1), ("scope", 2, 2)),
+        "sea_surface_height", "surface_water_temperature", "surface_clarity")),
+    14: ("BBHBB2xffffff", (None, None, "entity_id", "wave_id",
+        (("wave_enable", 0, 1), ("scope", 1, 2), ("breaker_type", 3, 2)),
+        "wave_height", "wavelenght", "period", "direction", "phase_offset", "leading")),
+    15: ("BBHHBB", (None, None, "entity_id", "surface_condition_id",
+        (("surface_condition_enable", 0, 1), ("scope", 1, 2), ("severity", 3, 5)), "coverage")),
+    16: ("BBHBBHffffff", (None, None, "view_id", "group_id",
+        (("xoff_enable", 0, 1), ("yoff_enable", 1, 1), ("zoff_enable", 2, 1), ("roll_enable", 3, 1), ("pitch_enable", 4, 1), ("yaw_enable", 5, 1)),
+        "entity_id", "xoff", "yoff", "zoff", "roll", "pitch", "yaw")),
+    17: ("BBHBBBxffff", (None, None, "view_id", "sensor_id",
+        (("sensor_on_off", 0, 1), ("polarity", 1, 1), ("line_by_line_dropout_enable", 2, 1), ("automatic_gain", 3, 1),
+         ("track_white_black", 4, 1), ("track_mode", 5, 3)),
+        (("response_type", 0, 1),),
+        "gain", "level", "ac_coupling", "noise")),
+    18: ("BBHBBBx", (None, None, "view_id", "tracker_id",
+        (("tracker_enable", 0, 1), ("boresight_enable", 1, 1), ("x_enable", 2, 1), ("y_enable", 3, 1), ("z_enable", 4, 1),
+         ("roll_enable", 5, 1), ("pitch_enable", 6, 1), ("yaw_enable", 7, 1)),
+        (("view_select", 0, 1),))),
+    19: ("BBB5xdd", (None, None, (("custom_erm_enable", 0, 1),), "equatorial_radius", "flattening")),
+    20: ("BBH5f", (None, None, "entity_id", "acceleration_x", "acceleration_y", "acceleration_z", "retardation_rate", "terminal_velocity")),
+    21: ("BBHBBBx6f", (None, None, "view_id", "group_id",
+        (("near_enable", 0, 1), ("far_enable", 1, 1), ("left_enable", 2, 1), ("right_enable", 3, 1), ("top_enable", 4, 1),
+         ("bottom_enable", 5, 1), ("mirror_mode", 6, 2)),
+        (("pixel_replication_mode", 0, 3), ("projection_type", 3, 1), ("reorder", 4, 1), ("view_type", 5, 3)),
+        "near", "far", "left", "right", "top", "bottom")),
+    22: ("BBHBB2x6fI4x", (None, None, "entity_id", "segment_id", (("segment_enable", 0, 1),),
+        "x1", "y1", "z1", "x2", "y2", "z2", "material_mask")),
+    23: ("BBHBB2x9f4x", (None, None, "entity_id", "volume_id", (("volume_enable", 0, 1), ("volume_type", 1, 1)),
+        "x", "y", "z", "height", "width", "depth", "roll", "pitch", "yaw")),
+    24: ("BBHBBHddd", (None, None, "hat_hot_id", (("type", 0, 2), ("coordinate_system", 2, 1)),
+        "update_period", "entity_id", "lat_xoff", "lon_yoff", "alt_zoff")),
+    25: ("BBHBBH6dIBxH", (None, None, "los_id",
+        (("type", 0, 1), ("source_coord", 1, 1), ("destination_coord", 2, 1), ("response_coord", 3, 1), ("destination_entity_id_valid", 4, 1)),
+        "alpha", "entity_id", "source_lat_xoff", "source_lon_yoff", "source_alt_zoff",
+        "destination_lat_xoff", "destination_lon_xoff", "destination_alt_xoff", "material_mask", "update_period", "destination_entity_id")),
+    26: ("BBHBBH4f3dIB3x", (None, None, "los_id", (("type", 0, 1), ("source_coord", 1, 1), ("response_coord", 2, 1)),
+        "alpha", "entity_id", "azimuth", "elevation", "min_range", "max_range",
+        "source_lat_xoff", "source_lon_yoff", "source_alt_zoff", "material_mask", "update_period")),
+    27: ("BBHBB2x", (None, None, "object_id", "part_id", (("update_mode", 0, 1), ("object_class", 1, 3), ("coord_system", 4, 2)))),
+    28: ("BBBB4x3d", (None, None, (("type", 0, 4),), "request_id", "lat", "lon", "alt")),
+    101: ("BBBbBBHIII4x", (None, None, None, "db_number", "ig_status",
+        (("ig_mode", 0, 2), ("timestamp_valid", 2, 1), ("earth_reference_model", 3, 1), ("minor_version", 4, 4)),
+        None, "ig_frame_number", "timestamp", "last_host_frame_number")),
+    102: ("BBHB3xd", (None, None, "hat_hot_id", (("valid", 0, 1), ("type", 1, 1), ("host_frame_number_lsn", 4, 4)), "height")),
+    103: ("BBHB3xddIff4x", (None, None, "hat_hot_id", (("valid", 0, 1), ("host_frame_number_lsn", 4, 4)),
+        "hat", "hot", "material_code", "normal_vector_azimuth", "normal_vector_elevation")),
+    104: ("BBHBBHd", (None, None, "los_id",
+        (("valid", 0, 1), ("entity_id_valid", 1, 1), ("visible", 2, 1), ("host_frame_number_lsn", 4, 4)),
+        None, "entity_id", "range")),
+    105: ("BBHBBH4dBBBBIff", (None, None, "los_id",
+        (("valid", 0, 1), ("entity_id_valid", 1, 1), ("range_valid", 2, 1), ("visible", 3, 1), ("host_frame_number_lsn", 4, 4)),
+        "response_count", "entity_id", "range", "lat_xoff", "lon_yoff", "alt_zoff",
+        "red", "green", "blue", "alpha", "material_code", "normal_vector_azimuth", "normal_vector_elevation")),
+    106: ("BBHBB2xHHffI", (None, None, "view_id", "sensor_id", (("sensor_status", 0, 2),),
+        "gate_x_size", "gate_y_size", "gate_x_position", "gate_y_position", "host_frame_number")),
+    107: ("BBHBBHHHffI3d", (None, None, "view_id", "sensor_id", (("sensor_status", 0, 2), ("entity_id_valid", 2, 1)),
+        "entity_id", "gate_x_size", "gate_y_size", "gate_x_offset", "gate_y_offset", "host_frame_number",
+        "track_point_latitude", "track_point_londitude", "track_point_altitude")),
+    108: ("BBHBB2x3d3f4x", (None, None, "object_id", "part_id", (("object_class", 0, 3), ("coordinate_system", 3, 2)),
+        "lat_xoff", "lon_yoff", "alt_zoff", "roll", "pitch", "yaw")),
+    109: ("BBBB6f4x", (None, None, "request_id", "humidity",
+        "air_temp", "visibility_range", "horiz_wind", "vert_wind", "wind_direction", "barometric_pressure")),
+    110: ("BBBBf", (None, None, "request_id", "layer_id", "aerosol_concentration")),
+    111: ("BBBx3f", (None, None, "request_id", "sea_surface_height", "surface_water_temperature", "surface_clarity")),
+    112: ("BBBxI", (None, None, "request_id", "surface_condition_id")),
+    113: ("BBHBBHIf", (None, None, "entity_id", "segment_id", (("collision_type", 0, 1),),
+        "contacted_entity_id", "material_code", "intersection_distance")),
+    114: ("BBHBBHB7x", (None, None, "entity_id", "volume_id", (("collision_type", 0, 1),),
+        "contacted_entity_id", "contacted_volume_id")),
+    115: ("BBH4x", (None, None, "entity_id")),
+    116: ("BBH12s", (None, None, "event_id", "event_data")),
+    117: ("BBH", (None, None, "message_id")), # Followed by a variable length message string
+    201: ("BB", (None, None)), # User defined packets (201 - 255) carry 4 * n bytes of data after the header
+}
+
+# Bumped whenever decoding or validation changes, invalidating cached parse results
+DECODER_VERSION = 2
+USER_DEFINED_OP_CODES = range(201, 256)
+BYTE_SWAP_MAGIC = 0x8000
+MAJOR_VERSION = 3
+# Struct values of unnamed items that are not zero: major version and byte swap magic
+HEADER_VALUES = {
+    1: {2: MAJOR_VERSION, 5: BYTE_SWAP_MAGIC},
+    101: {2: MAJOR_VERSION, 6: BYTE_SWAP_MAGIC},
+}
+
+@dataclass
+class PacketLayout:
+    op_code: int
+    name: str # Field name of the layer on Packet
+    layer_type: type
+    size: int # Fixed part of the packet in bytes
+    structs: dict # Byte order ('>' or '<') -> precompiled struct.Struct
+    fields: tuple # (name, struct index, shift, mask) per decoded LayerField, mask is None for whole values
+    formats: tuple # struct format code of each decoded field, "u1" for bit fields
+    variable: bool = False # Trailing data up to the control size is kept as raw bytes
+
+def _format_tokens(fmt: str) -> list:
+    # One token per unpacked value and per run of pad bytes, e.g. "BBH2x3f12s" -> B B H 2x f f f 12s
+    tokens = []
+    for count, code in re.findall(r"(\d*)([a-zA-Z?])", fmt):
+        if code in "xs":
+            tokens.append(count + code)
+        else:
+            tokens.extend([code] * int(count or 1))
+    return tokens
+
+def _struct_codes(fmt: str) -> list:
+    # One format code per unpacked value, e.g. "BBH2x3f12s" -> B B H f f f 12s
+    return [token for token in _format_tokens(fmt) if not token.endswith("x")]
+
+def _compile_layout(op_code, name, layer_type, fmt, items):
+    codes = _struct_codes(fmt)
+    decoded = []
+    formats = []
+    for index, item in enumerate(items):
+        if item is None:
+            continue
+        if isinstance(item, tuple):
+            for bit_name, shift, width in item:
+                decoded.append((bit_name, index, shift, (1 << width) - 1))
+                formats.append("u1")
+        else:
+            decoded.append((item, index, 0, None))
+            formats.append(codes[index])
+    structs = {order: struct.Struct(order + fmt) for order in (">", "<")}
+    return PacketLayout(op_code, name, layer_type, structs[">"].size, structs, tuple(decoded), tuple(formats),
+        variable = op_code == 117 or op_code in USER_DEFINED_OP_CODES)
+
+def _build_layouts():
+    layouts = {}
+    for packet_field in fields(Packet):
+        if not issubclass(packet_field.type, Control) or not hasattr(packet_field.type, "op_code"):
+            continue
+        op_code = packet_field.type.op_code.value
+        fmt, items = LAYOUT_TABLE[op_code]
+        layouts[op_code] = _compile_layout(op_code, packet_field.name, packet_field.type, fmt, items)
+    for op_code in USER_DEFINED_OP_CODES:
+        layouts[op_code] = layouts[201]
+    return layouts
+
+LAYOUTS = _build_layouts()
+
+def field_offset(op_code: int, name: str) -> tuple:
+    # (byte offset, struct format code) of a whole value field, None if the packet has no such field
+    fmt, items = LAYOUT_TABLE[op_code if op_code not in USER_DEFINED_OP_CODES else 201]
+    offset = 0
+    values = iter(items)
+    for token in _format_tokens(fmt):
+        if not token.endswith("x") and next(values) == name:
+            return offset, token
+        offset += struct.calcsize(">" + token)
+    return None
+
+@functools.lru_cache(maxsize=None)
+def project_layout(op_code: int, names: frozenset) -> PacketLayout:
+    # Layout of op_code decoding only the named fields. The bytes of the other
+    # values become pad bytes of the struct, so they are never unpacked.
+    layout = LAYOUTS[op_code]
+    fmt, items = LAYOUT_TABLE[layout.op_code]
+    projected, kept = "", []
+    skipped = 0 # Pad bytes not yet written to the format
+    values = iter(items)
+    for token in _format_tokens(fmt):
+        item = None if token.endswith("x") else next(values)
+        if isinstance(item, tuple):
+            item = tuple(bits for bits in item if bits[0] in names) or None
+        elif item not in names:
+            item = None
+        if item is None:
+            skipped += struct.calcsize(">" + token)
+            continue
+        projected += (f"{skipped}x" if skipped else "") + token
+        skipped = 0
+        kept.append(item)
+    projected += f"{skipped}x" if skipped else ""
+    return _compile_layout(layout.op_code, layout.name, projected_layer(layout.layer_type, names), projected, kept)
+
+def field_reader(op_code: int, name: str) -> tuple:
+    # (byte offset, byte order -> struct) reading one field of a packet without unpacking the rest
+    offset, code = field_offset(op_code, name)
+    return offset, {order: struct.Struct(order + code) for order in (">", "<")}
+
+# Readers of the entity_id of the packets that have one
+ENTITY_ID_READERS = {op_code: field_reader(op_code, "entity_id") for op_code in LAYOUTS
+    if field_offset(op_code, "entity_id") is not None}
+
+def byte_order(payload) -> str:
+    # The IG Control and Start of Frame packets lead every CIGI message and carry
+    # the sender's byte swap magic number at bytes 6-7.
+    if len(payload) >= 8 and payload[0] in (1, 101):
+        if payload[6] == 0x00 and payload[7] == 0x80:
+            return "<"
+    return ">"
+
+def is_cigi(payload) -> bool:
+    # Same heuristic as Wireshark: a CIGI 3 message starts with an IG Control or
+    # Start of Frame of 24 bytes with major version 3.
+    return len(payload) >= 24 and payload[0] in (1, 101) and payload[1] == 24 and payload[2] == 3
+
+def walk_packets(payload):
+    # Yields (op code, offset, size) for every packet in a CIGI message
+    offset = 0
+    end = len(payload)
+    while offset + 2 <= end:
+        size = payload[offset + 1]
+        if size < 2 or offset + size > end:
+            return
+        yield payload[offset], offset, size
+        offset += size
+
+def unpack_packet(layout: PacketLayout, payload, offset: int, order: str = ">", size: int = None) -> list:
+    # Values in field_names order. Raw data fields are returned as bytes.
+    values = layout.structs[order].unpack_from(payload, offset)
+    decoded = []
+    for name, index, shift, mask in layout.fields:
+        value = values[index]
+        if mask is not None:
+            value = (value >> shift) & mask
+        decoded.append(value)
+    if layout.variable and size is not None and layout.op_code in USER_DEFINED_OP_CODES:
+        decoded.append(bytes(payload[offset + layout.size:offset + size]))
+    return decoded
+
+def field_names(layout: PacketLayout) -> list:
+    names = [name for name, _, _, _ in layout.fields]
+    if layout.op_code in USER_DEFINED_OP_CODES:
+        names.append("data")
+    return names
+
+def build_record(layout: PacketLayout, payload, offset: int, size: int, order: str = ">", validate: bool = True) -> LayerRecord:
+    # Values in layer_fields order, fields missing from the binary layout keep their class default
+    decoded = dict(zip(field_names(layout), unpack_packet(layout, payload, offset, order, size)))
+    decoded["control_size"] = size
+    decoded["op_code"] = payload[offset]
+    values = []
+    for name, default in layer_schema(layout.layer_type).items():
+        value = decoded.get(name, default.value)
+        values.append(value.hex() if isinstance(value, bytes) else value)
+    packet_record = LayerRecord(layout.layer_type, values)
+    if validate:
+        packet_record.validate()
+    return packet_record
+
+def pack_packet(op_code: int, values: dict, order: str = ">") -> bytes:
+    # Inverse of unpack_packet, used to write synthetic traffic. Missing values are 0, or zero bytes.
+    fmt, items = LAYOUT_TABLE[op_code if op_code not in USER_DEFINED_OP_CODES else 201]
+    codes = _struct_codes(fmt)
+    packer = LAYOUTS[op_code].structs[order]
+    data = bytes.fromhex(values.get("data", "")) if op_code in USER_DEFINED_OP_CODES else b""
+    struct_values = []
+    for index, item in enumerate(items):
+        if item is None:
+            struct_values.append(HEADER_VALUES.get(op_code, {}).get(index, 0))
+        elif isinstance(item, tuple):
+            struct_values.append(sum((int(values.get(name, 0)) & ((1 << width) - 1)) << shift for name, shift, width in item))
+        else:
+            value = values.get(item, b"" if codes[index].endswith("s") else 0)
+            struct_values.append(bytes.fromhex(value) if isinstance(value, str) else value)
+    struct_values[0] = op_code
+    struct_values[1] = packer.size + len(data)
+    return packer.pack(*struct_values) + data
+
+def decode_message(payload, validate: bool = True, projection = None) -> dict:
+    # Decodes a CIGI message into {Packet field name: [LayerRecord]}, every packet
+    # of a type in message order. With validate off the records are left for the
+    # caller to validate. A decodeProjection.Projection limits the packets decoded
+    # to its layouts and entities, the others are skipped from their header.
+    layers = {}
+    order = byte_order(payload)
+    layouts = LAYOUTS if projection is None else projection.layouts
+    entity_ids = None if projection is None else projection.entity_ids
+    for op_code, offset, size in walk_packets(payload):
+        layout = layouts.get(op_code)
+        if layout is None or size < layout.size:
+            continue
+        if entity_ids is not None and op_code in ENTITY_ID_READERS:
+            field, readers = ENTITY_ID_READERS[op_code]
+            if readers[order].unpack_from(payload, offset + field)[0] not in entity_ids:
+                continue
+        records = layers.get(layout.name)
+        if records is None:
+            records = layers[layout.name] = []
+        records.append(build_record(layout, payload, offset, size, order, validate))
+    return layers
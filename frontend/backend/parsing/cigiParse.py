@@ -0,0 +1,139 @@
+import argparse, hashlib, json, os, sys, time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from parsedCapture import CaptureBuilder
+from captureSummary import CaptureSummary
+from captureExport import EXPORT_FORMATS, CaptureExporter
+from pcapReader import read_capture
+
+# Files picked up from the directories given on the command line, also when gzip or zstd compressed
+CAPTURE_EXTENSIONS = tuple(extension + compression for extension in (".pcap", ".pcapng", ".cap") for compression in ("", ".gz", ".zst"))
+# Captures processed so far, one JSON line each, in the output directory
+PROGRESS_FILE = "cigi-parse-progress.jsonl"
+
+def capture_files(paths: list) -> list:
+    # (capture path, path relative to the output directory) of the files given
+    # and of the captures found under the directories given. Captures that would
+    # share an output path, e.g. a/run.pcap and b/run.pcap, each get a suffix
+    # from a hash of their absolute path.
+    files = {}
+    for path in paths:
+        if not os.path.isdir(path):
+            files.setdefault(os.path.abspath(path), (path, os.path.basename(path)))
+            continue
+        for directory, _, names in os.walk(path):
+            for name in sorted(names):
+                if name.lower().endswith(CAPTURE_EXTENSIONS):
+                    capture = os.path.join(directory, name)
+                    files.setdefault(os.path.abspath(capture), (capture, os.path.relpath(capture, path)))
+    outputs = Counter(relative for _, relative in files.values())
+    return sorted((path, relative if outputs[relative] == 1 else unique_output(absolute, relative))
+        for absolute, (path, relative) in files.items())
+
+def unique_output(absolute: str, relative: str) -> str:
+    # run.pcap.gz -> run-<hash>.pcap.gz
+    directory, name = os.path.split(relative)
+    stem, dot, extension = name.partition(".")
+    digest = hashlib.blake2b(absolute.encode(), digest_size=4).hexdigest()
+    return os.path.join(directory, f"{stem}-{digest}{dot}{extension}")
+
+def file_key(path: str) -> dict:
+    # What a file must still match for its earlier result to be reused
+    stat = os.stat(path)
+    return {"file": os.path.abspath(path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+def parse_file(path: str, output: str, export_format: str = None) -> dict:
+    # Reads a capture once, writing its summary to output + ".summary.json" and
+    # with export_format its tables to the output + "." + export_format directory
+    start = time.perf_counter()
+    summary = CaptureSummary()
+    exporter = None
+    sink = summary.add_chunk
+    if export_format is not None:
+        os.makedirs(output + "." + export_format, exist_ok=True)
+        exporter = CaptureExporter(output + "." + export_format, export_format)
+        def sink(name, chunk):
+            summary.add_chunk(name, chunk)
+            exporter(name, chunk)
+    builder = CaptureBuilder(sink)
+    try:
+        with open(path, "rb") as stream:
+            for datagram in read_capture(stream):
+                summary.add_datagram(datagram)
+                builder.add_datagram(datagram)
+            builder.flush()
+    finally:
+        if exporter is not None:
+            exporter.close()
+    content = {"file": os.path.abspath(path), **summary.to_dict(), "parse_seconds": time.perf_counter() - start}
+    # Written whole or not at all, so an interrupted run leaves no partial summary
+    with open(output + ".summary.json.tmp", "w") as summary_file:
+        json.dump(content, summary_file, indent=1)
+    os.replace(output + ".summary.json.tmp", output + ".summary.json")
+    return content
+
+def read_progress(path: str) -> dict:
+    # {absolute capture path: last progress line}, lines cut short by an interrupted run are ignored
+    progress = {}
+    if os.path.exists(path):
+        with open(path) as progress_file:
+            for line in progress_file:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                progress[entry["file"]] = entry
+    return progress
+
+def run(paths: list, output: str, workers: int, export_format: str = None, force: bool = False) -> int:
+    # Parses the captures not processed by an earlier run across workers processes and returns the number that failed.
+    # A capture is processed again when export_format asks for an export the earlier run did not write.
+    os.makedirs(output, exist_ok=True)
+    progress_path = os.path.join(output, PROGRESS_FILE)
+    progress = {} if force else read_progress(progress_path)
+    files = capture_files(paths)
+    pending = []
+    for path, relative in files:
+        key = file_key(path)
+        done = progress.get(key["file"])
+        if done is not None and done["state"] == "done" and all(done[name] == value for name, value in key.items()) \
+                and os.path.exists(os.path.join(output, relative + ".summary.json")) \
+                and (export_format is None or (done.get("export") == export_format
+                    and os.path.isdir(os.path.join(output, relative + "." + export_format)))):
+            continue
+        pending.append((path, relative, key))
+    print(f"{len(pending)} captures to parse, {len(files) - len(pending)} already done", file=sys.stderr)
+    failed = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool, open(progress_path, "a") as progress_file:
+        futures = {}
+        for path, relative, key in pending:
+            destination = os.path.join(output, relative)
+            os.makedirs(os.path.dirname(destination), exist_ok=True)
+            futures[pool.submit(parse_file, path, destination, export_format)] = (path, relative, key)
+        for future in as_completed(futures):
+            path, relative, key = futures[future]
+            try:
+                content = future.result()
+                entry = {**key, "state": "done", "summary": relative + ".summary.json", "export": export_format}
+                print(f"{path}: {content['packets']} packets, {content['cigi_packets']} CIGI packets, "
+                    f"{content['error_packets']} with errors in {content['parse_seconds']:.2f}s", file=sys.stderr)
+            except Exception as error:
+                failed += 1
+                entry = {**key, "state": "failed", "error": str(error)}
+                print(f"{path}: failed, {error}", file=sys.stderr)
+            progress_file.write(json.dumps(entry) + "\n")
+            progress_file.flush()
+    return failed
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="cigi-parse", description="Parse captures in parallel without the server, writing a "
+        "summary of each (packets, validation failures by op code and field, frame rates) and optionally its tables. "
+        "Captures already parsed by an earlier run into the same output directory are skipped.")
+    parser.add_argument("paths", nargs="+", help="capture files, or directories searched for " + ", ".join(CAPTURE_EXTENSIONS))
+    parser.add_argument("-o", "--output", required=True, help="directory of the summaries, exports and progress file")
+    parser.add_argument("-w", "--workers", type=int, default=int(os.environ.get("CIGI_PARSE_WORKERS", os.cpu_count() or 1)))
+    parser.add_argument("--export", choices=list(EXPORT_FORMATS), help="also write one file per packet type in this format")
+    parser.add_argument("--force", action="store_true", help="parse every capture again")
+    args = parser.parse_args()
+
+    sys.exit(1 if run(args.paths, args.output, args.workers, args.export, args.force) else 0)
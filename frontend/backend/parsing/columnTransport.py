@@ -0,0 +1,113 @@
+import json
+import numpy as np
+from packet import *
+from batchValidation import error_messages
+from parsedCapture import ip_layer_record, layer_record, packet_rows, table_layer_type
+
+# Binary responses, sent instead of JSON to clients accepting this media type.
+# A little endian uint32 header length, the UTF-8 JSON header padded with
+# spaces to a multiple of 8 bytes, then the column buffers. Every buffer starts
+# at a multiple of 8 bytes from the start of the response, so a client wraps it
+# as a typed array without copying or parsing each value.
+BINARY_MEDIA_TYPE = "application/octet-stream"
+
+# (JS typed array, little endian dtype) of each numeric column dtype. 64 bit
+# integers are sent as float64, exact for the packet indexes they hold.
+COLUMN_TYPES = {
+    "i1": ("int8", "<i1"), "u1": ("uint8", "<u1"), "i2": ("int16", "<i2"), "u2": ("uint16", "<u2"),
+    "i4": ("int32", "<i4"), "u4": ("uint32", "<u4"), "f4": ("float32", "<f4"), "f8": ("float64", "<f8"),
+    "i8": ("float64", "<f8"), "u8": ("float64", "<f8"), "b1": ("uint8", "<u1"),
+}
+
+def accepts_binary(accept: str) -> bool:
+    return accept is not None and BINARY_MEDIA_TYPE in accept
+
+class _Columns:
+    # Collects the aligned buffers of one response, the header holds their
+    # offsets from the end of the header
+
+    def __init__(self):
+        self.buffers = []
+        self.size = 0
+
+    def add(self, values: np.ndarray) -> dict:
+        column_type, dtype = COLUMN_TYPES[values.dtype.kind + str(values.dtype.itemsize)]
+        data = np.ascontiguousarray(values, dtype=dtype).tobytes()
+        column = {"type": column_type, "offset": self.size, "length": len(values)}
+        self.buffers.append(data + b"\0" * (-len(data) % 8))
+        self.size += len(self.buffers[-1])
+        return column
+
+    def content(self, header: dict) -> bytes:
+        text = json.dumps(header).encode()
+        text += b" " * (-(len(text) + 4) % 8)
+        return b"".join([len(text).to_bytes(4, "little"), text, *self.buffers])
+
+def _layer_columns(columns: _Columns, capture, rows_of) -> dict:
+    # For every layer with rows rows_of(packet_index) selects, the packet_index
+    # of those rows and a column per field, in layer_fields order. Text fields
+    # are listed in the header under values, as are the error messages of rows
+    # that failed validation by row.
+    layers = {}
+    datagrams = capture.datagrams
+    rows = rows_of(capture.packet_index('ip_layer'))
+    if len(rows):
+        records = [ip_layer_record(datagram) for datagram in datagrams[rows]]
+        layers['ip_layer'] = {
+            "packet_index": columns.add(datagrams["packet_index"][rows]),
+            "fields": [{"values": [record.values[position] for record in records]} for position in range(len(layer_fields(IPLayer)))],
+            "errors": {},
+        }
+    for name, table in capture.tables.items():
+        rows = rows_of(capture.packet_index(name))
+        if not len(rows):
+            continue
+        chunk = table[rows]
+        layer_type = table_layer_type(int(chunk[0]["op_code"]), chunk.dtype.names)
+        records = None
+        fields = []
+        for position, field in enumerate(layer_fields(layer_type)):
+            if chunk.dtype[field].kind in "iuf":
+                fields.append(columns.add(chunk[field]))
+                continue
+            if records is None:
+                records = [layer_record(layer_type, row) for row in chunk]
+            fields.append({"values": [record.values[position] for record in records]})
+        layers[name] = {
+            "packet_index": columns.add(chunk["packet_index"]),
+            "fields": fields,
+            "errors": {str(row): error_messages(layer_type, chunk[row]) for row in np.flatnonzero(chunk["error_mask"])},
+        }
+    return layers
+
+def page_content(capture, packets: np.ndarray, header: dict) -> bytes:
+    # A capture page as columns: the indexes of its packets, then every row of
+    # every layer of each packet
+    columns = _Columns()
+    layers = _layer_columns(columns, capture, lambda packet_index: packet_rows(packet_index, packets))
+    return columns.content({**header, "packets": columns.add(packets), "layers": layers})
+
+def frames_content(capture, frames: list, header: dict) -> bytes:
+    # Consecutive frames as columns: the number and packet range of each frame,
+    # then every row of every layer in those packets
+    columns = _Columns()
+    start, stop = (frames[0].start, frames[-1].stop) if frames else (0, 0)
+    layers = _layer_columns(columns, capture,
+        lambda packet_index: np.arange(np.searchsorted(packet_index, start), np.searchsorted(packet_index, stop)))
+    return columns.content({**header, "frames": [{"frame": frame.number, "packets": [frame.start, frame.stop]} for frame in frames],
+        "layers": layers})
+
+def series_content(x: np.ndarray, y: np.ndarray, header: dict) -> bytes:
+    columns = _Columns()
+    return columns.content({**header, "x": columns.add(x), "y": columns.add(y)})
+
+def columns_content(columns: dict, header: dict) -> bytes:
+    # Arrays as buffers, lists in the header under values
+    buffers = _Columns()
+    specs = {name: buffers.add(values) if isinstance(values, np.ndarray) else {"values": values} for name, values in columns.items()}
+    return buffers.content({**header, "columns": specs})
+
+def column_rows(columns: dict) -> list:
+    # The same columns as one dict per row, NaN as null
+    lists = {name: values.tolist() if isinstance(values, np.ndarray) else values for name, values in columns.items()}
+    return [{name: None if value != value else value for name, value in zip(lists, row)} for row in zip(*lists.values())]
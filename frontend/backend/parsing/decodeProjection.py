@@ -0,0 +1,125 @@
+from packet import *
+from cigiDecoder import LAYOUTS, field_reader, byte_order, is_cigi, project_layout
+from captureIndex import FRAME_COLUMNS, FRAME_OP_CODES
+from deltaEncoding import delta_key
+
+# Validators reading only their own field, any other may read its siblings
+FIELD_VALIDATORS = (inclusiveRangeValidator, exclusiveRangeValidator, discreteValueValidator)
+# Op codes decoded into each layer, user defined data has 55
+LAYER_OP_CODES = {}
+for op_code, layout in sorted(LAYOUTS.items()):
+    LAYER_OP_CODES.setdefault(layout.name, []).append(op_code)
+# Readers of the frame number of the packet leading the messages of each frame source
+FRAME_READERS = {source: field_reader(FRAME_OP_CODES[source], column) for source, (_, column) in FRAME_COLUMNS.items()}
+
+def projected_fields(layer_name: str, names) -> frozenset:
+    # The named fields of a layer plus those every projected layer keeps: op_code,
+    # the keys delta output encodes the layer by, and the siblings a field's
+    # validator reads
+    layer_type = LAYOUTS[LAYER_OP_CODES[layer_name][0]].layer_type
+    schema = layer_schema(layer_type)
+    unknown = [name for name in names if name not in schema]
+    if unknown:
+        raise ValueError(f"Unknown fields {unknown} of {layer_name}")
+    names = {"op_code", *names, *(delta_key(layer_name) or ())}
+    if any(schema[name].validator not in (None, *FIELD_VALIDATORS) for name in names):
+        names.update(name for name, default in schema.items() if default.validator is not None)
+    return frozenset(names)
+
+class Projection:
+    # What a native parse decodes: whole layers by op code, fields of layers,
+    # the packets about some entities and the datagrams of an inclusive range
+    # of frame numbers, each None for all. Packets outside it are skipped from
+    # their header, without being unpacked, validated or serialized.
+
+    def __init__(self, op_codes = None, fields = None, entity_ids = None, frames: tuple = None, frame_source: str = "host"):
+        # fields maps layer names to the field names to keep, None keeping the whole layer
+        self.op_codes = None if op_codes is None else frozenset(op_codes)
+        self.fields = None if fields is None else {name: None if names is None else frozenset(names) for name, names in fields.items()}
+        self.entity_ids = None if entity_ids is None else frozenset(entity_ids)
+        self.frames = frames
+        self.frame_source = frame_source
+        if frame_source not in FRAME_READERS:
+            raise ValueError(f"Unknown frame_source {frame_source}, expected one of {list(FRAME_READERS)}")
+        # Op code -> layout of every packet decoded
+        self.layouts = LAYOUTS
+        self.ip_layer = True
+        if self.op_codes is not None or self.fields is not None:
+            self.layouts = {}
+            self.ip_layer = self.fields is not None and "ip_layer" in self.fields
+            for name, names in (self.fields or {}).items():
+                if name == "ip_layer":
+                    if names is not None:
+                        raise ValueError("ip_layer is only projected whole")
+                    continue
+                if name not in LAYER_OP_CODES:
+                    raise ValueError(f"Unknown layer {name}")
+                for op_code in LAYER_OP_CODES[name]:
+                    self.layouts[op_code] = LAYOUTS[op_code] if names is None else project_layout(op_code, projected_fields(name, names))
+            # Layers selected by op code are kept whole
+            for op_code in self.op_codes or ():
+                if op_code not in LAYOUTS:
+                    raise ValueError(f"Unknown op_code {op_code}")
+                self.layouts[op_code] = LAYOUTS[op_code]
+
+    def __reduce__(self):
+        # Built again from the spec in the workers of a parallel parse, projected layer classes do not pickle
+        return Projection, (self.op_codes, self.fields, self.entity_ids, self.frames, self.frame_source)
+
+    def key(self) -> str:
+        # Canonical text of the projection, part of the cache key of its parses
+        return repr((sorted(self.op_codes) if self.op_codes is not None else None,
+            sorted((name, sorted(names) if names is not None else None) for name, names in self.fields.items()) if self.fields is not None else None,
+            sorted(self.entity_ids) if self.entity_ids is not None else None, self.frames, self.frame_source))
+
+    def schema(self, schema: dict) -> dict:
+        # packet_schema() of the projected layers, listing the fields they keep
+        layer_types = {layout.name: layout.layer_type for layout in self.layouts.values()}
+        if self.ip_layer:
+            layer_types["ip_layer"] = IPLayer
+        return {name: {**layer, "fields": [{"name": field, "valid_range": default.valid_range, "validator": validator_name(default.validator)}
+            for field, default in layer_schema(layer_types[name]).items()]} for name, layer in schema.items() if name in layer_types}
+
+    def datagrams(self, datagrams):
+        # The datagrams from the control packet of a frame in range up to the next
+        # control packet, in capture order like FrameIndex
+        if self.frames is None:
+            yield from datagrams
+            return
+        first, last = self.frames
+        op_code = FRAME_OP_CODES[self.frame_source]
+        offset, readers = FRAME_READERS[self.frame_source]
+        inside = False
+        for datagram in datagrams:
+            payload = datagram.payload
+            if payload is not None and payload[0] == op_code and is_cigi(payload):
+                inside = first <= readers[byte_order(payload)].unpack_from(payload, offset)[0] <= last
+            if inside:
+                yield datagram
+
+def _numbers(text: str, name: str) -> list:
+    try:
+        return [int(value) for value in text.split(",") if value.strip()]
+    except ValueError:
+        raise ValueError(f"{name} must be comma separated integers")
+
+def parse_projection(op_codes: str = None, fields: str = None, entity_ids: str = None, frames: tuple = None,
+        frame_source: str = "host") -> Projection:
+    # Projection of the query parameters of /parsefile, None when they select everything.
+    # op_codes and entity_ids are comma separated numbers, fields comma separated
+    # layer.field names or bare layer names, e.g. "entity_control.alt_zoff,ip_layer".
+    if op_codes is None and fields is None and entity_ids is None and frames is None:
+        return None
+    projected = None
+    if fields is not None:
+        projected = {}
+        for item in fields.split(","):
+            name, _, field = item.strip().partition(".")
+            if not name:
+                continue
+            if not field:
+                projected[name] = None
+            elif name not in projected or projected[name] is not None:
+                projected.setdefault(name, set()).add(field)
+    return Projection(None if op_codes is None else _numbers(op_codes, "op_codes"), projected,
+        None if entity_ids is None else _numbers(entity_ids, "entity_ids"), frames, frame_source)
@@ -0,0 +1,69 @@
+import functools, json
+from packet import *
+
+# Fields identifying the entity, part or component a layer describes. Layers of
+# the same name and key are delta encoded against each other, every other layer
+# but user defined data against the previous layer of its name.
+DELTA_KEYS = {
+    "ip_layer": ("source_ip", "source_port"),
+    "entity_control": ("entity_id",),
+    "conformal_clamped_entity_control": ("entity_id",),
+    "rate_control": ("entity_id", "part_id"),
+    "articulated_part_control": ("entity_id", "part_id"),
+    "short_articulated_part_control": ("entity_id", "part_id_1", "part_id_2"),
+    "component_control": ("component_class", "instance_id", "component_id"),
+    "short_component_control": ("component_class", "instance_id", "component_id"),
+}
+# Layers sent whole, their length depends on the packet
+UNENCODED_LAYERS = ("user_defined",)
+# Occurrences of a layer and key between two keyframes, so a reader can start
+# from any point of the stream and have every state after that many packets
+KEYFRAME_INTERVAL = 100
+
+def delta_key(name: str) -> tuple:
+    # Key field names of a layer, None if the layer is never delta encoded
+    if name in UNENCODED_LAYERS:
+        return None
+    return DELTA_KEYS.get(name, ())
+
+@functools.lru_cache(maxsize=None)
+def key_positions(layer_type, name: str) -> tuple:
+    fields = layer_fields(layer_type)
+    return tuple(fields.index(field) for field in delta_key(name))
+
+class DeltaEncoder:
+    # Serializes the packets of one response in the compact shape, where a
+    # layer seen before under the same key is replaced by an object holding its
+    # changed fields, and its key fields, by position: {"3": 1.5, "2": 7}.
+    # Keyframes are plain value lists, as in the compact output.
+
+    def __init__(self, keyframe_interval: int = KEYFRAME_INTERVAL):
+        self.keyframe_interval = keyframe_interval
+        self.states = {} # (layer name, *key values) -> [values, occurrences since the keyframe]
+
+    def encode(self, name: str, packet_record: LayerRecord):
+        values = packet_record.values
+        if name in UNENCODED_LAYERS:
+            return values
+        positions = key_positions(packet_record.layer_type, name)
+        key = (name, *[values[position] for position in positions])
+        state = self.states.get(key)
+        if state is None or state[1] >= self.keyframe_interval:
+            self.states[key] = [values, 1]
+            return values
+        previous = state[0]
+        state[0] = values
+        state[1] += 1
+        if values == previous:
+            return {str(position): values[position] for position in positions}
+        return {str(position): value for position, (value, old) in enumerate(zip(values, previous))
+            if value != old or position in positions}
+
+    def __call__(self, layers: dict) -> str:
+        constructed_object = {name: [self.encode(name, packet_record) for packet_record in records] for name, records in layers.items()}
+        errors = record_errors(layers)
+        if errors:
+            constructed_object['errors'] = errors
+            if any(name != 'user_defined' for name in errors):
+                constructed_object['packet_error'] = True
+        return json.dumps(constructed_object)
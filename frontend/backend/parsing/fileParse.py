@@ -1,10 +1,32 @@
 from dataclasses import fields
 from packet import *
-from fastapi import FastAPI, File, UploadFile
+from cigiDecoder import DECODER_VERSION, decode_message, is_cigi
+from decodeProjection import parse_projection
+from parseCache import cache_key, content_hash, default_cache
+from parseMetrics import ParseMetrics, ParseTimings, packet_counts
+from captureExport import EXPORT_FORMATS, export_archive
+from packetJson import full_json, slim_json
+from deltaEncoding import DeltaEncoder, delta_key
+from parseJobs import JobQueue, ParseJob, default_queue
+from parsedCapture import frame_dict, parse_capture
+from captureSessions import default_store
+from captureDatabase import default_database
+from captureIndex import FRAME_COLUMNS
+from seriesSampling import SeriesError, downsampled_series, series_entity
+from columnTransport import (BINARY_MEDIA_TYPE, accepts_binary, column_rows, columns_content, frames_content, page_content,
+    series_content)
+from liveCapture import start_live_capture
+from pcapReader import CaptureFormatError, decompressed_size, read_capture
+from shardedParse import default_parser
+from fastapi import FastAPI, File, Header, HTTPException, UploadFile, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
+from functools import partial
+from itertools import chain, islice
 from pyshark.capture.pipe_capture import PipeCapture
+from starlette.background import BackgroundTask
 from uvicorn import run
-import json
+import json, os, shutil, tempfile, time
 
 app = FastAPI()
 
@@ -15,24 +37,79 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-@app.post("/parsefile")
-def parse_file(file: UploadFile = File(...)):
-    capture = PipeCapture(file.file)
-    packets = []
+# Engines yield {Packet field name: [LayerRecord]} per captured packet, every
+# packet of a type in message order, the renderers below turn those into the
+# response format.
+
+def ip_record(source_ip, destination_ip, protocol, source_port, destination_port) -> LayerRecord:
+    values = {'source_ip': source_ip, 'destination_ip': destination_ip, 'protocol': protocol,
+        'source_port': source_port, 'destination_port': destination_port}
+    return LayerRecord(IPLayer, [values.get(name, default.value) for name, default in layer_schema(IPLayer).items()])
+
+def native_layers(datagram, validate: bool = True, projection = None) -> dict:
+    # With a projection, None when none of the datagram's CIGI packets are in it
+    layers = {}
+    if datagram.source_ip is not None and (projection is None or projection.ip_layer):
+        layers['ip_layer'] = [ip_record(datagram.source_ip, datagram.destination_ip, datagram.protocol,
+            datagram.source_port, datagram.destination_port)]
+
+    if datagram.payload is not None and is_cigi(datagram.payload):
+        message = decode_message(datagram.payload, validate, projection)
+        if projection is not None and not message:
+            return None
+        layers.update(message)
+    elif projection is not None:
+        return None
+    return layers
+
+def native_packets(stream, timings: ParseTimings = None, projection = None):
+    datagrams = read_capture(stream) if projection is None else projection.datagrams(read_capture(stream))
+    if timings is None:
+        for datagram in datagrams:
+            layers = native_layers(datagram, projection=projection)
+            if layers is not None:
+                yield layers
+        return
+    # Stage times are summed in locals, updating timings per packet costs more than the clock reads
+    clock = time.perf_counter
+    read = decode = validate = 0.0
+    try:
+        start = clock()
+        for datagram in datagrams:
+            decode_start = clock()
+            layers = native_layers(datagram, False, projection)
+            validate_start = clock()
+            read += decode_start - start
+            decode += validate_start - decode_start
+            if layers is None:
+                start = validate_start
+                continue
+            for name, records in layers.items():
+                if name != 'ip_layer':
+                    for packet_record in records:
+                        packet_record.validate()
+            validate += clock() - validate_start
+            timings.count(layers)
+            yield layers
+            start = clock()
+        read += clock() - start
+    finally:
+        timings.stages.update(read=read, decode=decode, validate=validate)
+
+def pyshark_packets(stream, timings: ParseTimings = None):
+    capture = PipeCapture(stream)
+    if timings is not None:
+        capture = timings.timed(capture, "dissect")
     for capture_packet in capture:
-        constructed_object = {}
+        start = time.perf_counter()
+        layers = {}
         if 'IP' in capture_packet:
-            # Make new layer and populate with data
-            packet_ip_layer = IPLayer()
-            packet_ip_layer.source_ip.value = capture_packet.ip.src
-            packet_ip_layer.destination_ip.value = capture_packet.ip.dst
-            packet_ip_layer.protocol.value = capture_packet.transport_layer
-            packet_ip_layer.source_port.value = capture_packet[capture_packet.transport_layer].srcport
-            packet_ip_layer.destination_port.value = capture_packet[capture_packet.transport_layer].dstport
-            constructed_object['ip_layer'] = dataclasses.asdict(packet_ip_layer)
+            layers['ip_layer'] = [ip_record(capture_packet.ip.src, capture_packet.ip.dst, capture_packet.transport_layer,
+                capture_packet[capture_packet.transport_layer].srcport, capture_packet[capture_packet.transport_layer].dstport)]
 
         if 'cigi' in capture_packet:
-            # do the same as above but programmatically 
+            # do the same as above but programmatically, Wireshark only exposes
+            # the first packet of each type
             cigi_fields = capture_packet.cigi.__dict__['_all_fields']
             packet_fields = fields(Packet)
             for packet_field in packet_fields:
@@ -48,17 +125,515 @@ def parse_file(file: UploadFile = File(...)):
                         est_value = capture_packet.cigi.get_field_value(label)
                         packet_layer[layer_field.name].assign(float(est_value))
                 packet_layer['control_size'].assign(float(capture_packet.cigi.get_field_value(f'cigi.{packet_field.name}').size))
-                for layer_field in layer_fields:
-                    if not isinstance(packet_layer[layer_field.name], LayerField):
-                        continue
-                    packet_layer[layer_field.name].validate()
-                    if packet_layer[layer_field.name].valid is False:
-                        packet_layer.control_error = True
-                constructed_object[packet_field.name] = dataclasses.asdict(packet_layer)
-                if packet_layer.control_error and not packet_field.name is 'user_defined':
-                    constructed_object['packet_error'] = True
-        packets.append(constructed_object)
-    return json.dumps(packets, cls=CustomJSONEncoder)
+                packet_layer.validate()
+                layers[packet_field.name] = [LayerRecord.from_layer(packet_layer)]
+        if timings is not None:
+            timings.add("decode", start)
+            timings.count(layers)
+        yield layers
+
+def full_packet(layers) -> dict:
+    # Legacy response shape, every field with its value, validity and valid_range,
+    # in a list of every packet of the type
+    constructed_object = {}
+    for name, records in layers.items():
+        constructed_object[name] = [packet_record.to_dict() for packet_record in records]
+        if name != 'user_defined' and any(packet_record.control_error for packet_record in records):
+            constructed_object['packet_error'] = True
+    return constructed_object
+
+def compact_packet(layers) -> dict:
+    # Values only, in the field order published by /schema, a list per packet of
+    # the type. Error messages are listed separately by layer and position for the
+    # fields that failed validation, as in frame_dict.
+    constructed_object = {name: [packet_record.values for packet_record in records] for name, records in layers.items()}
+    errors = record_errors(layers)
+    if errors:
+        constructed_object['errors'] = errors
+        if any(name != 'user_defined' for name in errors):
+            constructed_object['packet_error'] = True
+    return constructed_object
+
+def compact_json(layers) -> str:
+    return json.dumps(compact_packet(layers))
+
+# Decoders selectable with the engine query parameter of /parsefile
+PARSE_ENGINES = {
+    "native": native_packets,
+    "pyshark": pyshark_packets,
+}
+
+# Response formats selectable with the output query parameter of /parsefile,
+# each turning a packet's layers into its JSON text. full is the text of
+# json.dumps(full_packet(layers)), written from templates of every layer type.
+OUTPUT_FORMATS = {
+    "full": full_json,
+    "compact": compact_json,
+    "slim": slim_json,
+}
+# Formats whose text depends on the packets before, built once per response.
+# delta sends layers seen before under the same key as their changed fields.
+STATEFUL_OUTPUTS = {
+    "delta": DeltaEncoder,
+}
+OUTPUT_NAMES = [*OUTPUT_FORMATS, *STATEFUL_OUTPUTS]
+
+def packet_serializer(output: str):
+    if output in STATEFUL_OUTPUTS:
+        return STATEFUL_OUTPUTS[output]()
+    return OUTPUT_FORMATS[output]
+
+# Packets per chunk of a streamed response
+STREAM_BATCH_SIZE = 100
+
+parse_cache = default_cache()
+# Worker processes of parallel parses, CIGI_PARSE_WORKERS defaults to one per core
+sharded_parser = default_parser()
+
+# Totals of every parse, served by /metrics
+parse_metrics = ParseMetrics()
+
+def timed_lines(packets, serialize, timings: ParseTimings):
+    # map(serialize, packets), timing the serialize stage
+    clock = time.perf_counter
+    serializing = 0.0
+    try:
+        for layers in packets:
+            start = clock()
+            line = serialize(layers)
+            serializing += clock() - start
+            yield line
+    finally:
+        timings.stages.update(serialize=serializing)
+
+def native_line(output, datagram, projection = None) -> str:
+    # Decodes and serializes one datagram, run in the workers of a parallel parse.
+    # None when the datagram is outside the projection.
+    layers = native_layers(datagram, projection=projection)
+    return OUTPUT_FORMATS[output](layers) if layers is not None else None
+
+def counted_line(output, datagram, projection = None):
+    # native_line plus the packet_counts() of the packet, which the request adds to its timings
+    layers = native_layers(datagram, projection=projection)
+    return (OUTPUT_FORMATS[output](layers), packet_counts(layers)) if layers is not None else None
+
+def counted_lines(results, timings: ParseTimings):
+    for result in results:
+        if result is None:
+            continue
+        line, counts = result
+        timings.add_counts(counts)
+        yield line
+
+def cached_lines(lines, key, keep_lines: bool = True):
+    # Passes the serialized packets through, caching them once the whole capture is
+    # decoded. Streamed responses only write them to the disk tier as they go.
+    entry = parse_cache.writer(key, keep_lines)
+    try:
+        for line in lines:
+            entry.write(line)
+            yield line
+        entry.commit()
+    finally:
+        entry.abort()
+
+def recorded_lines(lines, timings: ParseTimings, engine: str, output: str):
+    # Passes the serialized packets through, adding the parse to the metrics once it finishes
+    for line in lines:
+        timings.packets += 1
+        yield line
+    parse_metrics.record(timings, engine, output)
+
+def ndjson_lines(lines):
+    while True:
+        batch = list(islice(lines, STREAM_BATCH_SIZE))
+        if not batch:
+            return
+        yield "".join(line + "\n" for line in batch)
+
+@app.post("/parsefile")
+def parse_file(file: UploadFile = File(...), engine: str = "native", stream: bool = False, output: str = "full", parallel: bool = False,
+        timing: bool = False, op_codes: str = None, fields: str = None, entity_ids: str = None, frame_start: int = None,
+        frame_end: int = None, frame_source: str = "host"):
+    # op_codes, fields, entity_ids and the frame range select what is decoded, see
+    # decodeProjection.parse_projection. Packets with nothing selected are left out.
+    if engine not in PARSE_ENGINES:
+        raise HTTPException(status_code=400, detail=f"Unknown engine {engine}, expected one of {list(PARSE_ENGINES)}")
+    if output not in OUTPUT_NAMES:
+        raise HTTPException(status_code=400, detail=f"Unknown output {output}, expected one of {OUTPUT_NAMES}")
+    if parallel and engine != "native":
+        raise HTTPException(status_code=400, detail="Parallel parsing is only available with the native engine")
+    if parallel and output in STATEFUL_OUTPUTS:
+        raise HTTPException(status_code=400, detail=f"Parallel parsing is not available with output {output}")
+    projection = request_projection(op_codes, fields, entity_ids, frame_start, frame_end, frame_source)
+    if projection is not None and engine != "native":
+        raise HTTPException(status_code=400, detail="Projections are only available with the native engine")
+    if parallel and projection is not None and projection.frames is not None:
+        raise HTTPException(status_code=400, detail="Parallel parsing is not available with a frame range")
+    timings = ParseTimings()
+    start = time.perf_counter()
+    options = [engine, output] if projection is None else [engine, output, projection.key()]
+    key = cache_key(content_hash(file.file), DECODER_VERSION, *options)
+    start = timings.add("hash", start)
+    lines = parse_cache.get(key)
+    timings.add("cache", start)
+    if lines is None:
+        timings.bytes = file.file.seek(0, os.SEEK_END)
+        file.file.seek(0)
+        if parallel:
+            # Decoding happens in the workers, so the whole of it is one stage here
+            results = timings.timed(sharded_parser.parse(file.file, partial(counted_line, output, projection=projection)), "parallel")
+            lines = counted_lines(results, timings)
+        elif projection is not None:
+            lines = timed_lines(native_packets(file.file, timings, projection), packet_serializer(output), timings)
+        else:
+            lines = timed_lines(PARSE_ENGINES[engine](file.file, timings), packet_serializer(output), timings)
+        lines = cached_lines(recorded_lines(lines, timings, engine, output), key, not stream)
+    try:
+        if stream:
+            # Decode the first packet here so an invalid capture is still a 400
+            lines = iter(lines)
+            first_line = next(lines, None)
+            lines = chain([first_line], lines) if first_line is not None else iter(())
+            return StreamingResponse(ndjson_lines(lines), media_type="application/x-ndjson")
+        lines = list(lines)
+    except CaptureFormatError as error:
+        raise HTTPException(status_code=400, detail=str(error))
+    # Same text as json.dumps of the packet list
+    text = "[" + ", ".join(lines) + "]"
+    if timing:
+        # Streamed responses send their headers before the parse ends, so only whole responses are timed
+        return JSONResponse(content=text, headers={"Server-Timing": timings.server_timing()})
+    return text
+
+def request_projection(op_codes: str, fields: str, entity_ids: str, frame_start: int, frame_end: int, frame_source: str):
+    try:
+        return parse_projection(op_codes, fields, entity_ids, frame_range(frame_start, frame_end, frame_source), frame_source)
+    except ValueError as error:
+        raise HTTPException(status_code=400, detail=str(error))
+
+@app.get("/schema")
+def schema(op_codes: str = None, fields: str = None):
+    # Field names, valid ranges and validators of every layer, fetched once by
+    # clients of the compact output. delta_key lists the fields delta output
+    # keys the state of a layer by, null when the layer is always sent whole.
+    # With the op_codes and fields of a /parsefile projection, the layers and
+    # fields that parse returns.
+    schema = packet_schema()
+    projection = request_projection(op_codes, fields, None, None, None, "host")
+    if projection is not None:
+        schema = projection.schema(schema)
+    for name, layer in schema.items():
+        layer["delta_key"] = delta_key(name)
+    return schema
+
+# Parsed captures browsed a page at a time, CIGI_CAPTURE_SESSIONS are kept
+capture_store = default_store()
+
+def capture_session(capture_id):
+    session = capture_store.get(capture_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail=f"Unknown capture {capture_id}")
+    return session
+
+def capture_projection(op_codes: str, fields: str, entity_ids: str):
+    # The projection of a capture session, /parsefile's without the frame range:
+    # sessions keep the packet numbers of the capture, and their pages already
+    # select frames from the frame index
+    return request_projection(op_codes, fields, entity_ids, None, None, "host")
+
+@app.post("/captures")
+def create_capture(file: UploadFile = File(...), op_codes: str = None, fields: str = None, entity_ids: str = None):
+    # op_codes, fields and entity_ids keep only those packets and fields, as for /parsefile
+    projection = capture_projection(op_codes, fields, entity_ids)
+    try:
+        session = capture_store.add(parse_capture(file.file, projection=projection), file.file)
+    except CaptureFormatError as error:
+        raise HTTPException(status_code=400, detail=str(error))
+    return session.summary()
+
+@app.get("/captures/{capture_id}")
+def capture_summary(capture_id: str):
+    return capture_session(capture_id).summary()
+
+def frame_range(frame_start: int, frame_end: int, frame_source: str) -> tuple:
+    # The inclusive range of host (IG Control) or ig (Start of Frame) frame numbers to select, None for all
+    if frame_source not in FRAME_COLUMNS:
+        raise HTTPException(status_code=400, detail=f"Unknown frame_source {frame_source}, expected one of {list(FRAME_COLUMNS)}")
+    if frame_start is None and frame_end is None:
+        return None
+    return (frame_start if frame_start is not None else 0, frame_end if frame_end is not None else 2 ** 32 - 1)
+
+def capture_page(session, page: int, size: int, op_code: int, error_only: bool, entity_id: int, frame_start: int,
+        frame_end: int, frame_source: str) -> tuple:
+    # (page header, sorted indexes of the packets on the page)
+    if page < 0 or not 0 < size <= 10000:
+        raise HTTPException(status_code=400, detail="page must be >= 0 and size between 1 and 10000")
+    frames = frame_range(frame_start, frame_end, frame_source)
+    total, packets = session.page_packets(page, size, op_code=op_code, error_only=error_only, entity_id=entity_id,
+        frames=frames, frame_source=frame_source)
+    return {"page": page, "size": size, "total": total, "pages": -(-total // size)}, packets
+
+@app.get("/captures/{capture_id}/summaries")
+def capture_summaries(capture_id: str, page: int = 0, size: int = 100, op_code: int = None, error_only: bool = False,
+        entity_id: int = None, frame_start: int = None, frame_end: int = None, frame_source: str = "host",
+        accept: str = Header(None)):
+    # The rows of the table, selected like /packets: index, timestamp, IP 5-tuple, op codes, packet_error and
+    # host/ig frame numbers. The layers of a packet are fetched from /packets/{index} when it is expanded.
+    session = capture_session(capture_id)
+    header, packets = capture_page(session, page, size, op_code, error_only, entity_id, frame_start, frame_end, frame_source)
+    columns = session.summary_columns(packets)
+    if accepts_binary(accept):
+        return Response(columns_content(columns, header), media_type=BINARY_MEDIA_TYPE)
+    return {**header, "rows": column_rows(columns)}
+
+@app.get("/captures/{capture_id}/packets/{index}")
+def capture_packet(capture_id: str, index: int, output: str = "full"):
+    # One packet, decoded and validated again from its record in the kept capture file
+    session = capture_session(capture_id)
+    if output not in OUTPUT_NAMES:
+        raise HTTPException(status_code=400, detail=f"Unknown output {output}, expected one of {OUTPUT_NAMES}")
+    if not 0 <= index < len(session.capture):
+        raise HTTPException(status_code=404, detail=f"Unknown packet {index}")
+    with session.datagram(index) as datagram:
+        text = packet_serializer(output)(native_layers(datagram))
+    return Response(text, media_type="application/json")
+
+@app.get("/captures/{capture_id}/packets")
+def capture_packets(capture_id: str, page: int = 0, size: int = 100, op_code: int = None, error_only: bool = False,
+        entity_id: int = None, frame_start: int = None, frame_end: int = None, frame_source: str = "host", output: str = "full",
+        accept: str = Header(None)):
+    # Clients accepting BINARY_MEDIA_TYPE get the page as columns, whatever the output
+    session = capture_session(capture_id)
+    if output not in OUTPUT_NAMES:
+        raise HTTPException(status_code=400, detail=f"Unknown output {output}, expected one of {OUTPUT_NAMES}")
+    header, packets = capture_page(session, page, size, op_code, error_only, entity_id, frame_start, frame_end, frame_source)
+    if accepts_binary(accept):
+        return Response(page_content(session.capture, packets, header), media_type=BINARY_MEDIA_TYPE)
+    packets = session.capture.page_layers(packets)
+    content = json.dumps(header)
+    # Packets are serialized on their own and spliced in. Values can be NaN, which the default JSON response rejects.
+    # Delta pages start from keyframes, so any page decodes on its own.
+    return Response(content[:-1] + ', "packets": [' + ", ".join(map(packet_serializer(output), packets)) + "]}",
+        media_type="application/json")
+
+@app.get("/captures/{capture_id}/frames")
+def capture_frames(capture_id: str, page: int = 0, size: int = 100, frame_source: str = "host", accept: str = Header(None)):
+    # Frames in capture order with every CIGI packet they hold, anchored on IG Control (host) or Start of Frame (ig)
+    session = capture_session(capture_id)
+    if page < 0 or not 0 < size <= 10000:
+        raise HTTPException(status_code=400, detail="page must be >= 0 and size between 1 and 10000")
+    if frame_source not in FRAME_COLUMNS:
+        raise HTTPException(status_code=400, detail=f"Unknown frame_source {frame_source}, expected one of {list(FRAME_COLUMNS)}")
+    total = session.capture.frame_count(frame_source)
+    header = {"page": page, "size": size, "total": total, "pages": -(-total // size)}
+    frames = list(session.capture.frames(frame_source, page * size, (page + 1) * size))
+    if accepts_binary(accept):
+        return Response(frames_content(session.capture, frames, header), media_type=BINARY_MEDIA_TYPE)
+    # Values can be NaN, which the default JSON response rejects
+    return Response(json.dumps({**header, "frames": [frame_dict(frame) for frame in frames]}), media_type="application/json")
+
+@app.get("/captures/{capture_id}/series")
+def capture_series(capture_id: str, x: str = "ig_control.host_frame_number", y: str = "entity_control.alt_zoff",
+        points: int = 1000, x_min: float = None, x_max: float = None, entity_id: int = None, accept: str = Header(None)):
+    # y against x for the packets holding both, reduced to points points with LTTB.
+    # x_min/x_max zoom into a window, which is sampled again at full resolution.
+    # Fields of layers describing entities are cut to one, entity_id defaulting
+    # to the lowest, which the response names.
+    session = capture_session(capture_id)
+    if not 2 < points <= 100000:
+        raise HTTPException(status_code=400, detail="points must be between 3 and 100000")
+    try:
+        entity_id = series_entity(session.capture, x, y, entity_id)
+        x_values, y_values = downsampled_series(session.capture, x, y, points, x_min, x_max, entity_id)
+    except SeriesError as error:
+        raise HTTPException(status_code=400, detail=str(error))
+    if accepts_binary(accept):
+        # float64 x and y columns
+        return Response(series_content(x_values, y_values, {"entity_id": entity_id}), media_type=BINARY_MEDIA_TYPE)
+    # Only finite points are sampled, so the default JSON response takes them
+    return {"entity_id": entity_id, "x": x_values.tolist(), "y": y_values.tolist()}
+
+@app.delete("/captures/{capture_id}")
+def delete_capture(capture_id: str):
+    if not capture_store.remove(capture_id):
+        raise HTTPException(status_code=404, detail=f"Unknown capture {capture_id}")
+    return {"id": capture_id}
+
+# Background parses into capture sessions, CIGI_JOB_WORKERS at a time within CIGI_JOB_MEMORY_BYTES of captures
+parse_jobs = default_queue()
+
+def capture_job(job, stream, projection = None) -> str:
+    return capture_store.add(parse_capture(stream, job.progress, projection), stream).capture_id
+
+# Captures parsed into the SQLite database at CIGI_CAPTURE_DB, kept across restarts and opened by the first
+# request using it. Their jobs use little memory and SQLite has a single writer, so they run one at a time
+# outside the memory budget.
+capture_database = default_database()
+database_jobs = JobQueue(1, 0, int(os.environ.get("CIGI_JOBS_KEPT", 64)))
+
+def database_job(job, stream, name: str = None) -> int:
+    return capture_database.ingest(stream, name, job.progress)
+
+def job_queue(job_id) -> JobQueue:
+    for queue in (parse_jobs, database_jobs):
+        if queue.get(job_id) is not None:
+            return queue
+    raise HTTPException(status_code=404, detail=f"Unknown job {job_id}")
+
+def parse_job(job_id):
+    return job_queue(job_id).get(job_id)
+
+def spooled_upload(file: UploadFile) -> tuple:
+    # Copies an upload to a file the job reads and removes: (path, size, decompressed size)
+    spooled = tempfile.NamedTemporaryFile(prefix="cigi-job-", delete=False)
+    with spooled:
+        shutil.copyfileobj(file.file, spooled, 1 << 20)
+        size = spooled.tell()
+    with open(spooled.name, "rb") as stream:
+        return spooled.name, size, decompressed_size(stream)
+
+@app.post("/jobs")
+def create_job(file: UploadFile = File(...), op_codes: str = None, fields: str = None, entity_ids: str = None):
+    # Returns once the upload is spooled, the job's result is the id of its capture session
+    projection = capture_projection(op_codes, fields, entity_ids)
+    path, size, memory_size = spooled_upload(file)
+    return parse_jobs.submit(ParseJob(path, size, partial(capture_job, projection=projection), memory_size)).status()
+
+@app.get("/jobs/{job_id}")
+def job_status(job_id: str):
+    return parse_job(job_id).status()
+
+@app.delete("/jobs/{job_id}")
+def cancel_job(job_id: str):
+    return job_queue(job_id).cancel(job_id).status()
+
+@app.post("/database/captures")
+def create_database_capture(file: UploadFile = File(...)):
+    # A job parsing the capture into the database, its result is the database id of the capture
+    path, size, memory_size = spooled_upload(file)
+    return database_jobs.submit(ParseJob(path, size, partial(database_job, name=file.filename), memory_size)).status()
+
+@app.get("/database/captures")
+def database_captures():
+    return capture_database.captures()
+
+def database_capture(capture_id: int) -> dict:
+    capture = capture_database.capture(capture_id)
+    if capture is None:
+        raise HTTPException(status_code=404, detail=f"Unknown capture {capture_id}")
+    return capture
+
+@app.get("/database/captures/{capture_id}")
+def database_capture_summary(capture_id: int):
+    return database_capture(capture_id)
+
+@app.get("/database/captures/{capture_id}/packets")
+def database_capture_packets(capture_id: int, after: int = -1, size: int = 100, op_code: int = None, error_only: bool = False,
+        entity_id: int = None, frame_start: int = None, frame_end: int = None, frame_source: str = "host", output: str = "full"):
+    # The first size packets after the packet numbered after that match the filters, selected like
+    # /captures/{id}/packets. next is the after of the following page, null after the last one.
+    capture = database_capture(capture_id)
+    if capture["state"] != "done":
+        raise HTTPException(status_code=409, detail=f"Capture {capture_id} is still being written")
+    if output not in OUTPUT_NAMES:
+        raise HTTPException(status_code=400, detail=f"Unknown output {output}, expected one of {OUTPUT_NAMES}")
+    if not 0 < size <= 10000:
+        raise HTTPException(status_code=400, detail="size must be between 1 and 10000")
+    packets = capture_database.page_packets(capture, after, size, op_code=op_code, error_only=error_only, entity_id=entity_id,
+        frames=frame_range(frame_start, frame_end, frame_source), frame_source=frame_source)
+    content = json.dumps({"size": size, "next": packets[-1] if len(packets) == size else None})
+    # Values can be NaN, which the default JSON response rejects
+    return Response(content[:-1] + ', "packets": [' + ", ".join(map(packet_serializer(output), capture_database.packet_layers(capture, packets)))
+        + "]}", media_type="application/json")
+
+@app.delete("/database/captures/{capture_id}")
+def delete_database_capture(capture_id: int):
+    if not capture_database.remove(capture_id):
+        raise HTTPException(status_code=404, detail=f"Unknown capture {capture_id}")
+    return {"id": capture_id}
+
+@app.post("/export")
+def export_file(file: UploadFile = File(...), format: str = "parquet"):
+    # Zip of one Parquet or Arrow IPC file per packet type, for pandas and other columnar tools
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unknown format {format}, expected one of {list(EXPORT_FORMATS)}")
+    directory = tempfile.mkdtemp(prefix="cigi-export-")
+    try:
+        archive = export_archive(file.file, directory, format)
+    except CaptureFormatError as error:
+        shutil.rmtree(directory)
+        raise HTTPException(status_code=400, detail=str(error))
+    return FileResponse(archive, media_type="application/zip", filename=f"capture-{format}.zip",
+        background=BackgroundTask(shutil.rmtree, directory))
+
+# UDP listener of the live capture, None when not capturing
+live_capture = None
+
+@app.post("/live/start")
+async def start_live(port: int = 8005, host: str = "0.0.0.0", window: float = 60):
+    # Listens for CIGI traffic on host:port, keeping the last window seconds
+    global live_capture
+    if live_capture is not None:
+        raise HTTPException(status_code=409, detail="A live capture is already running")
+    try:
+        live_capture = await start_live_capture(native_layers, compact_json, host, port, window)
+    except OSError as error:
+        raise HTTPException(status_code=400, detail=str(error))
+    return live_capture.stats()
+
+@app.post("/live/stop")
+async def stop_live():
+    global live_capture
+    if live_capture is None:
+        raise HTTPException(status_code=404, detail="No live capture is running")
+    stats = live_capture.stats()
+    live_capture.close()
+    live_capture = None
+    return stats
+
+@app.get("/live")
+async def live_stats():
+    if live_capture is None:
+        raise HTTPException(status_code=404, detail="No live capture is running")
+    return live_capture.stats()
+
+@app.websocket("/live/ws")
+async def live_updates(websocket: WebSocket):
+    # Sends the recent packets of the window in batches, then every new batch of compact packets with the capture stats
+    await websocket.accept()
+    subscribed = live_capture
+    if subscribed is None:
+        await websocket.close()
+        return
+    backlog, queue = subscribed.subscribe()
+    try:
+        for update in backlog:
+            await websocket.send_text(update)
+        while True:
+            update = await queue.get()
+            if update is None:
+                break
+            await websocket.send_text(update)
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        subscribed.unsubscribe(queue)
+
+@app.get("/metrics")
+def metrics():
+    # Prometheus text exposition format
+    return Response(parse_metrics.render(parse_cache.stats()), media_type="text/plain; version=0.0.4")
+
+@app.get("/cache")
+def cache_stats():
+    return parse_cache.stats()
+
+@app.delete("/cache")
+def clear_cache():
+    parse_cache.clear()
+    return parse_cache.stats()
 
 if __name__ == "__main__":
-    run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    run(app, host="0.0.0.0", port=8000)
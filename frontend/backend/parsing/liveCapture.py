@@ -0,0 +1,148 @@
+import asyncio, json, socket, time
+from collections import deque
+from itertools import islice
+from packet import *
+from pcapReader import Datagram
+from captureIndex import MAX_FRAME_GAP
+
+# Kernel receive buffer requested for the listening socket, so bursts of large
+# frames wait in the kernel instead of being dropped
+RECEIVE_BUFFER_BYTES = 8 << 20
+# Interval of the updates pushed to WebSocket clients
+PUSH_INTERVAL = 0.1
+# Updates a slow client may have queued before further ones are dropped for it
+CLIENT_QUEUE_SIZE = 50
+# Hard cap of the ring buffer, whatever its duration
+MAX_WINDOW_PACKETS = 1000000
+# Most recent packets of the window sent to a new subscriber, and per message
+BACKLOG_PACKETS = 50000
+BACKLOG_BATCH_SIZE = 2000
+# Layers and fields numbering the frames of each direction
+FRAME_FIELDS = {"ig_control": layer_fields(IGControl).index("host_frame_number"),
+    "sof": layer_fields(StartOfFrame).index("ig_frame_number")}
+
+class LiveCapture(asyncio.DatagramProtocol):
+    # Decodes CIGI datagrams as they arrive on a UDP port. The last
+    # window_seconds of packets are kept in a ring buffer, and new packets are
+    # pushed to subscribers in batches every PUSH_INTERVAL.
+    # decode(datagram) returns {Packet field name: [LayerRecord]} and serialize(layers)
+    # the JSON text of the packet sent to clients.
+
+    def __init__(self, decode, serialize, window_seconds: float):
+        self.decode = decode
+        self.serialize = serialize
+        self.window_seconds = window_seconds
+        self.window = deque(maxlen=MAX_WINDOW_PACKETS) # (arrival time, serialized packet)
+        self.pending = []
+        self.subscribers = set()
+        self.transport = None
+        self.local_address = None
+        self.push_task = None
+        self.frame_numbers = {} # (source address, layer) -> last frame number seen
+        self.received = 0
+        self.decode_errors = 0
+        self.dropped_frames = 0 # Frames missing from the host or IG sequence
+        self.dropped_updates = 0 # Updates not delivered to clients that fell behind
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.local_address = transport.get_extra_info("sockname")
+        sock = transport.get_extra_info("socket")
+        if sock is not None:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, RECEIVE_BUFFER_BYTES)
+        self.push_task = asyncio.get_running_loop().create_task(self.push_updates())
+
+    def connection_lost(self, exc):
+        if self.push_task is not None:
+            self.push_task.cancel()
+
+    def datagram_received(self, data, address):
+        arrival = time.time()
+        datagram = Datagram(self.received, arrival, address[0], self.local_address[0], "UDP",
+            address[1], self.local_address[1], memoryview(data))
+        self.received += 1
+        try:
+            layers = self.decode(datagram)
+        except Exception:
+            self.decode_errors += 1
+            return
+        self.count_dropped_frames(address, layers)
+        line = self.serialize(layers)
+        self.window.append((arrival, line))
+        self.pending.append(line)
+
+    def count_dropped_frames(self, address, layers):
+        for name, position in FRAME_FIELDS.items():
+            if name not in layers:
+                continue
+            frame_number = layers[name][0].values[position]
+            previous = self.frame_numbers.get((address, name))
+            if previous is not None and 1 < frame_number - previous <= MAX_FRAME_GAP:
+                self.dropped_frames += frame_number - previous - 1
+            self.frame_numbers[(address, name)] = frame_number
+
+    def trim(self):
+        oldest = time.time() - self.window_seconds
+        while self.window and self.window[0][0] < oldest:
+            self.window.popleft()
+
+    def stats(self) -> dict:
+        return {
+            "address": list(self.local_address) if self.local_address else None,
+            "received": self.received,
+            "window_packets": len(self.window),
+            "decode_errors": self.decode_errors,
+            "dropped_frames": self.dropped_frames,
+            "dropped_updates": self.dropped_updates,
+            "subscribers": len(self.subscribers),
+        }
+
+    def update(self, lines) -> str:
+        # Packets are serialized once when they arrive and spliced into every update
+        return '{"packets": [' + ", ".join(lines) + '], "stats": ' + json.dumps(self.stats()) + '}'
+
+    def subscribe(self):
+        # Returns the backlog, updates of the most recent packets of the window, and
+        # the queue receiving every later update. Only the packets are copied here,
+        # each update of the backlog is built as it is sent.
+        self.trim()
+        recent = list(islice(reversed(self.window), BACKLOG_PACKETS))
+        recent.reverse()
+        queue = asyncio.Queue(maxsize=CLIENT_QUEUE_SIZE)
+        self.subscribers.add(queue)
+        return self.backlog([line for _, line in recent]), queue
+
+    def backlog(self, lines):
+        for start in range(0, len(lines), BACKLOG_BATCH_SIZE):
+            yield self.update(lines[start:start + BACKLOG_BATCH_SIZE])
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self.subscribers.discard(queue)
+
+    async def push_updates(self):
+        while True:
+            await asyncio.sleep(PUSH_INTERVAL)
+            self.trim()
+            lines, self.pending = self.pending, []
+            if not lines or not self.subscribers:
+                continue
+            update = self.update(lines)
+            for queue in self.subscribers:
+                try:
+                    queue.put_nowait(update)
+                except asyncio.QueueFull:
+                    self.dropped_updates += 1
+
+    def close(self):
+        if self.transport is not None:
+            self.transport.close()
+        for queue in self.subscribers:
+            # None tells the subscriber the capture ended, making room for it if needed
+            while queue.full():
+                queue.get_nowait()
+            queue.put_nowait(None)
+
+async def start_live_capture(decode, serialize, host: str, port: int, window_seconds: float) -> LiveCapture:
+    loop = asyncio.get_running_loop()
+    _, live_capture = await loop.create_datagram_endpoint(lambda: LiveCapture(decode, serialize, window_seconds), local_addr=(host, port))
+    return live_capture
@@ -1,7 +1,7 @@
-import dataclasses, json, types
+import dataclasses, functools, json, types
 from dataclasses import dataclass
 
-@dataclass
+@dataclass(eq = False) # Hashable, so instances are accepted as dataclass defaults
 class LayerField:
     value: any = None
     valid: bool = True
@@ -12,9 +12,10 @@ class LayerField:
     def assign(self, new_value):
         self.value = new_value
 
-    def validate(self):
+    def validate(self, layer = None):
+        # layer is the Control holding this field, for rules relative to other fields
         if self.validator is not None:
-            self.valid = self.validator(self)
+            self.valid = self.validator(self, layer)
 
     def __getitem__(self, item):
         return getattr(self, item)
@@ -22,7 +23,7 @@ class LayerField:
     def __setitem__(self, item, value):
         setattr(self, item, value)
 
-def inclusiveRangeValidator(field: LayerField) -> bool:
+def inclusiveRangeValidator(field: LayerField, layer = None) -> bool:
     if field.value is None:
         field.error_msg = "Value is null"
         return False
@@ -36,7 +37,7 @@ def inclusiveRangeValidator(field: LayerField) -> bool:
         return False
     return True
 
-def discreteValueValidator(field: LayerField) -> bool:
+def discreteValueValidator(field: LayerField, layer = None) -> bool:
     if field.valid_range is None:
         return True
     if field.value in field.valid_range:
@@ -44,7 +45,7 @@ def discreteValueValidator(field: LayerField) -> bool:
     field.error_msg = f"Value not found in {field.valid_range}"
     return False
 
-def exclusiveRangeValidator(field: LayerField) -> bool:
+def exclusiveRangeValidator(field: LayerField, layer = None) -> bool:
     if field.value is None:
         field.error_msg = "Value is null"
         return False
@@ -63,6 +64,23 @@ class Control:
     control_size: LayerField = LayerField(validator = discreteValueValidator)
     control_error: bool = False
 
+    def __post_init__(self):
+        # Class level LayerFields are the schema, each instance gets its own copies
+        for layer_field in dataclasses.fields(self):
+            field_value = getattr(self, layer_field.name)
+            if field_value is layer_field.default and isinstance(field_value, LayerField):
+                setattr(self, layer_field.name, LayerField(field_value.value, field_value.valid,
+                    field_value.valid_range, field_value.validator, field_value.error_msg))
+
+    def validate(self):
+        for layer_field in dataclasses.fields(self):
+            field_value = getattr(self, layer_field.name)
+            if not isinstance(field_value, LayerField):
+                continue
+            field_value.validate(self)
+            if field_value.valid is False:
+                self.control_error = True
+
 @dataclass
 class IPLayer(Control):
     source_ip: LayerField = LayerField()
@@ -516,12 +534,12 @@ class ViewDefinition(Control):
     projection_type: LayerField = LayerField(validator = discreteValueValidator, valid_range = [0,1]) # 0 = Perspective, 1 = Orthographic Parallel
     reorder: LayerField = LayerField(validator = discreteValueValidator, valid_range = [0,1]) # 0 = No Reorder, 1 = Bring to Top
     view_type: LayerField = LayerField(validator = inclusiveRangeValidator, valid_range = [0,7]) 
-    near: LayerField = LayerField(validator = lambda field: field.value > 0.0 and field.value < far.value) # Range is > 0 to < Far
-    far: LayerField = LayerField(validator = lambda field: field.value > near.value) # Range is > Near
-    left: LayerField = LayerField(validator = lambda field: field.value > -90.0 and field.value < right.value) # Range is > -90.0 to < Right
-    right: LayerField = LayerField(validator = lambda field: field.value > left.value and field.value < 90.0) # Range is > Left to < 90.0
-    top: LayerField = LayerField(validator = lambda field: field.value > bottom.value and field.value < 90.0) # Range is > Bottom to < 90.0
-    bottom: LayerField = LayerField(validator = lambda field: field.value > -90.0 and field.value < top.value) # Range is > -90.0 to < Top
+    near: LayerField = LayerField(validator = lambda field, layer: field.value > 0.0 and field.value < layer.far.value) # Range is > 0 to < Far
+    far: LayerField = LayerField(validator = lambda field, layer: field.value > layer.near.value) # Range is > Near
+    left: LayerField = LayerField(validator = lambda field, layer: field.value > -90.0 and field.value < layer.right.value) # Range is > -90.0 to < Right
+    right: LayerField = LayerField(validator = lambda field, layer: field.value > layer.left.value and field.value < 90.0) # Range is > Left to < 90.0
+    top: LayerField = LayerField(validator = lambda field, layer: field.value > layer.bottom.value and field.value < 90.0) # Range is > Bottom to < 90.0
+    bottom: LayerField = LayerField(validator = lambda field, layer: field.value > -90.0 and field.value < layer.top.value) # Range is > -90.0 to < Top
 
     def __getitem__(self, item):
         return getattr(self, item)
@@ -634,7 +652,7 @@ class LineOfSightVectorRequest(Control):
     azimuth: LayerField = LayerField(validator = inclusiveRangeValidator, valid_range = [-180,180])
     elevation: LayerField = LayerField(validator = inclusiveRangeValidator, valid_range = [-90,90])
     min_range: LayerField = LayerField(validator = inclusiveRangeValidator, valid_range = [0,None])
-    max_range: LayerField = LayerField(validator = lambda field: field.value > min_range.value) # Range is > min_range
+    max_range: LayerField = LayerField(validator = lambda field, layer: field.value > layer.min_range.value) # Range is > min_range
     source_lat_xoff: LayerField = LayerField(validator = inclusiveRangeValidator, valid_range = [-90,90])
     source_lon_yoff: LayerField = LayerField(validator = inclusiveRangeValidator, valid_range = [-180,180])
     source_alt_zoff: LayerField = LayerField()
@@ -1047,6 +1065,98 @@ class Packet:
     def __setitem__(self, item, value):
         setattr(self, item, value)
 
+@functools.lru_cache(maxsize=None)
+def layer_fields(layer_type) -> list:
+    # LayerField attributes of a Control class in declaration order
+    return [layer_field.name for layer_field in dataclasses.fields(layer_type) if layer_field.name != "control_error"]
+
+@functools.lru_cache(maxsize=None)
+def layer_schema(layer_type) -> dict:
+    # Class level LayerField of each attribute, holding its validator and valid_range
+    return {layer_field.name: layer_field.default for layer_field in dataclasses.fields(layer_type) if layer_field.name != "control_error"}
+
+@functools.lru_cache(maxsize=None)
+def validated_fields(layer_type) -> list:
+    # (position, name, valid_range, validator) of the LayerFields that have a validator
+    return [(position, name, default.valid_range, default.validator)
+        for position, (name, default) in enumerate(layer_schema(layer_type).items()) if default.validator is not None]
+
+@functools.lru_cache(maxsize=None)
+def projected_layer(layer_type, names: frozenset) -> type:
+    # Class holding only the named LayerFields of layer_type, in declaration
+    # order, for records decoded without the other fields
+    return dataclasses.make_dataclass(layer_type.__name__, [(name, LayerField, dataclasses.field(default = default))
+        for name, default in layer_schema(layer_type).items() if name in names])
+
+def validator_name(validator) -> str:
+    if validator is None:
+        return None
+    return validator.__name__ if validator.__name__ != "<lambda>" else "custom"
+
+def packet_schema() -> dict:
+    # Static description of every layer, published once instead of per packet
+    schema = {}
+    for packet_field in dataclasses.fields(Packet):
+        if packet_field.name == "packet_error":
+            continue
+        schema[packet_field.name] = {
+            "op_code": getattr(packet_field.type, "op_code", LayerField()).value,
+            "fields": [{"name": name, "valid_range": default.valid_range, "validator": validator_name(default.validator)}
+                for name, default in layer_schema(packet_field.type).items()],
+        }
+    return schema
+
+class LayerRecord:
+    # Compact per packet part of a layer: its values in layer_fields order and the
+    # error message of each invalid field. The valid_range and validator of every
+    # field stay on the class and are shared through layer_schema.
+    __slots__ = ("layer_type", "values", "errors")
+
+    def __init__(self, layer_type, values, errors = None):
+        self.layer_type = layer_type
+        self.values = values
+        self.errors = errors
+
+    @property
+    def control_error(self) -> bool:
+        return bool(self.errors)
+
+    def validate(self):
+        checked = {name: LayerField(self.values[position], valid_range = valid_range, validator = validator)
+            for position, name, valid_range, validator in validated_fields(self.layer_type)}
+        layer = types.SimpleNamespace(**checked)
+        errors = {}
+        for name, layer_field in checked.items():
+            layer_field.validate(layer)
+            if not layer_field.valid:
+                errors[name] = layer_field.error_msg
+        self.errors = errors or None
+
+    def to_dict(self) -> dict:
+        # Same shape as dataclasses.asdict of the matching Control instance
+        errors = self.errors or {}
+        result = {}
+        for (name, default), value in zip(layer_schema(self.layer_type).items(), self.values):
+            result[name] = {'value': value, 'valid': name not in errors, 'valid_range': default.valid_range, 'validator': default.validator, 'error_msg': errors.get(name, "")}
+            if name == "control_size":
+                result['control_error'] = bool(errors)
+        return result
+
+    @classmethod
+    def from_layer(cls, packet_layer):
+        names = layer_fields(type(packet_layer))
+        errors = {name: packet_layer[name].error_msg for name in names if packet_layer[name].valid is False}
+        return cls(type(packet_layer), [packet_layer[name].value for name in names], errors or None)
+
+def record_errors(layers: dict) -> dict:
+    # Error messages of the invalid records of {Packet field name: [LayerRecord]} by layer and position
+    errors = {}
+    for name, records in layers.items():
+        invalid = {str(position): packet_record.errors for position, packet_record in enumerate(records) if packet_record.errors}
+        if invalid:
+            errors[name] = invalid
+    return errors
+
 class CustomJSONEncoder(json.JSONEncoder):
         def default(self, dc):
             if isinstance(dc, types.FunctionType):
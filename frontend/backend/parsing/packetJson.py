@@ -0,0 +1,109 @@
+import functools, json, math
+from json.encoder import encode_basestring_ascii
+from packet import *
+
+# JSON text of decoded packets, written straight from LayerRecord values. The
+# text is the same as json.dumps(full_packet(layers), cls=CustomJSONEncoder):
+# everything but the values is fixed per layer type and field, so it is
+# rendered once into templates and a layer without errors is a single
+# %-format of its values. When those are all ints and finite floats, whose
+# repr is their JSON, the format runs entirely in C.
+
+FLOAT_SPECIALS = {"nan": "NaN", "inf": "Infinity", "-inf": "-Infinity"}
+NUMBER_TYPES = frozenset((int, float))
+
+def _float(value: float) -> str:
+    text = float.__repr__(value)
+    return FLOAT_SPECIALS.get(text, text)
+
+VALUE_ENCODERS = {
+    int: int.__repr__,
+    float: _float,
+    str: encode_basestring_ascii,
+    bool: lambda value: "true" if value else "false",
+    type(None): lambda value: "null",
+}
+
+def json_value(value) -> str:
+    encoder = VALUE_ENCODERS.get(type(value))
+    return encoder(value) if encoder is not None else json.dumps(value, cls=CustomJSONEncoder)
+
+def _key(name: str) -> str:
+    return encode_basestring_ascii(name) + ": "
+
+@functools.lru_cache(maxsize=None)
+def layer_template(layer_type, slim: bool = False) -> tuple:
+    # (names, templates of the layer with every field valid taking encoded
+    # values and numbers, field prefixes, valid suffixes, invalid suffix heads,
+    # control_error position). Slim layers only hold the value and validity of
+    # each field.
+    names, prefixes, valid, invalid = [], [], [], []
+    control_position = None
+    for name, default in layer_schema(layer_type).items():
+        names.append(name)
+        prefixes.append(_key(name) + '{"value": ')
+        if slim:
+            valid.append(', "valid": true}')
+            invalid.append(', "valid": false}')
+        else:
+            fixed = (', "valid_range": ' + json.dumps(default.valid_range, cls=CustomJSONEncoder)
+                + ', "validator": ' + json.dumps(default.validator, cls=CustomJSONEncoder) + ', "error_msg": ')
+            valid.append(', "valid": true' + fixed + '""}')
+            invalid.append(', "valid": false' + fixed)
+        if name == "control_size":
+            control_position = len(names) - 1
+    def template(placeholder):
+        parts = []
+        for position, (prefix, suffix) in enumerate(zip(prefixes, valid)):
+            parts.append(prefix.replace("%", "%%") + placeholder + suffix.replace("%", "%%"))
+            if position == control_position:
+                parts.append('"control_error": false')
+        return "{" + ", ".join(parts) + "}"
+    return tuple(names), template("%s"), template("%r"), tuple(prefixes), tuple(valid), tuple(invalid), control_position
+
+def layer_json(packet_record: LayerRecord, slim: bool = False) -> str:
+    names, template, number_template, prefixes, valid, invalid, control_position = layer_template(packet_record.layer_type, slim)
+    errors = packet_record.errors
+    values = packet_record.values
+    if not errors:
+        kinds = set(map(type, values))
+        # A NaN or infinity makes the sum one too
+        if kinds <= NUMBER_TYPES and (float not in kinds or math.isfinite(sum(values))):
+            return number_template % tuple(values)
+        return template % tuple([VALUE_ENCODERS.get(type(value), json_value)(value) for value in values])
+    parts = []
+    for position, (name, value) in enumerate(zip(names, values)):
+        text = prefixes[position] + VALUE_ENCODERS.get(type(value), json_value)(value)
+        if name not in errors:
+            text += valid[position]
+        elif slim:
+            text += invalid[position]
+        else:
+            text += invalid[position] + json_value(errors[name]) + "}"
+        parts.append(text)
+        if position == control_position:
+            parts.append('"control_error": true')
+    return "{" + ", ".join(parts) + "}"
+
+@functools.lru_cache(maxsize=None)
+def _layer_key(name: str) -> str:
+    return _key(name)
+
+def packet_json(layers: dict, slim: bool = False) -> str:
+    # Same key order as full_packet: packet_error follows the first layer, other
+    # than user defined data, with a record that failed validation
+    parts = []
+    packet_error = False
+    for name, records in layers.items():
+        parts.append(_layer_key(name) + "[" + ", ".join([layer_json(packet_record, slim) for packet_record in records]) + "]")
+        if not packet_error and name != 'user_defined' and any(packet_record.errors for packet_record in records):
+            parts.append('"packet_error": true')
+            packet_error = True
+    return "{" + ", ".join(parts) + "}"
+
+def full_json(layers: dict) -> str:
+    return packet_json(layers)
+
+def slim_json(layers: dict) -> str:
+    # Only the value and validity of each field
+    return packet_json(layers, slim=True)
@@ -0,0 +1,191 @@
+import hashlib, os, tempfile, threading
+from collections import OrderedDict
+
+HASH_CHUNK_SIZE = 1 << 20
+
+def content_hash(stream) -> str:
+    # Hash of an uploaded file, read in chunks and rewound for the decoder
+    digest = hashlib.blake2b(digest_size=20)
+    stream.seek(0)
+    for chunk in iter(lambda: stream.read(HASH_CHUNK_SIZE), b""):
+        digest.update(chunk)
+    stream.seek(0)
+    return digest.hexdigest()
+
+def cache_key(file_hash: str, *options) -> str:
+    # Key of a parse result: the uploaded bytes plus everything that changes the output
+    return hashlib.blake2b("/".join([file_hash, *map(str, options)]).encode(), digest_size=20).hexdigest()
+
+class ParseCache:
+    # Serialized parse results, one JSON string per packet. Recent results are
+    # kept in memory, older ones on disk, each tier evicting the least recently
+    # used entries once it goes over its byte budget.
+
+    def __init__(self, directory: str, disk_budget: int, memory_budget: int):
+        self.directory = directory
+        self.disk_budget = disk_budget
+        self.memory_budget = memory_budget
+        self.memory = OrderedDict() # key -> (lines, size)
+        self.memory_bytes = 0
+        self.lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + ".ndjson")
+
+    def get(self, key: str):
+        with self.lock:
+            if key in self.memory:
+                self.memory.move_to_end(key)
+                self.memory_hits += 1
+                return self.memory[key][0]
+        try:
+            os.utime(self._path(key)) # Disk recency is the modification time
+            cached = open(self._path(key), "rb")
+        except FileNotFoundError:
+            with self.lock:
+                self.misses += 1
+            return None
+        with self.lock:
+            self.disk_hits += 1
+        if os.fstat(cached.fileno()).st_size > self.memory_budget:
+            # Too large for the memory tier, read as it is sent
+            return self._read_lines(cached)
+        with cached:
+            lines = cached.read().decode().split("\n")[:-1]
+        self._remember(key, lines, sum(map(len, lines)))
+        return lines
+
+    def _read_lines(self, cached):
+        with cached:
+            for line in cached:
+                yield line[:-1].decode()
+
+    def put(self, key: str, lines: list):
+        entry = self.writer(key)
+        for line in lines:
+            entry.write(line)
+        entry.commit()
+
+    def writer(self, key: str, keep_lines: bool = True) -> "CacheWriter":
+        # Caches a result as its lines are produced, see CacheWriter
+        return CacheWriter(self, key, keep_lines)
+
+    def _remember(self, key: str, lines: list, size: int):
+        if size > self.memory_budget:
+            return
+        with self.lock:
+            if key in self.memory:
+                self.memory_bytes -= self.memory.pop(key)[1]
+            self.memory[key] = (lines, size)
+            self.memory_bytes += size
+            while self.memory_bytes > self.memory_budget:
+                _, (_, evicted_size) = self.memory.popitem(last=False)
+                self.memory_bytes -= evicted_size
+
+    def _disk_entries(self) -> list:
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".ndjson"):
+                try:
+                    status = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((status.st_mtime, status.st_size, entry.path))
+        return entries
+
+    def _evict_disk(self):
+        entries = sorted(self._disk_entries())
+        disk_bytes = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if disk_bytes <= self.disk_budget:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            disk_bytes -= size
+
+    def clear(self):
+        with self.lock:
+            self.memory.clear()
+            self.memory_bytes = 0
+        for _, _, path in self._disk_entries():
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> dict:
+        disk_entries = self._disk_entries()
+        with self.lock:
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "memory_entries": len(self.memory),
+                "memory_bytes": self.memory_bytes,
+                "disk_entries": len(disk_entries),
+                "disk_bytes": sum(size for _, size, _ in disk_entries),
+            }
+
+class CacheWriter:
+    # One result being cached line by line. Lines go straight to a temporary file
+    # of the disk tier, and are only also kept for the memory tier while they fit
+    # its budget, so caching a parse never holds more than that in memory. Past
+    # the disk budget the result is not cached at all.
+
+    def __init__(self, cache: ParseCache, key: str, keep_lines: bool):
+        self.cache = cache
+        self.key = key
+        self.lines = [] if keep_lines else None
+        self.size = 0
+        self.path = cache._path(key) + f".{os.getpid()}.{threading.get_ident()}.tmp"
+        self.file = open(self.path, "wb")
+
+    def write(self, line: str):
+        if self.file is None:
+            return
+        self.size += len(line)
+        if self.size > self.cache.disk_budget:
+            self.abort()
+            return
+        self.file.write(line.encode() + b"\n")
+        if self.lines is not None:
+            self.lines.append(line)
+            if self.size > self.cache.memory_budget:
+                self.lines = None
+
+    def commit(self):
+        # Publishes the result once every line is written
+        if self.file is None:
+            return
+        self.file.close()
+        self.file = None
+        if self.lines is not None:
+            self.cache._remember(self.key, self.lines, self.size)
+        os.replace(self.path, self.cache._path(self.key))
+        self.cache._evict_disk()
+
+    def abort(self):
+        # Drops a partial result, e.g. of a parse that failed or a client that went away
+        if self.file is None:
+            return
+        self.file.close()
+        self.file = None
+        self.lines = None
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+def default_cache() -> ParseCache:
+    # Location and budgets can be changed with environment variables
+    return ParseCache(
+        os.environ.get("CIGI_CACHE_DIR", os.path.join(tempfile.gettempdir(), "cigi-parse-cache")),
+        int(os.environ.get("CIGI_CACHE_DISK_BYTES", 2 << 30)),
+        int(os.environ.get("CIGI_CACHE_MEMORY_BYTES", 256 << 20)),
+    )
@@ -0,0 +1,152 @@
+import os, threading, time, uuid
+from collections import OrderedDict, deque
+from pcapReader import capture_compression
+
+class JobCancelled(Exception):
+    pass
+
+class ParseJob:
+    # A capture waiting for, or going through, run(job, stream). The upload is
+    # spooled to path, which the job removes once it ends.
+
+    def __init__(self, path: str, size: int, run, memory_size: int = None):
+        # memory_size, the decompressed size of a compressed capture, is what the job is budgeted by
+        self.job_id = uuid.uuid4().hex
+        self.path = path
+        self.size = size
+        self.memory_size = size if memory_size is None else memory_size
+        self.run = run
+        self.state = "queued" # queued, running, done, failed or cancelled
+        self.bytes_consumed = 0
+        self.packets = 0
+        self.compressed_stream = None # The upload while it is read, when it is compressed
+        self.cancelled = False
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.result = None
+        self.error = None
+
+    def progress(self, offset: int):
+        # Called by the capture reader after every record, so it is also where
+        # a cancellation takes effect
+        if self.cancelled:
+            raise JobCancelled()
+        # Offsets of a compressed capture count decompressed bytes, its progress is how far the upload was read
+        self.bytes_consumed = offset if self.compressed_stream is None else self.compressed_stream.tell()
+        self.packets += 1
+
+    def eta(self) -> float:
+        # Seconds left at the byte rate so far, None until there is a rate
+        if self.state != "running" or not self.bytes_consumed:
+            return None
+        elapsed = time.time() - self.started
+        return elapsed * (self.size - self.bytes_consumed) / self.bytes_consumed
+
+    def status(self) -> dict:
+        return {
+            "id": self.job_id,
+            "state": "cancelling" if self.cancelled and self.state == "running" else self.state,
+            "size": self.size,
+            "memory_size": self.memory_size,
+            "bytes_consumed": self.bytes_consumed,
+            "packets": self.packets,
+            "progress": self.bytes_consumed / self.size if self.size else 0.0,
+            "eta_seconds": self.eta(),
+            "result": self.result,
+            "error": self.error,
+        }
+
+class JobQueue:
+    # Runs parse jobs on a bounded pool of worker threads. Jobs start in
+    # submission order once the memory sizes of the running jobs plus their own fit
+    # memory_budget, so large uploads wait for each other instead of being
+    # parsed at once. A job larger than the budget runs alone. The last limit
+    # jobs that ended are kept for their status.
+
+    def __init__(self, workers: int, memory_budget: int, limit: int):
+        self.workers = workers
+        self.memory_budget = memory_budget
+        self.limit = limit
+        self.jobs = OrderedDict()
+        self.queue = deque()
+        self.running_bytes = 0
+        self.threads = []
+        self.condition = threading.Condition()
+
+    def submit(self, job: ParseJob) -> ParseJob:
+        with self.condition:
+            if not self.threads:
+                # Started with the first job, so importing the server starts no threads
+                for _ in range(self.workers):
+                    thread = threading.Thread(target=self._work, daemon=True)
+                    thread.start()
+                    self.threads.append(thread)
+            self.jobs[job.job_id] = job
+            self.queue.append(job)
+            self.condition.notify_all()
+        return job
+
+    def get(self, job_id: str) -> ParseJob:
+        with self.condition:
+            return self.jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> ParseJob:
+        # Queued jobs are dropped, running jobs stop at their next packet and
+        # jobs that already ended are forgotten
+        with self.condition:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            if job.state == "queued":
+                self.queue.remove(job)
+                self._end(job, "cancelled")
+                self.condition.notify_all()
+            elif job.state == "running":
+                job.cancelled = True
+            else:
+                del self.jobs[job_id]
+            return job
+
+    def _admissible(self) -> bool:
+        return bool(self.queue) and (self.running_bytes == 0 or self.running_bytes + self.queue[0].memory_size <= self.memory_budget)
+
+    def _work(self):
+        while True:
+            with self.condition:
+                while not self._admissible():
+                    self.condition.wait()
+                job = self.queue.popleft()
+                job.state = "running"
+                job.started = time.time()
+                self.running_bytes += job.memory_size
+            try:
+                with open(job.path, "rb") as stream:
+                    if capture_compression(stream) is not None:
+                        job.compressed_stream = stream
+                    job.result = job.run(job, stream)
+                state = "done"
+            except JobCancelled:
+                state = "cancelled"
+            except Exception as error:
+                job.error = str(error)
+                state = "failed"
+            with self.condition:
+                self.running_bytes -= job.memory_size
+                self._end(job, state)
+                self.condition.notify_all()
+
+    def _end(self, job: ParseJob, state: str):
+        job.state = state
+        job.finished = time.time()
+        try:
+            os.remove(job.path)
+        except OSError:
+            pass
+        ended = [job_id for job_id, ended_job in self.jobs.items() if ended_job.finished is not None]
+        for job_id in ended[:max(len(ended) - self.limit, 0)]:
+            del self.jobs[job_id]
+
+def default_queue() -> JobQueue:
+    return JobQueue(int(os.environ.get("CIGI_JOB_WORKERS", 2)),
+        int(os.environ.get("CIGI_JOB_MEMORY_BYTES", 1 << 30)), int(os.environ.get("CIGI_JOBS_KEPT", 64)))
@@ -0,0 +1,111 @@
+import functools, threading, time
+from collections import Counter
+from packet import *
+
+class ParseTimings:
+    # Seconds spent in each stage of one parse, plus what it produced. Stages
+    # are timed per packet with perf_counter, which costs well under a
+    # microsecond against the tens of microseconds a packet takes.
+
+    def __init__(self):
+        self.stages = Counter()
+        self.packets = 0
+        self.bytes = 0
+        self.op_codes = Counter()
+        self.validation_failures = Counter() # Packet field name -> layers failing validation
+
+    def add(self, stage: str, start: float) -> float:
+        # Adds the time since start to stage and returns the current time
+        now = time.perf_counter()
+        self.stages[stage] += now - start
+        return now
+
+    def timed(self, iterable, stage: str):
+        # Yields from iterable, timing how long each item took to produce
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.add(stage, start)
+                return
+            self.add(stage, start)
+            yield item
+
+    def count(self, layers: dict):
+        # Adds the op codes and validation failures of one packet
+        self.add_counts(packet_counts(layers))
+
+    def add_counts(self, counts: tuple):
+        # Adds packet_counts() of a packet decoded elsewhere, e.g. in a parallel parse worker
+        op_codes, failures = counts
+        self.op_codes.update(op_codes)
+        self.validation_failures.update(failures)
+
+    def server_timing(self) -> str:
+        # Server-Timing header value, durations in milliseconds
+        return ", ".join(f"{stage};dur={seconds * 1e3:.3f}" for stage, seconds in self.stages.items())
+
+def packet_counts(layers: dict) -> tuple:
+    # The op codes of the records of a packet and the layer name of each record failing validation
+    op_codes = []
+    failures = []
+    for name, records in layers.items():
+        if name == 'ip_layer':
+            continue
+        for packet_record in records:
+            op_codes.append(int(packet_record.values[op_code_position(packet_record.layer_type)]))
+            if packet_record.errors:
+                failures.append(name)
+    return op_codes, failures
+
+@functools.lru_cache(maxsize=None)
+def op_code_position(layer_type) -> int:
+    return layer_fields(layer_type).index("op_code")
+
+class ParseMetrics:
+    # Totals of every finished parse, exposed in the Prometheus text format
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = Counter() # (engine, output) -> parses
+        self.stages = Counter()
+        self.packets = 0
+        self.bytes = 0
+        self.op_codes = Counter()
+        self.validation_failures = Counter()
+
+    def record(self, timings: ParseTimings, engine: str, output: str):
+        with self.lock:
+            self.requests[(engine, output)] += 1
+            self.stages.update(timings.stages)
+            self.packets += timings.packets
+            self.bytes += timings.bytes
+            self.op_codes.update(timings.op_codes)
+            self.validation_failures.update(timings.validation_failures)
+
+    def render(self, cache_stats: dict = None) -> str:
+        lines = []
+        def metric(name, kind, description, samples):
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                label_text = ",".join(f'{key}="{label}"' for key, label in labels)
+                lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+        with self.lock:
+            metric("cigi_parse_requests_total", "counter", "Parses run, by engine and output format",
+                [((("engine", engine), ("output", output)), count) for (engine, output), count in sorted(self.requests.items())])
+            metric("cigi_parse_stage_seconds_total", "counter", "Seconds spent in each parse stage",
+                [((("stage", stage),), f"{seconds:.6f}") for stage, seconds in sorted(self.stages.items())])
+            metric("cigi_parse_packets_total", "counter", "Captured packets parsed", [((), self.packets)])
+            metric("cigi_parse_bytes_total", "counter", "Bytes of the captures parsed", [((), self.bytes)])
+            metric("cigi_parse_op_code_total", "counter", "CIGI packets decoded, by op code",
+                [((("op_code", op_code),), count) for op_code, count in sorted(self.op_codes.items())])
+            metric("cigi_parse_validation_failures_total", "counter", "CIGI packets failing validation, by packet type",
+                [((("layer", name),), count) for name, count in sorted(self.validation_failures.items())])
+        if cache_stats is not None:
+            metric("cigi_parse_cache_hits_total", "counter", "Parse cache hits, by tier",
+                [((("tier", "memory"),), cache_stats["memory_hits"]), ((("tier", "disk"),), cache_stats["disk_hits"])])
+            metric("cigi_parse_cache_misses_total", "counter", "Parse cache misses", [((), cache_stats["misses"])])
+        return "\n".join(lines) + "\n"
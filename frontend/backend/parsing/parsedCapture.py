@@ -0,0 +1,448 @@
+import functools, re, socket
+from array import array
+import numpy as np
+from dataclasses import fields
+from functools import partial
+from typing import NamedTuple
+from packet import *
+from cigiDecoder import ENTITY_ID_READERS, LAYOUTS, USER_DEFINED_OP_CODES, byte_order, field_names, is_cigi, unpack_packet, walk_packets
+from pcapReader import TRANSPORT_PROTOCOLS, read_capture
+from batchValidation import error_messages, validate_table
+from captureIndex import build_index
+
+# Rows buffered per packet type before they are packed into an array chunk
+CHUNK_ROWS = 65536
+STRUCT_DTYPES = {"B": "u1", "b": "i1", "H": "u2", "h": "i2", "I": "u4", "i": "i4", "f": "f4", "d": "f8", "u1": "u1"}
+PROTOCOL_NUMBERS = {name: number for number, name in TRANSPORT_PROTOCOLS.items()}
+
+DATAGRAM_DTYPE = np.dtype([
+    ("packet_index", "i8"),
+    ("timestamp", "f8"),
+    ("source_ip", "u4"),
+    ("destination_ip", "u4"),
+    ("protocol", "u1"),
+    ("source_port", "u2"),
+    ("destination_port", "u2"),
+])
+
+def _field_dtype(layout, name, fmt):
+    if fmt.endswith("s"):
+        return "S" + fmt[:-1]
+    return STRUCT_DTYPES[fmt]
+
+def table_dtype(layout) -> np.dtype:
+    # Columns are the LayerFields of the packet.py class, framed by the index of
+    # the datagram holding the packet and a bitmask of fields failing validation.
+    decoded = dict(zip(field_names(layout), layout.formats))
+    columns = [("packet_index", "i8")]
+    for name in layer_fields(layout.layer_type):
+        if name in ("control_size", "op_code"):
+            columns.append((name, "u1"))
+        elif name == "data" and layout.op_code in USER_DEFINED_OP_CODES:
+            columns.append((name, "O"))
+        else:
+            columns.append((name, _field_dtype(layout, name, decoded.get(name, "d"))))
+    columns.append(("error_mask", "u8"))
+    return np.dtype(columns)
+
+@functools.lru_cache(maxsize=None)
+def table_layer_type(op_code: int, columns: tuple) -> type:
+    # The packet.py class of the rows of op_code in a table with these column
+    # names, the projected_layer of the fields it holds for a projected capture
+    layer_type = LAYOUTS[op_code].layer_type
+    names = [name for name in layer_fields(layer_type) if name in columns]
+    return layer_type if len(names) == len(layer_fields(layer_type)) else projected_layer(layer_type, frozenset(names))
+
+_packet_dtypes = {}
+
+def packet_dtype(layout, order: str) -> np.dtype:
+    # The struct values of a fixed size packet as a structured dtype, value i
+    # of unpack_from being field v<i>. Projected layouts of an op code have their own format.
+    key = layout.structs[order].format
+    if key not in _packet_dtypes:
+        names, formats, offsets = [], [], []
+        offset = 0
+        for count, code in re.findall(r"(\d*)([a-zA-Z?])", layout.structs[order].format[1:]):
+            count = int(count or 1)
+            if code == "x":
+                offset += count
+            elif code == "s":
+                names.append(f"v{len(names)}")
+                formats.append(f"S{count}")
+                offsets.append(offset)
+                offset += count
+            else:
+                dtype = np.dtype(STRUCT_DTYPES[code]).newbyteorder(order)
+                for _ in range(count):
+                    names.append(f"v{len(names)}")
+                    formats.append(dtype)
+                    offsets.append(offset)
+                    offset += dtype.itemsize
+        _packet_dtypes[key] = np.dtype({"names": names, "formats": formats, "offsets": offsets, "itemsize": layout.size})
+    return _packet_dtypes[key]
+
+def _python_value(value):
+    if isinstance(value, np.bytes_):
+        return bytes(value)
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+class _TableBuilder:
+    # Buffers the packets of one type and packs them into array chunks of
+    # CHUNK_ROWS rows. Packets of the fixed size of the layout are kept as raw
+    # bytes per byte order and decoded together by numpy, the others are
+    # unpacked one at a time. Rows keep the order the packets were added in.
+
+    def __init__(self, layout, sink = None):
+        self.layout = layout
+        self.dtype = table_dtype(layout)
+        # Position of each column in the buffered (sequence, packet index, size, op code, *values) rows
+        positions = {"packet_index": 1, "control_size": 2, "op_code": 3}
+        positions.update({name: position + 4 for position, name in enumerate(field_names(layout))})
+        self.positions = [(name, positions[name]) for name in self.dtype.names if name in positions]
+        self.fields = [(name, f"v{index}", shift, mask) for name, index, shift, mask in layout.fields if name in self.dtype.names]
+        self.rows = []
+        self.raw = {} # Byte order -> (packet bytes, packet indexes, sequence numbers)
+        self.buffered = 0
+        self.chunks = []
+        self.sink = sink or self.chunks.append # Receives every packed chunk
+
+    def append(self, packet_index, op_code, size, values):
+        self.rows.append((self.buffered, packet_index, size, op_code, *values))
+        self.buffered += 1
+        if self.buffered >= CHUNK_ROWS:
+            self.flush()
+
+    def append_raw(self, packet_index, payload, offset, order = ">", count = 1):
+        # count consecutive packets of the fixed size of the layout, decoded at the next flush
+        raw = self.raw.get(order)
+        if raw is None:
+            raw = self.raw[order] = (bytearray(), array("q"), array("q"))
+        raw[0].extend(payload[offset:offset + self.layout.size * count])
+        if count == 1:
+            raw[1].append(packet_index)
+            raw[2].append(self.buffered)
+        else:
+            raw[1].extend([packet_index] * count)
+            raw[2].extend(range(self.buffered, self.buffered + count))
+        self.buffered += count
+        if self.buffered >= CHUNK_ROWS:
+            self.flush()
+
+    def _decode(self, order, data, packet_indexes) -> np.ndarray:
+        packed = np.frombuffer(data, dtype=packet_dtype(self.layout, order))
+        rows = np.zeros(len(packed), dtype=self.dtype)
+        rows["packet_index"] = np.frombuffer(packet_indexes, dtype=np.int64)
+        if "control_size" in self.dtype.names: # Left out of projected tables
+            rows["control_size"] = self.layout.size
+        rows["op_code"] = self.layout.op_code
+        for name, value, shift, mask in self.fields:
+            rows[name] = packed[value] if mask is None else (packed[value] >> shift) & mask
+        return rows
+
+    def flush(self):
+        parts = []
+        sequences = []
+        if self.rows:
+            rows = np.zeros(len(self.rows), dtype=self.dtype)
+            columns = list(zip(*self.rows))
+            for name, position in self.positions:
+                rows[name] = columns[position]
+            parts.append(rows)
+            sequences.append(np.array(columns[0], dtype=np.int64))
+        for order, (data, packet_indexes, sequence) in self.raw.items():
+            parts.append(self._decode(order, data, packet_indexes))
+            sequences.append(np.frombuffer(sequence, dtype=np.int64))
+        if not parts:
+            return
+        chunk = parts[0] if len(parts) == 1 else np.concatenate(parts)[np.argsort(np.concatenate(sequences), kind="stable")]
+        chunk["error_mask"] = validate_table(self.layout.layer_type, chunk)
+        self.sink(chunk)
+        self.rows = []
+        self.raw = {}
+        self.buffered = 0
+
+    def finish(self) -> np.ndarray:
+        self.flush()
+        if not self.chunks:
+            return np.empty(0, dtype=self.dtype)
+        return np.concatenate(self.chunks) if len(self.chunks) > 1 else self.chunks[0]
+
+def page_rows(packet_index: np.ndarray, packets: np.ndarray) -> np.ndarray:
+    # First row of a table sorted by packet index in each of the sorted packets holding one
+    positions = np.searchsorted(packet_index, packets)
+    inside = positions < len(packet_index)
+    positions = positions[inside]
+    return positions[packet_index[positions] == packets[inside]]
+
+def packet_rows(packet_index: np.ndarray, packets: np.ndarray) -> np.ndarray:
+    # Every row of a table sorted by packet index in the sorted packets
+    starts = np.searchsorted(packet_index, packets, "left")
+    counts = np.searchsorted(packet_index, packets, "right") - starts
+    return np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+
+class Frame(NamedTuple):
+    number: int # Host (IG Control) or IG (Start of Frame) frame number
+    start: int # Packets [start, stop) of the frame
+    stop: int
+    layers: dict # Packet field name -> every row of the frame, the datagrams under 'ip_layer'
+
+class ParsedCapture:
+    # Columnar store of a parsed capture: one structured array per CIGI packet
+    # type plus one for the IP layer of each datagram.
+
+    def __init__(self, tables: dict, datagrams: np.ndarray, packet_count: int, index = None, record_ends: np.ndarray = None):
+        self.tables = tables # Packet field name -> structured array
+        self.datagrams = datagrams
+        self.packet_count = packet_count
+        self.index = index # CaptureIndex built while parsing
+        self.record_ends = record_ends # Byte offset of the end of every packet's record in the capture file
+        # Packet field name -> contiguous copy of its packet_index column, searched
+        # by every page instead of copying the strided column of the table each time
+        self.packet_indexes = {}
+
+    def __len__(self):
+        return self.packet_count
+
+    @property
+    def nbytes(self) -> int:
+        return (self.datagrams.nbytes + sum(table.nbytes for table in self.tables.values())
+            + (self.record_ends.nbytes if self.record_ends is not None else 0))
+
+    def column(self, name: str, field: str) -> np.ndarray:
+        return self.tables[name][field]
+
+    def packet_index(self, name: str) -> np.ndarray:
+        # packet_index of a table, or of the datagrams for 'ip_layer', as a contiguous array
+        packet_index = self.packet_indexes.get(name)
+        if packet_index is None:
+            table = self.datagrams if name == 'ip_layer' else self.tables[name]
+            packet_index = self.packet_indexes[name] = np.ascontiguousarray(table["packet_index"])
+        return packet_index
+
+    def packet(self, index: int) -> dict:
+        return next(self.packets(index, index + 1))
+
+    def packet_layers(self, index: int) -> dict:
+        # {Packet field name: [LayerRecord]} of one packet
+        return self.page_layers(np.array([index], dtype=np.int64))[0]
+
+    def page_layers(self, packets: np.ndarray) -> list:
+        # packet_layers of each of the sorted packets, the rows of every table
+        # found with one binary search of all the packets
+        layers = [{} for _ in packets]
+        for name in ['ip_layer', *self.tables]:
+            packet_index = self.packet_index(name)
+            rows = packet_rows(packet_index, packets)
+            if not len(rows):
+                continue
+            positions = np.searchsorted(packets, packet_index[rows]).tolist()
+            if name == 'ip_layer':
+                for position, datagram in zip(positions, self.datagrams[rows]):
+                    layers[position][name] = [ip_layer_record(datagram)]
+                continue
+            chunk = self.tables[name][rows]
+            for position, row in zip(positions, chunk):
+                layers[position].setdefault(name, []).append(layer_record(table_layer_type(int(row["op_code"]), chunk.dtype.names), row))
+        return layers
+
+    def frame_count(self, source: str = "host") -> int:
+        return len(self.index.frames[source].frames)
+
+    def frames(self, source: str = "host", start: int = 0, stop: int = None):
+        # Frames start to stop in capture order, each from its control packet up to
+        # the next one, with all the rows of every table in that range
+        frame_index = self.index.frames[source]
+        order = np.argsort(frame_index.starts, kind="stable")[start:stop]
+        starts, stops = frame_index.starts[order], frame_index.stops[order]
+        tables = {'ip_layer': self.datagrams, **self.tables}
+        bounds = {name: (np.searchsorted(self.packet_index(name), starts).tolist(), np.searchsorted(self.packet_index(name), stops).tolist())
+            for name in tables}
+        for position, (number, first, last) in enumerate(zip(frame_index.frames[order].tolist(), starts.tolist(), stops.tolist())):
+            layers = {}
+            for name, table in tables.items():
+                low, high = bounds[name][0][position], bounds[name][1][position]
+                if high > low:
+                    layers[name] = table[low:high]
+            yield Frame(number, first, last, layers)
+
+    def packets(self, start: int = 0, stop: int = None):
+        # Materializes the legacy nested dict view of /parsefile for a range of packets
+        stop = self.packet_count if stop is None else min(stop, self.packet_count)
+        cursors = {name: int(np.searchsorted(self.packet_index(name), start)) for name in self.tables}
+        datagram_index = self.packet_index('ip_layer')
+        datagram_cursor = int(np.searchsorted(datagram_index, start))
+        for index in range(start, stop):
+            constructed_object = {}
+            if datagram_cursor < len(datagram_index) and datagram_index[datagram_cursor] == index:
+                constructed_object['ip_layer'] = [ip_layer_record(self.datagrams[datagram_cursor]).to_dict()]
+                datagram_cursor += 1
+            for name, table in self.tables.items():
+                packet_index = self.packet_index(name)
+                cursor = cursors[name]
+                rows = []
+                while cursor < len(table) and packet_index[cursor] == index:
+                    rows.append(layer_dict(table_layer_type(int(table[cursor]["op_code"]), table.dtype.names), table[cursor]))
+                    cursor += 1
+                if rows:
+                    constructed_object[name] = rows
+                    if name != 'user_defined' and any(layer['control_error'] for layer in rows):
+                        constructed_object['packet_error'] = True
+                    cursors[name] = cursor
+            yield constructed_object
+
+def _field_value(value, dtype):
+    value = _python_value(value)
+    if isinstance(value, bytes):
+        value = value.ljust(dtype.itemsize, b"\0").hex() if dtype.kind == "S" else value.hex()
+    return value
+
+def layer_record(layer_type, row) -> LayerRecord:
+    # Error messages are only produced here, for fields flagged in the row's error_mask
+    values = [_field_value(row[name], row.dtype[name]) for name in layer_fields(layer_type)]
+    return LayerRecord(layer_type, values, error_messages(layer_type, row) or None)
+
+def layer_values(layer_type, rows) -> list:
+    # The layer_record values of every row, converted a column at a time
+    columns = [rows[name].tolist() if rows.dtype[name].kind in "biuf" else [_field_value(value, rows.dtype[name]) for value in rows[name]]
+        for name in layer_fields(layer_type)]
+    return [list(values) for values in zip(*columns)]
+
+def frame_dict(frame: Frame) -> dict:
+    # A frame in the compact shape: the values of every row of a layer, in
+    # layer_fields order, and the error messages of the invalid rows by position
+    layers, errors = {}, {}
+    for name, rows in frame.layers.items():
+        if name == 'ip_layer':
+            layers[name] = [ip_layer_record(row).values for row in rows]
+            continue
+        if name == 'user_defined':
+            # Each user defined op code has its own layout
+            records = [layer_record(table_layer_type(int(row["op_code"]), rows.dtype.names), row) for row in rows]
+            layers[name] = [record.values for record in records]
+            invalid = {str(position): record.errors for position, record in enumerate(records) if record.errors}
+        else:
+            layer_type = table_layer_type(int(rows[0]["op_code"]), rows.dtype.names)
+            layers[name] = layer_values(layer_type, rows)
+            invalid = {str(position): error_messages(layer_type, rows[position]) for position in np.flatnonzero(rows["error_mask"]).tolist()}
+            invalid = {position: messages for position, messages in invalid.items() if messages}
+        if invalid:
+            errors[name] = invalid
+    content = {"frame": frame.number, "packets": [frame.start, frame.stop], "layers": layers}
+    if errors:
+        content["errors"] = errors
+        if any(name != 'user_defined' for name in errors):
+            content["packet_error"] = True
+    return content
+
+def layer_dict(layer_type, row) -> dict:
+    # Same shape as dataclasses.asdict of a validated layer
+    return layer_record(layer_type, row).to_dict()
+
+def ip_layer_record(datagram) -> LayerRecord:
+    values = {
+        'source_ip': socket.inet_ntoa(int(datagram["source_ip"]).to_bytes(4, "big")),
+        'destination_ip': socket.inet_ntoa(int(datagram["destination_ip"]).to_bytes(4, "big")),
+        'protocol': TRANSPORT_PROTOCOLS.get(int(datagram["protocol"])),
+        'source_port': int(datagram["source_port"]) if datagram["protocol"] else None,
+        'destination_port': int(datagram["destination_port"]) if datagram["protocol"] else None,
+    }
+    return LayerRecord(IPLayer, [values.get(name) for name in layer_fields(IPLayer)])
+
+class CaptureBuilder:
+    # With a sink, sink(name, chunk) receives the chunks of every table, and of
+    # the datagrams as 'ip_layer', instead of them being kept for finish. Exports
+    # use it to stream captures of any size. A decodeProjection.Projection keeps
+    # only its layers, fields and entities; packets keep their capture index.
+
+    def __init__(self, sink = None, projection = None):
+        self.sink = sink
+        self.layouts = LAYOUTS if projection is None else projection.layouts
+        self.entity_ids = None if projection is None else projection.entity_ids
+        self.tables = {} # Packet field name -> _TableBuilder, user defined packets share one
+        self.datagrams = []
+        self.datagram_chunks = []
+        self.addresses = {}
+        self.packet_count = 0
+        self.record_ends = array("q")
+
+    def _address(self, address: str) -> int:
+        if address not in self.addresses:
+            self.addresses[address] = int.from_bytes(socket.inet_aton(address), "big")
+        return self.addresses[address]
+
+    def add_datagram(self, datagram):
+        self.packet_count = datagram.index + 1
+        if datagram.source_ip is not None:
+            self.datagrams.append((datagram.index, datagram.timestamp, self._address(datagram.source_ip),
+                self._address(datagram.destination_ip), PROTOCOL_NUMBERS.get(datagram.protocol, 0),
+                datagram.source_port or 0, datagram.destination_port or 0))
+            if len(self.datagrams) >= CHUNK_ROWS:
+                self.flush_datagrams()
+        if datagram.payload is None or not is_cigi(datagram.payload):
+            return
+        # Every CIGI packet of the message is kept, repeated types included
+        payload = datagram.payload
+        order = byte_order(payload)
+        tables = self.tables
+        # Runs of fixed size packets of one type, the Entity Controls of a frame
+        # for one, are buffered together
+        run_table, run_op_code, run_offset, run_count = None, None, 0, 0
+        layouts, entity_ids = self.layouts, self.entity_ids
+        for op_code, offset, size in walk_packets(payload):
+            skipped = False
+            if entity_ids is not None and op_code in ENTITY_ID_READERS:
+                field, readers = ENTITY_ID_READERS[op_code]
+                skipped = readers[order].unpack_from(payload, offset + field)[0] not in entity_ids
+            if op_code == run_op_code and size == run_table.layout.size and not skipped:
+                run_count += 1
+                continue
+            if run_table is not None:
+                run_table.append_raw(datagram.index, payload, run_offset, order, run_count)
+                run_table, run_op_code = None, None
+            layout = layouts.get(op_code)
+            if skipped or layout is None or size < layout.size:
+                continue
+            table = tables.get(layout.name) or self._table(layout)
+            if size == layout.size and not layout.variable:
+                run_table, run_op_code, run_offset, run_count = table, op_code, offset, 1
+            else:
+                table.append(datagram.index, op_code, size, unpack_packet(layout, payload, offset, order, size))
+        if run_table is not None:
+            run_table.append_raw(datagram.index, payload, run_offset, order, run_count)
+
+    def _table(self, layout) -> _TableBuilder:
+        table = self.tables[layout.name] = _TableBuilder(layout, None if self.sink is None else partial(self.sink, layout.name))
+        return table
+
+    def flush_datagrams(self):
+        chunk = np.array(self.datagrams, dtype=DATAGRAM_DTYPE)
+        if self.sink is None:
+            self.datagram_chunks.append(chunk)
+        elif len(chunk):
+            self.sink('ip_layer', chunk)
+        self.datagrams = []
+
+    def flush(self):
+        # Sends the rows still buffered to the sink
+        self.flush_datagrams()
+        for table in self.tables.values():
+            table.flush()
+
+    def finish(self) -> ParsedCapture:
+        self.flush_datagrams()
+        datagrams = np.concatenate(self.datagram_chunks)
+        tables = {name: builder.finish() for name, builder in self.tables.items()}
+        return ParsedCapture(tables, datagrams, self.packet_count, build_index(self.packet_count, tables),
+            np.frombuffer(self.record_ends, dtype=np.int64) if len(self.record_ends) else np.empty(0, dtype=np.int64))
+
+def parse_capture(stream, progress = None, projection = None) -> ParsedCapture:
+    builder = CaptureBuilder(projection=projection)
+    def record_end(offset):
+        builder.record_ends.append(offset)
+        if progress is not None:
+            progress(offset)
+    for datagram in read_capture(stream, record_end):
+        builder.add_datagram(datagram)
+    return builder.finish()
@@ -0,0 +1,448 @@
+import mmap, os, socket, struct, zlib
+from contextlib import contextmanager
+from typing import NamedTuple
+import zstandard
+
+PCAP_MAGIC = {
+    b"\xd4\xc3\xb2\xa1": ("<", 1e-6),
+    b"\xa1\xb2\xc3\xd4": (">", 1e-6),
+    b"\x4d\x3c\xb2\xa1": ("<", 1e-9), # Nanosecond resolution
+    b"\xa1\xb2\x3c\x4d": (">", 1e-9),
+}
+PCAPNG_BLOCK_SHB = 0x0A0D0D0A
+PCAPNG_BLOCK_IDB = 0x00000001
+PCAPNG_BLOCK_SPB = 0x00000003
+PCAPNG_BLOCK_EPB = 0x00000006
+PCAPNG_BYTE_ORDER_MAGIC = 0x1A2B3C4D
+# Leading bytes of the compressed captures decompressed while they are read
+COMPRESSION_MAGIC = {b"\x1f\x8b": "gzip", b"\x28\xb5\x2f\xfd": "zstd"}
+# Compressed bytes read from the stream at a time, and the most decompressed
+# bytes held at once besides a record cut by the end of a chunk
+COMPRESSED_READ_BYTES = 1 << 18
+DECOMPRESSED_CHUNK_BYTES = 1 << 20
+# Decompressed bytes assumed per compressed byte when a capture does not record its size
+COMPRESSION_RATIO_ESTIMATE = 10
+
+LINKTYPE_NULL = 0
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_IPV4 = 228
+LINKTYPE_LINUX_SLL2 = 276
+
+ETHERTYPE_IPV4 = 0x0800
+ETHERTYPE_VLAN = (0x8100, 0x88A8)
+TRANSPORT_PROTOCOLS = {6: "TCP", 17: "UDP"}
+
+class Datagram(NamedTuple):
+    index: int
+    timestamp: float
+    source_ip: str = None
+    destination_ip: str = None
+    protocol: str = None
+    source_port: int = None
+    destination_port: int = None
+    payload: memoryview = None # UDP payload, None for anything else. Only valid while the capture is open.
+
+class CaptureFormatError(ValueError):
+    pass
+
+class UndescribedInterfaceError(CaptureFormatError):
+    # A pcapng packet of an interface not described before it. Readers starting
+    # past the first packet may simply have missed the description.
+    pass
+
+def _network_offset(linktype: int, frame) -> int:
+    # Returns the offset of the IPv4 header in a link layer frame, or -1
+    if linktype == LINKTYPE_ETHERNET:
+        offset = 12
+        ethertype = int.from_bytes(frame[offset:offset + 2], "big")
+        while ethertype in ETHERTYPE_VLAN:
+            offset += 4
+            ethertype = int.from_bytes(frame[offset:offset + 2], "big")
+        return offset + 2 if ethertype == ETHERTYPE_IPV4 else -1
+    if linktype == LINKTYPE_NULL:
+        return 4 if frame[0] == socket.AF_INET or frame[3] == socket.AF_INET else -1
+    if linktype in (LINKTYPE_RAW, LINKTYPE_IPV4):
+        return 0
+    if linktype == LINKTYPE_LINUX_SLL:
+        return 16 if int.from_bytes(frame[14:16], "big") == ETHERTYPE_IPV4 else -1
+    if linktype == LINKTYPE_LINUX_SLL2:
+        return 20 if int.from_bytes(frame[0:2], "big") == ETHERTYPE_IPV4 else -1
+    return -1
+
+IPV4_HEADER = struct.Struct(">BxHxxHxB2x4s4s")
+PORTS = struct.Struct(">HH")
+
+def decode_frame(index: int, timestamp: float, linktype: int, frame) -> Datagram:
+    offset = _network_offset(linktype, frame) if len(frame) >= 20 else -1
+    if offset < 0 or len(frame) < offset + 20 or frame[offset] >> 4 != 4:
+        return Datagram(index, timestamp)
+    version_length, total_length, fragment, protocol, source, destination = IPV4_HEADER.unpack_from(frame, offset)
+    source_ip = socket.inet_ntoa(source)
+    destination_ip = socket.inet_ntoa(destination)
+    transport = offset + (version_length & 0x0F) * 4
+    end = min(len(frame), offset + total_length) if total_length else len(frame)
+    if protocol not in TRANSPORT_PROTOCOLS or fragment & 0x1FFF or end < transport + 4:
+        return Datagram(index, timestamp, source_ip, destination_ip, TRANSPORT_PROTOCOLS.get(protocol))
+    source_port, destination_port = PORTS.unpack_from(frame, transport)
+    payload = frame[transport + 8:end] if protocol == 17 else None
+    return Datagram(index, timestamp, source_ip, destination_ip, TRANSPORT_PROTOCOLS[protocol],
+        source_port, destination_port, payload)
+
+def _pcap_format(data) -> tuple:
+    # (byte order, timestamp resolution, linktype) from the global header
+    order, resolution = PCAP_MAGIC[bytes(data[0:4])]
+    return order, resolution, struct.unpack_from(order + "I", data, 20)[0] & 0x0FFFFFFF
+
+def _pcap_records(data, order: str, resolution: float, linktype: int, offset: int = 24, end: int = None):
+    record_header = struct.Struct(order + "IIII")
+    end = len(data) if end is None else end
+    while offset + record_header.size <= end:
+        seconds, fraction, captured_length, _ = record_header.unpack_from(data, offset)
+        offset += record_header.size
+        if offset + captured_length > end:
+            return
+        yield seconds + fraction * resolution, linktype, data[offset:offset + captured_length], offset + captured_length
+        offset += captured_length
+
+def _pcapng_records(data, order: str = ">", interfaces: list = None, offset: int = 0, end: int = None, section: list = None):
+    # section, a [byte order, interfaces] list, replaces order and interfaces and
+    # follows the blocks read, for a reader going on in another buffer
+    if section is not None:
+        order, interfaces = section
+    else:
+        interfaces = list(interfaces or [])
+    end = len(data) if end is None else end
+    while offset + 12 <= end:
+        block_type, = struct.unpack_from(order + "I", data, offset)
+        if block_type == PCAPNG_BLOCK_SHB:
+            magic, = struct.unpack_from("<I", data, offset + 8)
+            order = "<" if magic == PCAPNG_BYTE_ORDER_MAGIC else ">"
+            interfaces = []
+            if section is not None:
+                section[:] = order, interfaces
+        block_type, block_length = struct.unpack_from(order + "II", data, offset)
+        if block_length < 12 or offset + block_length > end:
+            return
+        body = offset + 8
+        if block_type == PCAPNG_BLOCK_IDB:
+            linktype, = struct.unpack_from(order + "H", data, body)
+            interfaces.append((linktype, _pcapng_resolution(data, order, body + 8, offset + block_length - 4)))
+        elif block_type == PCAPNG_BLOCK_EPB:
+            interface, high, low, captured_length = struct.unpack_from(order + "IIII", data, body)
+            if interface >= len(interfaces):
+                raise UndescribedInterfaceError(f"Packet at offset {offset} is of undescribed interface {interface}")
+            linktype, resolution = interfaces[interface]
+            frame = body + 20
+            yield ((high << 32) | low) * resolution, linktype, data[frame:frame + captured_length], offset + block_length
+        elif block_type == PCAPNG_BLOCK_SPB:
+            if not interfaces:
+                raise UndescribedInterfaceError(f"Packet at offset {offset} is of undescribed interface 0")
+            linktype, _ = interfaces[0]
+            packet_length, = struct.unpack_from(order + "I", data, body)
+            captured_length = min(packet_length, block_length - 16)
+            yield 0.0, linktype, data[body + 4:body + 4 + captured_length], offset + block_length
+        offset += block_length
+
+def _pcapng_resolution(data, order: str, offset: int, end: int) -> float:
+    # Reads the if_tsresol option of an Interface Description Block
+    while offset + 4 <= end:
+        code, length = struct.unpack_from(order + "HH", data, offset)
+        if code == 0:
+            break
+        if code == 9 and length >= 1:
+            value = data[offset + 4]
+            return 2.0 ** -(value & 0x7F) if value & 0x80 else 10.0 ** -value
+        offset += 4 + ((length + 3) & ~3)
+    return 1e-6
+
+def read_datagrams(data, progress = None):
+    # Yields a Datagram for every record of a pcap or pcapng capture held in data.
+    # Frames and payloads are slices of data, nothing is copied. progress, if
+    # given, is called with the offset reached after each record and may raise
+    # to stop the read.
+    data = memoryview(data)
+    magic = bytes(data[0:4])
+    if magic in PCAP_MAGIC:
+        records = _pcap_records(data, *_pcap_format(data))
+    elif len(data) >= 4 and struct.unpack_from("<I", data)[0] == PCAPNG_BLOCK_SHB:
+        records = _pcapng_records(data)
+    else:
+        raise CaptureFormatError("File is not a pcap or pcapng capture")
+    for index, (timestamp, linktype, frame, end) in enumerate(records):
+        if progress is not None:
+            progress(end)
+        yield decode_frame(index, timestamp, linktype, frame)
+
+def read_record(data, index: int, offset: int = None) -> Datagram:
+    # The Datagram of record index of a capture held in data, read from offset,
+    # the end of the record before it (None for the first record)
+    data = memoryview(data)
+    magic = bytes(data[0:4])
+    if magic in PCAP_MAGIC:
+        records = _pcap_records(data, *_pcap_format(data), 24 if offset is None else offset)
+    elif len(data) >= 4 and struct.unpack_from("<I", data)[0] == PCAPNG_BLOCK_SHB:
+        if offset is None:
+            records = _pcapng_records(data)
+        else:
+            order, interfaces, _ = _pcapng_header(data)
+            records = _pcapng_records(data, order, interfaces, offset)
+    else:
+        raise CaptureFormatError("File is not a pcap or pcapng capture")
+    try:
+        record = next(records, None)
+    except UndescribedInterfaceError:
+        if offset is None:
+            raise
+        # Described after the first packet, so the blocks before offset are read again for it
+        record = next((record for record in _pcapng_records(data) if record[3] > offset), None)
+    if record is None:
+        raise CaptureFormatError(f"No record at offset {offset}")
+    timestamp, linktype, frame, _ = record
+    return decode_frame(index, timestamp, linktype, frame)
+
+@contextmanager
+def capture_buffer(stream):
+    # Memory maps an uploaded capture. Pages are read on demand, so the first
+    # packet is available immediately and resident memory stays bounded by what
+    # the caller keeps.
+    if hasattr(stream, "getbuffer"):
+        yield stream.getbuffer()
+        return
+    stream.flush()
+    try:
+        mapped = mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ)
+    except ValueError:
+        raise CaptureFormatError("File is empty")
+    if hasattr(mapped, "madvise"):
+        mapped.madvise(mmap.MADV_SEQUENTIAL)
+    try:
+        yield memoryview(mapped)
+    finally:
+        try:
+            mapped.close()
+        except BufferError:
+            pass # The caller still holds payload views, the map is released with them
+
+def read_chunks(chunks, progress = None):
+    # read_datagrams of a capture arriving as chunks of bytes. Each chunk is read
+    # along with the record cut by the end of the one before, so payloads are
+    # slices of one buffer per chunk and memory is bounded by the chunk size
+    # plus what the caller keeps. progress gets offsets in the whole capture.
+    pending = b""
+    base = 0 # Capture offset of pending
+    records = None
+    index = 0
+    for chunk in chunks:
+        data = memoryview(pending + chunk if pending else chunk)
+        offset = 0
+        if records is None:
+            if len(data) < 24:
+                pending = bytes(data)
+                continue
+            if bytes(data[0:4]) in PCAP_MAGIC:
+                capture_format = _pcap_format(data)
+                records = lambda data, offset: _pcap_records(data, *capture_format, offset)
+                offset = 24
+            elif struct.unpack_from("<I", data)[0] == PCAPNG_BLOCK_SHB:
+                section = [">", []]
+                records = lambda data, offset: _pcapng_records(data, offset=offset, section=section)
+            else:
+                raise CaptureFormatError("File is not a pcap or pcapng capture")
+        for timestamp, linktype, frame, end in records(data, offset):
+            offset = end
+            if progress is not None:
+                progress(base + end)
+            yield decode_frame(index, timestamp, linktype, frame)
+            index += 1
+        pending = bytes(data[offset:])
+        base += offset
+    if records is None:
+        raise CaptureFormatError("File is not a pcap or pcapng capture")
+
+def capture_compression(stream) -> str:
+    # "gzip" or "zstd" from the first bytes of a capture, None if it is not compressed
+    stream.seek(0)
+    head = stream.read(4)
+    stream.seek(0)
+    return next((compression for magic, compression in COMPRESSION_MAGIC.items() if head.startswith(magic)), None)
+
+def decompressed_size(stream) -> int:
+    # Size of a capture once decompressed, for budgeting the memory of its parse:
+    # the ISIZE trailer of a gzip capture, the content size of a zstd capture's
+    # first frame, or COMPRESSION_RATIO_ESTIMATE times the compressed size when
+    # these are missing or smaller than the capture, as with several gzip
+    # members or zstd frames. ISIZE counts modulo 4 GiB, so a capture whose
+    # compressed size is past that is also estimated.
+    size = stream.seek(0, os.SEEK_END)
+    compression = capture_compression(stream)
+    if compression is None:
+        return size
+    recorded = 0
+    try:
+        if compression == "gzip" and size < 1 << 32:
+            stream.seek(-4, os.SEEK_END)
+            recorded, = struct.unpack("<I", stream.read(4))
+        elif compression == "zstd":
+            recorded = zstandard.get_frame_parameters(stream.read(18)).content_size
+            recorded = 0 if recorded == zstandard.CONTENTSIZE_UNKNOWN else recorded
+    except (OSError, struct.error, zstandard.ZstdError):
+        pass
+    finally:
+        stream.seek(0)
+    return recorded if recorded >= size else size * COMPRESSION_RATIO_ESTIMATE
+
+def _gzip_chunks(stream):
+    decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+    while True:
+        data = stream.read(COMPRESSED_READ_BYTES)
+        if not data:
+            break
+        while data:
+            if decompressor.eof:
+                # Recorders appending to a file write one gzip member per run
+                decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+            chunk = decompressor.decompress(data, DECOMPRESSED_CHUNK_BYTES)
+            data = decompressor.unused_data if decompressor.eof else decompressor.unconsumed_tail
+            if chunk:
+                yield chunk
+    tail = decompressor.flush()
+    if tail:
+        yield tail
+
+def _zstd_chunks(stream):
+    reader = zstandard.ZstdDecompressor().stream_reader(stream, read_size=COMPRESSED_READ_BYTES, read_across_frames=True,
+        closefd=False)
+    while True:
+        chunk = reader.read(DECOMPRESSED_CHUNK_BYTES)
+        if not chunk:
+            return
+        yield chunk
+
+def decompressed_chunks(stream, compression: str):
+    # The bytes of a gzip or zstd compressed capture, DECOMPRESSED_CHUNK_BYTES at most at a time
+    try:
+        yield from _gzip_chunks(stream) if compression == "gzip" else _zstd_chunks(stream)
+    except (zlib.error, zstandard.ZstdError) as error:
+        raise CaptureFormatError(f"Corrupt {compression} capture: {error}")
+
+def read_capture(stream, progress = None):
+    # Datagrams of a pcap or pcapng capture, decompressed on the fly when gzip or zstd compressed
+    compression = capture_compression(stream)
+    if compression is not None:
+        yield from read_chunks(decompressed_chunks(stream, compression), progress)
+        return
+    with capture_buffer(stream) as data:
+        yield from read_datagrams(data, progress)
+
+# Consecutive records that must chain up before a shard boundary is trusted
+RESYNC_RECORDS = 8
+# Bytes searched for a record boundary past the requested split point
+RESYNC_WINDOW = 1 << 20
+PCAP_MAX_RECORD = 1 << 18
+PCAPNG_PACKET_BLOCKS = (PCAPNG_BLOCK_SPB, PCAPNG_BLOCK_EPB, 0x00000004, 0x00000005)
+
+class Shard(NamedTuple):
+    # Record aligned byte range [start, stop) of a capture and the header state
+    # needed to read it on its own: ("pcap", order, resolution, linktype) or
+    # ("pcapng", order, interfaces)
+    start: int
+    stop: int
+    capture_format: tuple
+
+def _pcap_chain(data, offset: int, order: str, resolution: float, snaplen: int) -> bool:
+    # True if RESYNC_RECORDS plausible record headers follow each other from offset.
+    # Writers truncate a frame only to the snapshot length, so the captured length
+    # of a real record is min(original length, snaplen).
+    fraction_limit = round(1 / resolution)
+    previous = None
+    for _ in range(RESYNC_RECORDS):
+        if offset == len(data):
+            return previous is not None
+        if offset + 16 > len(data):
+            return False
+        seconds, fraction, captured_length, original_length = struct.unpack_from(order + "IIII", data, offset)
+        if fraction >= fraction_limit or not 0 < captured_length <= PCAP_MAX_RECORD or captured_length != min(original_length, snaplen):
+            return False
+        if previous is not None and not 0 <= seconds - previous <= 3600:
+            return False
+        previous = seconds
+        offset += 16 + captured_length
+    return True
+
+def _pcapng_chain(data, offset: int, order: str) -> bool:
+    for _ in range(RESYNC_RECORDS):
+        if offset == len(data):
+            return True
+        if offset + 12 > len(data):
+            return False
+        block_type, block_length = struct.unpack_from(order + "II", data, offset)
+        if block_type not in PCAPNG_PACKET_BLOCKS or block_length < 12 or block_length % 4 or offset + block_length > len(data):
+            return False
+        if struct.unpack_from(order + "I", data, offset + block_length - 4)[0] != block_length:
+            return False
+        offset += block_length
+    return True
+
+def _pcapng_header(data) -> tuple:
+    # Byte order, interfaces and end of the blocks preceding the first packet
+    order, interfaces, offset = ">", [], 0
+    while offset + 12 <= len(data):
+        block_type, = struct.unpack_from(order + "I", data, offset)
+        if block_type == PCAPNG_BLOCK_SHB:
+            magic, = struct.unpack_from("<I", data, offset + 8)
+            order = "<" if magic == PCAPNG_BYTE_ORDER_MAGIC else ">"
+        block_type, block_length = struct.unpack_from(order + "II", data, offset)
+        if block_type in (PCAPNG_BLOCK_EPB, PCAPNG_BLOCK_SPB) or block_length < 12:
+            break
+        if block_type == PCAPNG_BLOCK_IDB:
+            linktype, = struct.unpack_from(order + "H", data, offset + 8)
+            interfaces.append((linktype, _pcapng_resolution(data, order, offset + 16, offset + block_length - 4)))
+        offset += block_length
+    return order, interfaces, offset
+
+def capture_shards(data, shard_bytes: int) -> list:
+    # Splits a capture into record aligned ranges of about shard_bytes each. Split
+    # points are found by searching forward for a run of well formed records,
+    # so the capture is never read as a whole. Shards of a pcapng capture only
+    # know the interfaces described before its first packet, as every capturing
+    # tool writes them; read_shard raises UndescribedInterfaceError otherwise.
+    data = memoryview(data)
+    magic = bytes(data[0:4])
+    if magic in PCAP_MAGIC:
+        order, resolution, linktype = _pcap_format(data)
+        capture_format, start = ("pcap", order, resolution, linktype), 24
+        snaplen = struct.unpack_from(order + "I", data, 16)[0] or PCAP_MAX_RECORD
+        aligned = lambda offset: _pcap_chain(data, offset, order, resolution, snaplen)
+        step = 1
+    elif len(data) >= 4 and struct.unpack_from("<I", data)[0] == PCAPNG_BLOCK_SHB:
+        order, interfaces, start = _pcapng_header(data)
+        capture_format = ("pcapng", order, interfaces)
+        aligned = lambda offset: _pcapng_chain(data, offset, order)
+        step = 4 # Blocks are 32 bit aligned
+    else:
+        raise CaptureFormatError("File is not a pcap or pcapng capture")
+    boundaries = [start]
+    split = start + shard_bytes
+    while split < len(data):
+        split += (start - split) % step
+        boundary = next((offset for offset in range(split, min(split + RESYNC_WINDOW, len(data)), step) if aligned(offset)), None)
+        if boundary is None:
+            break # No boundary found, the remainder stays in one shard
+        boundaries.append(boundary)
+        split = boundary + shard_bytes
+    boundaries.append(len(data))
+    return [Shard(shard_start, shard_stop, capture_format) for shard_start, shard_stop in zip(boundaries, boundaries[1:]) if shard_stop > shard_start]
+
+def read_shard(data, capture_format: tuple):
+    # Yields the datagrams of the bytes of one Shard, indexes counting from the
+    # start of the shard
+    data = memoryview(data)
+    if capture_format[0] == "pcap":
+        records = _pcap_records(data, *capture_format[1:], 0)
+    else:
+        _, order, interfaces = capture_format
+        records = _pcapng_records(data, order, interfaces)
+    for index, (timestamp, linktype, frame, _) in enumerate(records):
+        yield decode_frame(index, timestamp, linktype, frame)
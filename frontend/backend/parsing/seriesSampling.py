@@ -0,0 +1,96 @@
+import numpy as np
+
+class SeriesError(ValueError):
+    pass
+
+def lttb(x: np.ndarray, y: np.ndarray, points: int) -> np.ndarray:
+    # Largest-Triangle-Three-Buckets: indexes of the points kept when (x, y),
+    # sorted by x, is reduced to points points. The first and last points are
+    # kept, and every bucket in between keeps the point forming the largest
+    # triangle with the point kept before it and the average of the next bucket.
+    count = len(x)
+    if points >= count or points < 3:
+        return np.arange(count) if points >= count else np.linspace(0, count - 1, max(points, 0)).astype(np.int64)
+    edges = np.floor(np.linspace(1, count - 1, points - 1)).astype(np.int64)
+    selected = np.empty(points, dtype=np.int64)
+    selected[0], selected[-1] = 0, count - 1
+    previous = 0
+    for bucket in range(points - 2):
+        start, stop = edges[bucket], edges[bucket + 1]
+        next_start, next_stop = stop, edges[bucket + 2] if bucket + 2 < len(edges) else count
+        average_x = x[next_start:next_stop].mean()
+        average_y = y[next_start:next_stop].mean()
+        areas = np.abs((x[previous] - average_x) * (y[start:stop] - y[previous])
+            - (x[previous] - x[start:stop]) * (average_y - y[previous]))
+        previous = start + int(np.argmax(areas))
+        selected[bucket + 1] = previous
+    return selected
+
+def split_field(field: str) -> tuple:
+    # "entity_control.alt_zoff" -> ("entity_control", "alt_zoff")
+    layer, _, name = field.partition(".")
+    if not name:
+        raise SeriesError(f"Field {field} must be given as layer.field")
+    return layer, name
+
+def _column(capture, field: str, entity_id: int = None) -> tuple:
+    # (packet indexes, float values) of a layer field
+    layer, name = split_field(field)
+    table = capture.tables.get(layer)
+    if table is None:
+        return np.empty(0, dtype=np.int64), np.empty(0)
+    if name not in table.dtype.names or table.dtype[name].kind not in "biuf":
+        raise SeriesError(f"{field} is not a numeric field")
+    if entity_id is not None and "entity_id" in table.dtype.names:
+        table = table[table["entity_id"] == entity_id]
+    return table["packet_index"], table[name].astype(np.float64)
+
+def _paired(packets: np.ndarray, values: np.ndarray, other_packets: np.ndarray, other_values: np.ndarray) -> tuple:
+    positions = np.searchsorted(other_packets, packets)
+    found = positions < len(other_packets)
+    found[found] = other_packets[positions[found]] == packets[found]
+    return values[found], other_values[positions[found]]
+
+def field_series(capture, x_field: str, y_field: str, x_min: float = None, x_max: float = None, entity_id: int = None) -> tuple:
+    # x and y of the packets holding both fields, sorted by x and cut to the
+    # [x_min, x_max] window. Points with a NaN or infinite value are left out.
+    x_packets, x = _column(capture, x_field, entity_id)
+    y_packets, y = _column(capture, y_field, entity_id)
+    # Fields of one layer are paired row by row. Otherwise a packet can hold
+    # several rows of a field, the Entity Controls of a frame for one, and every
+    # row of the field with more rows is a point, paired with the first row of
+    # the other field in the same packet.
+    if split_field(x_field)[0] != split_field(y_field)[0]:
+        if len(y_packets) >= len(x_packets):
+            y, x = _paired(y_packets, y, x_packets, x)
+        else:
+            x, y = _paired(x_packets, x, y_packets, y)
+    keep = np.isfinite(x) & np.isfinite(y)
+    if x_min is not None:
+        keep &= x >= x_min
+    if x_max is not None:
+        keep &= x <= x_max
+    x, y = x[keep], y[keep]
+    if len(x) > 1 and np.any(x[1:] < x[:-1]):
+        order = np.argsort(x, kind="stable")
+        x, y = x[order], y[order]
+    return x, y
+
+def series_entity(capture, x_field: str, y_field: str, entity_id: int = None) -> int:
+    # The entity a series is cut to: entity_id, else the lowest entity id of the
+    # first of y's and x's layers describing entities, so that the rows of several
+    # entities are not drawn as one line. None when neither layer has entity_id.
+    if entity_id is not None:
+        return entity_id
+    for field in (y_field, x_field):
+        table = capture.tables.get(split_field(field)[0])
+        if table is not None and "entity_id" in table.dtype.names and len(table):
+            return int(table["entity_id"].min())
+    return None
+
+def downsampled_series(capture, x_field: str, y_field: str, points: int, x_min: float = None, x_max: float = None,
+        entity_id: int = None) -> tuple:
+    # x and y float64 arrays of at most points points
+    x, y = field_series(capture, x_field, y_field, x_min, x_max, entity_id)
+    selected = lttb(x, y, points)
+    return x[selected], y[selected]
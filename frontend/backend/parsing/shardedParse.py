@@ -0,0 +1,77 @@
+import os, threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from pcapReader import UndescribedInterfaceError, capture_buffer, capture_compression, capture_shards, read_capture, read_datagrams, read_shard
+
+# Shard sizes, small enough to keep every worker busy and to bound the bytes in flight
+MIN_SHARD_BYTES = 1 << 20
+MAX_SHARD_BYTES = 32 << 20
+# Shards submitted ahead of the one being merged, per worker
+SHARDS_IN_FLIGHT = 2
+
+def _parse_shard(shard_data: bytes, capture_format: tuple, render) -> list:
+    return [render(datagram) for datagram in read_shard(shard_data, capture_format)]
+
+class ShardedParser:
+    # Decodes record aligned shards of a capture in a process pool shared by
+    # every request. render(datagram) runs in the workers and must be picklable,
+    # i.e. a module level function or a functools.partial of one.
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self.executor = None
+        self.lock = threading.Lock()
+
+    def pool(self) -> ProcessPoolExecutor:
+        with self.lock:
+            if self.executor is None:
+                self.executor = ProcessPoolExecutor(max_workers=self.workers)
+            return self.executor
+
+    def shutdown(self):
+        with self.lock:
+            if self.executor is not None:
+                self.executor.shutdown(cancel_futures=True)
+                self.executor = None
+
+    def shard_bytes(self, capture_bytes: int) -> int:
+        return max(MIN_SHARD_BYTES, min(MAX_SHARD_BYTES, capture_bytes // (self.workers * 4)))
+
+    def parse(self, stream, render):
+        # Yields render(datagram) for every datagram of the capture, in packet order
+        if capture_compression(stream) is not None:
+            # Shard boundaries are searched in the decompressed bytes, which a
+            # compressed capture only has once read through, so it is read here
+            for datagram in read_capture(stream):
+                yield render(datagram)
+            return
+        pool = self.pool()
+        pending = deque()
+        merged = 0
+        with capture_buffer(stream) as data:
+            try:
+                for shard in capture_shards(data, self.shard_bytes(len(data))):
+                    pending.append(pool.submit(_parse_shard, bytes(data[shard.start:shard.stop]), shard.capture_format, render))
+                    if len(pending) >= self.workers * SHARDS_IN_FLIGHT:
+                        results = pending.popleft().result()
+                        merged += len(results)
+                        yield from results
+                while pending:
+                    results = pending.popleft().result()
+                    merged += len(results)
+                    yield from results
+            except UndescribedInterfaceError:
+                # A pcapng interface described after the first packet, which only
+                # a reader going through the blocks in order sees
+                for future in pending:
+                    future.cancel()
+                pending.clear()
+                for datagram in islice(read_datagrams(data), merged, None):
+                    yield render(datagram)
+            finally:
+                for future in pending:
+                    future.cancel()
+
+def default_parser() -> ShardedParser:
+    return ShardedParser(int(os.environ.get("CIGI_PARSE_WORKERS", os.cpu_count() or 1)))
@@ -0,0 +1,3 @@
+import os, sys
+# The backend modules are imported by bare name, as fileParse.py does
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "parsing"))
@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+from hypothesis import given, settings, strategies as st
+from packet import *
+from cigiDecoder import LAYOUTS
+from parsedCapture import _python_value, table_dtype
+from batchValidation import compile_rules, error_messages, validate_column, validate_table
+
+# One layout per layer type, user defined data shares the layout of 201
+LAYER_LAYOUTS = sorted({layout.name: layout for op_code, layout in LAYOUTS.items() if op_code <= 201}.values(), key=lambda layout: layout.op_code)
+
+def column_values(dtype: np.dtype, valid_range):
+    # Any value of the column, weighted towards the declared bounds, the values
+    # just inside and outside them, and for floats NaN and the infinities
+    bounds = [bound for bound in (valid_range or []) if bound is not None]
+    if dtype.kind == "f":
+        near = [value for bound in bounds for value in (np.nextafter(dtype.type(bound), dtype.type(-np.inf)), dtype.type(bound),
+            np.nextafter(dtype.type(bound), dtype.type(np.inf)))]
+        special = st.sampled_from([float(value) for value in near] + [np.nan, np.inf, -np.inf, 0.0]) if near else st.sampled_from([np.nan, np.inf, -np.inf, 0.0])
+        return st.one_of(special, st.floats(width=dtype.itemsize * 8, allow_nan=True, allow_infinity=True))
+    info = np.iinfo(dtype)
+    near = [int(value) for bound in bounds for value in (bound - 1, bound, bound + 1) if info.min <= value <= info.max]
+    anything = st.integers(int(info.min), int(info.max))
+    return st.one_of(st.sampled_from(near), anything) if near else anything
+
+@st.composite
+def tables(draw, layout):
+    dtype = table_dtype(layout)
+    rows = draw(st.integers(1, 20))
+    table = np.zeros(rows, dtype=dtype)
+    schema = layer_schema(layout.layer_type)
+    for name in layer_fields(layout.layer_type):
+        if dtype[name].kind not in "iuf":
+            continue
+        table[name] = draw(st.lists(column_values(dtype[name], schema[name].valid_range), min_size=rows, max_size=rows))
+    return table
+
+def scalar_layers(layer_type, table: np.ndarray) -> list:
+    # Each row validated by the LayerField validators, as the pyshark engine does
+    layers = []
+    for row in table:
+        layer = layer_type.__new__(layer_type)
+        for name, default in layer_schema(layer_type).items():
+            layer[name] = LayerField(value = _python_value(row[name]), valid_range = default.valid_range, validator = default.validator)
+        for name in layer_schema(layer_type):
+            layer[name].validate(layer)
+        layers.append(layer)
+    return layers
+
+def scalar_error_mask(layer_type, layers: list) -> np.ndarray:
+    error_mask = np.zeros(len(layers), dtype=np.uint64)
+    for row_number, layer in enumerate(layers):
+        for bit, name in enumerate(layer_fields(layer_type)):
+            if not layer[name].valid:
+                error_mask[row_number] |= np.uint64(1 << bit)
+    return error_mask
+
+@pytest.mark.parametrize("layout", LAYER_LAYOUTS, ids=lambda layout: layout.name)
+@settings(max_examples=60, deadline=None)
+@given(data=st.data())
+def test_batch_validation_matches_scalar_validators(layout, data):
+    table = data.draw(tables(layout))
+    layers = scalar_layers(layout.layer_type, table)
+    error_mask = validate_table(layout.layer_type, table)
+    assert np.array_equal(error_mask, scalar_error_mask(layout.layer_type, layers))
+    table["error_mask"] = error_mask
+    for row, layer in zip(table, layers):
+        expected = {name: layer[name].error_msg for name in layer_fields(layout.layer_type) if not layer[name].valid}
+        assert error_messages(layout.layer_type, row) == expected
+
+@pytest.mark.parametrize("layout", LAYER_LAYOUTS, ids=lambda layout: layout.name)
+@settings(max_examples=30, deadline=None)
+@given(data=st.data())
+def test_validate_column_matches_validate_table(layout, data):
+    table = data.draw(tables(layout))
+    for bit, name, check in compile_rules(layout.layer_type):
+        expected = ((validate_table(layout.layer_type, table) >> np.uint64(bit)) & np.uint64(1)).astype(bool)
+        assert np.array_equal(validate_column(layout.layer_type, name, table[name], table), expected)
+
+@pytest.mark.parametrize("name", ["near", "far", "left", "right", "top", "bottom"])
+def test_sibling_rules_need_their_columns(name):
+    with pytest.raises(ValueError):
+        validate_column(ViewDefinition, name, [1.0])
+    siblings = {"near": [1.0], "far": [2.0], "left": [-10.0], "right": [10.0], "top": [10.0], "bottom": [-10.0]}
+    assert not validate_column(ViewDefinition, name, siblings[name], siblings).any()
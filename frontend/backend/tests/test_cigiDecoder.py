@@ -0,0 +1,47 @@
+import pytest
+from packet import *
+from cigiDecoder import LAYOUTS, byte_order, decode_message, pack_packet
+
+# Little endian senders write the byte swap magic the other way round
+BYTE_ORDERS = ["<", ">"]
+HEADER_FIELDS = ("control_size", "op_code")
+
+def message(order: str, *packets) -> bytes:
+    # A host message: IG Control followed by the packed (op_code, values) packets
+    ig_control = pack_packet(1, {"db_number": 1, "ig_mode": 1, "minor_version": 2, "host_frame_number": 7, "timestamp": 1667,
+        "last_ig_frame_number": 6}, order)
+    return ig_control + b"".join(pack_packet(op_code, values, order) for op_code, values in packets)
+
+def record_values(packet_record: LayerRecord) -> dict:
+    return dict(zip(layer_fields(packet_record.layer_type), packet_record.values))
+
+def sample_values(op_code: int, order: str) -> dict:
+    # A non zero value for every field of a packet: 1 for numbers, 0xab bytes for byte strings
+    zero = record_values(decode_message(message(order, (op_code, {})))[LAYOUTS[op_code].name][-1])
+    return {name: "ab" * (len(value) // 2) if isinstance(value, str) else 1 for name, value in zero.items() if name not in HEADER_FIELDS}
+
+@pytest.mark.parametrize("order", BYTE_ORDERS)
+def test_byte_order_of_packed_messages(order):
+    assert byte_order(message(order)) == order
+    assert byte_order(pack_packet(101, {"ig_frame_number": 7}, order)) == order
+
+@pytest.mark.parametrize("order", BYTE_ORDERS)
+def test_host_message_round_trip(order):
+    entity = {"entity_id": 3, "entity_state": 1, "alpha": 255, "entity_type": 100, "roll": -12.5, "pitch": 5.0, "yaw": 270.0,
+        "lat_xoff": 28.25, "lon_yoff": -82.5, "alt_zoff": 1000.0}
+    layers = decode_message(message(order, (2, entity), (2, {**entity, "entity_id": 4})))
+    ig_control = record_values(layers["ig_control"][0])
+    assert (ig_control["host_frame_number"], ig_control["timestamp"], ig_control["last_ig_frame_number"]) == (7, 1667, 6)
+    assert [record_values(packet_record)["entity_id"] for packet_record in layers["entity_control"]] == [3, 4]
+    decoded = record_values(layers["entity_control"][0])
+    assert {name: decoded[name] for name in entity} == entity
+    assert decoded["control_size"] == LAYOUTS[2].size
+    assert all(packet_record.errors is None for records in layers.values() for packet_record in records)
+
+@pytest.mark.parametrize("order", BYTE_ORDERS)
+@pytest.mark.parametrize("op_code", sorted(op_code for op_code in LAYOUTS if op_code <= 201))
+def test_every_layout_round_trip(op_code, order):
+    values = sample_values(op_code, order)
+    decoded = record_values(decode_message(message(order, (op_code, values)), validate=False)[LAYOUTS[op_code].name][-1])
+    assert decoded["op_code"] == op_code
+    assert {name: decoded[name] for name in values} == values
@@ -0,0 +1,49 @@
+import io, os
+from parseCache import ParseCache, cache_key, content_hash
+
+LINES = ['{"packet": 1}', '{"packet": 2}', '{"packet": 3}']
+
+def test_keys_follow_content_and_options():
+    stream = io.BytesIO(b"capture bytes")
+    file_hash = content_hash(stream)
+    assert stream.tell() == 0
+    assert file_hash == content_hash(io.BytesIO(b"capture bytes")) != content_hash(io.BytesIO(b"other bytes"))
+    assert cache_key(file_hash, 1, "native", "full") != cache_key(file_hash, 2, "native", "full")
+
+def test_memory_and_disk_tiers(tmp_path):
+    cache = ParseCache(str(tmp_path), 1 << 20, 1 << 20)
+    assert cache.get("a") is None
+    cache.put("a", LINES)
+    assert cache.get("a") == LINES
+    # A new cache over the same directory only has the disk tier
+    cache = ParseCache(str(tmp_path), 1 << 20, 1 << 20)
+    assert cache.get("a") == LINES
+    assert cache.get("a") == LINES
+    assert (cache.misses, cache.disk_hits, cache.memory_hits) == (0, 1, 1)
+
+def test_results_over_the_memory_budget_are_read_from_disk(tmp_path):
+    cache = ParseCache(str(tmp_path), 1 << 20, 20)
+    cache.put("a", LINES)
+    assert cache.stats()["memory_entries"] == 0
+    assert list(cache.get("a")) == LINES
+
+def test_least_recently_used_evicted(tmp_path):
+    size = sum(map(len, LINES))
+    cache = ParseCache(str(tmp_path), 2 * (size + len(LINES)), 2 * size)
+    cache.put("a", LINES)
+    os.utime(cache._path("a"), (0, 0))
+    cache.put("b", LINES)
+    cache.put("c", LINES)
+    stats = cache.stats()
+    assert (stats["memory_entries"], stats["disk_entries"]) == (2, 2)
+    assert not os.path.exists(cache._path("a"))
+
+def test_aborted_and_oversized_results_are_not_cached(tmp_path):
+    cache = ParseCache(str(tmp_path), 20, 20)
+    entry = cache.writer("a")
+    entry.write(LINES[0])
+    entry.abort()
+    entry.commit()
+    cache.put("b", LINES)
+    assert cache.get("a") is None and cache.get("b") is None
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,77 @@
+import gzip, io, struct
+import pytest
+from pcapReader import CaptureFormatError, read_capture, read_datagrams, read_record
+
+# (source port, destination port, payload) of the UDP datagrams written to each capture
+DATAGRAMS = [(8004, 8005, b"\x01\x18\x03"), (8005, 8004, b"payload of odd length"), (8004, 8005, b"")]
+SOURCE_IP, DESTINATION_IP = bytes([192, 168, 1, 10]), bytes([192, 168, 1, 20])
+
+def udp_frame(source_port: int, destination_port: int, payload: bytes) -> bytes:
+    # Ethernet + IPv4 + UDP, checksums left at zero
+    udp = struct.pack(">HHHH", source_port, destination_port, 8 + len(payload), 0) + payload
+    ip = struct.pack(">BBHHHBBH4s4s", 0x45, 0, 20 + len(udp), 0, 0, 64, 17, 0, SOURCE_IP, DESTINATION_IP)
+    return b"\x00\x11\x22\x33\x44\x55\x66\x77\x88\x99\xaa\xbb\x08\x00" + ip + udp
+
+def pcap_capture(order: str, nanoseconds: bool = False) -> bytes:
+    magic = 0xA1B23C4D if nanoseconds else 0xA1B2C3D4
+    capture = struct.pack(order + "IHHiIII", magic, 2, 4, 0, 0, 65535, 1)
+    for index, datagram in enumerate(DATAGRAMS):
+        frame = udp_frame(*datagram)
+        capture += struct.pack(order + "IIII", 100 + index, 500000000 if nanoseconds else 500000, len(frame), len(frame)) + frame
+    return capture
+
+def pcapng_block(order: str, block_type: int, body: bytes) -> bytes:
+    body += b"\0" * (-len(body) % 4)
+    return struct.pack(order + "II", block_type, len(body) + 12) + body + struct.pack(order + "I", len(body) + 12)
+
+def pcapng_capture(order: str) -> bytes:
+    # Enhanced Packet Blocks, the last packet in a Simple Packet Block
+    capture = pcapng_block(order, 0x0A0D0D0A, struct.pack(order + "IHHq", 0x1A2B3C4D, 1, 0, -1))
+    capture += pcapng_block(order, 1, struct.pack(order + "HHI", 1, 0, 65535))
+    for index, datagram in enumerate(DATAGRAMS):
+        frame = udp_frame(*datagram)
+        if index == len(DATAGRAMS) - 1:
+            capture += pcapng_block(order, 3, struct.pack(order + "I", len(frame)) + frame)
+            continue
+        microseconds = (100 + index) * 1000000 + 500000
+        capture += pcapng_block(order, 6, struct.pack(order + "IIIII", 0, microseconds >> 32, microseconds & 0xFFFFFFFF,
+            len(frame), len(frame)) + frame)
+    return capture
+
+CAPTURES = {
+    "pcap little endian": pcap_capture("<"),
+    "pcap big endian": pcap_capture(">"),
+    "pcap nanoseconds": pcap_capture("<", nanoseconds=True),
+    "pcapng little endian": pcapng_capture("<"),
+    "pcapng big endian": pcapng_capture(">"),
+}
+
+@pytest.mark.parametrize("name", CAPTURES)
+def test_read_datagrams(name):
+    datagrams = list(read_datagrams(CAPTURES[name]))
+    assert [(datagram.source_port, datagram.destination_port, bytes(datagram.payload)) for datagram in datagrams] == DATAGRAMS
+    assert all((datagram.source_ip, datagram.destination_ip, datagram.protocol) == ("192.168.1.10", "192.168.1.20", "UDP")
+        for datagram in datagrams)
+    assert [datagram.index for datagram in datagrams] == list(range(len(DATAGRAMS)))
+    # Simple Packet Blocks carry no timestamp
+    timed = datagrams[:-1] if name.startswith("pcapng") else datagrams
+    assert [datagram.timestamp for datagram in timed] == pytest.approx([100.5 + index for index in range(len(timed))])
+
+@pytest.mark.parametrize("name", CAPTURES)
+def test_read_record_from_previous_end(name):
+    data = CAPTURES[name]
+    ends = []
+    datagrams = list(read_datagrams(data, ends.append))
+    for index, datagram in enumerate(datagrams):
+        record = read_record(data, index, ends[index - 1] if index else None)
+        assert (record.index, record.source_port, bytes(record.payload)) == (index, datagram.source_port, bytes(datagram.payload))
+
+@pytest.mark.parametrize("name", CAPTURES)
+def test_read_capture_compressed(name):
+    expected = [bytes(datagram.payload) for datagram in read_datagrams(CAPTURES[name])]
+    for stream in (io.BytesIO(CAPTURES[name]), io.BytesIO(gzip.compress(CAPTURES[name]))):
+        assert [bytes(datagram.payload) for datagram in read_capture(stream)] == expected
+
+def test_not_a_capture():
+    with pytest.raises(CaptureFormatError):
+        list(read_datagrams(b"junk" * 10))
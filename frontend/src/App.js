@@ -1,23 +1,62 @@
 import './App.css';
 import Table from './Components/Table/Table';
-import { useState } from 'react';
-const JSON5 = require('json5');
+import LiveView from './Components/LiveView/LiveView';
+import { useEffect, useState } from 'react';
+
+// Milliseconds between two polls of a parse job's progress
+const JOB_POLL_INTERVAL = 500;
 
 function App() {
-  const [parsedData, setParsedData] = useState([]);
+  const [capture, setCapture] = useState(null);
+  const [schema, setSchema] = useState(null);
+  const [live, setLive] = useState(false);
+  const [job, setJob] = useState(null);
+
+  // Polls a background parse until its capture session is ready
+  const pollJob = (jobId) => {
+    fetch(`http://127.0.0.1:8000/jobs/${jobId}`).then(resp => resp.json()).then(body => {
+      if (body.state === 'queued' || body.state === 'running' || body.state === 'cancelling') {
+        setJob(body);
+        setTimeout(() => pollJob(jobId), JOB_POLL_INTERVAL);
+        return;
+      }
+      setJob(null);
+      if (body.state === 'done')
+        fetch(`http://127.0.0.1:8000/captures/${body.result}`).then(resp => resp.json()).then(setCapture);
+      else if (body.state === 'failed')
+        alert(body.error);
+    });
+  };
+
+  const cancelJob = () => {
+    fetch(`http://127.0.0.1:8000/jobs/${job.id}`, { method: 'DELETE' });
+  };
+
+  // Closing the window cancels the parse instead of leaving it running on the backend
+  const jobId = job ? job.id : null;
+  useEffect(() => {
+    if (!jobId)
+      return;
+    const cancelOnClose = () => fetch(`http://127.0.0.1:8000/jobs/${jobId}`, { method: 'DELETE', keepalive: true });
+    window.addEventListener('beforeunload', cancelOnClose);
+    return () => window.removeEventListener('beforeunload', cancelOnClose);
+  }, [jobId]);
 
   const getData = (file) => {
     if(file.name.includes('.pcapng') || file.name.includes('.pcap')) {
     const formData = new FormData();
     formData.append('file', file);
-    fetch('http://127.0.0.1:8000/parsefile', {
-      method: 'POST',
-      body: formData,
-    }).then(resp => {
-      return resp.json();
-    }).then(data => {
-      let d = JSON5.parse(data);
-      setParsedData(d)
+    // The capture is parsed by a background job and stays on the server, the
+    // table fetches it a page at a time
+    fetch('http://127.0.0.1:8000/schema').then(resp => resp.json()).then(body => {
+      setSchema(body);
+      return fetch('http://127.0.0.1:8000/jobs', {
+        method: 'POST',
+        body: formData,
+      });
+    }).then(resp => resp.json()).then(body => {
+      setJob(body);
+      pollJob(body.id);
     })
   } else {
     alert("Please select a valid file of extension: pcapng or pcap");
@@ -28,12 +67,38 @@ function App() {
     getData(file.target.files[0]);
   };
 
+  // Starts or stops listening for CIGI traffic on the backend
+  const toggleLive = () => {
+    if (live) {
+      fetch('http://127.0.0.1:8000/live/stop', { method: 'POST' }).then(() => setLive(false));
+      return;
+    }
+    fetch('http://127.0.0.1:8000/schema').then(resp => resp.json()).then(body => {
+      setSchema(body);
+      return fetch('http://127.0.0.1:8000/live/start', { method: 'POST' });
+    }).then(resp => {
+      if (resp.ok)
+        setLive(true);
+      else
+        resp.json().then(body => alert(body.detail));
+    });
+  };
+
 
   return (
     <div className="App">
       {
         <div>
-            <Table tableData={parsedData} onFileChange={setInputFile} />
+            <button style={{ marginTop: '1%' }} onClick={toggleLive}>{live ? 'Stop Live Capture' : 'Live Capture'}</button>
+            {job &&
+              <div>
+                Parsing {Math.round(job.progress * 100)}%
+                {job.eta_seconds != null && `, ${Math.ceil(job.eta_seconds)}s left`}
+                <button onClick={cancelJob}>Cancel</button>
+              </div>}
+            {live ?
+              <LiveView schema={schema} />
+              : <Table capture={capture} schema={schema} onFileChange={setInputFile} />}
         </div>
       }
     </div>
@@ -8,60 +8,63 @@ import './ControlAccordion.css';
 import ErrorIcon from '../Table/warning.png';  // Icons made by Freepik from www.flaticon.com
 
 function ControlAccordion(props) {
-  let cardAmount = -1;
-
-  const incrementKey = () => {
-    cardAmount = cardAmount + 1;
-    return cardAmount;
-  };
+  // One card per packet of each layer type, numbered when a type repeats
+  const cards = [];
+  Object.keys(props.packet).forEach(packetKey => {
+    if (props.packet[packetKey] === null || packetKey === 'packet_error')
+      return;
+    const rows = props.packet[packetKey];
+    rows.forEach((layer, position) => cards.push({
+      cardKey: `${packetKey}-${position}`,
+      title: packetKey.replace(/_/g, ' ') + (rows.length > 1 ? ` ${position + 1}` : ''),
+      layer: layer,
+    }));
+  });
 
   return (
     <div>
       {JSON.stringify(props.packet) !== '{}'
         ? <div className="AccordionContainer">
           <Accordion>
-            {Object.keys(props.packet).map(packetKey => (
-              props.packet[packetKey] !== null && packetKey !== 'packet_error'
-                ?
-                <Card key={packetKey}>
-                  <Card.Header>
-                    <Accordion.Toggle style={{ textTransform: 'capitalize' }} className={props.packet[packetKey].control_error ? 'redText' : 'blackText'} as={Card.Header} eventKey={String(incrementKey())}>
-                      <div>{props.packet[packetKey].control_error ? <div className="ErrorIconDivAccordion"><img className="ErrorIconImg" src={ErrorIcon} alt="Error Found" /></div> : ''} <div className="ErrorFlaggedTitle">{packetKey.replace(/_/g, ' ')}</div></div>
-                    </Accordion.Toggle>
-                  </Card.Header>
-                  <Accordion.Collapse eventKey={String(cardAmount)}>
-                    <Card.Body>
-                      <Form.Group>
-                        {
-                          Object.keys(props.packet[packetKey]).map(attributeKey => (
-                            attributeKey !== 'control_error'
-                              ?
-                              <OverlayTrigger
-                                key={packetKey + attributeKey}
-                                placement='right'
-                                overlay={
-                                  props.packet[packetKey][attributeKey].valid ?
-                                    <Tooltip>
-                                      No Errors Found
-                                    </Tooltip>
-                                    : <Tooltip>
-                                      {props.packet[packetKey][attributeKey].error_msg}
-                                    </Tooltip>
-                                }
-                              >
-                                <div key={packetKey + attributeKey}>
-                                  <Form.Label style={{ textTransform: 'capitalize' }}>{attributeKey.replace(/_/g, ' ')}</Form.Label>
-                                  <Form.Control isInvalid={!props.packet[packetKey][attributeKey].valid} type="text" disabled={1} key={attributeKey + packetKey} placeholder={String(props.packet[packetKey][attributeKey].value).replace(null, '')} />
-                                </div>
-                              </OverlayTrigger>
-                              : null
-                          ))
-                        }
-                      </Form.Group>
-                    </Card.Body>
-                  </Accordion.Collapse>
-                </Card>
-                : null
+            {cards.map(({ cardKey, title, layer }) => (
+              <Card key={cardKey}>
+                <Card.Header>
+                  <Accordion.Toggle style={{ textTransform: 'capitalize' }} className={layer.control_error ? 'redText' : 'blackText'} as={Card.Header} eventKey={cardKey}>
+                    <div>{layer.control_error ? <div className="ErrorIconDivAccordion"><img className="ErrorIconImg" src={ErrorIcon} alt="Error Found" /></div> : ''} <div className="ErrorFlaggedTitle">{title}</div></div>
+                  </Accordion.Toggle>
+                </Card.Header>
+                <Accordion.Collapse eventKey={cardKey}>
+                  <Card.Body>
+                    <Form.Group>
+                      {
+                        Object.keys(layer).map(attributeKey => (
+                          attributeKey !== 'control_error'
+                            ?
+                            <OverlayTrigger
+                              key={cardKey + attributeKey}
+                              placement='right'
+                              overlay={
+                                layer[attributeKey].valid ?
+                                  <Tooltip>
+                                    No Errors Found
+                                  </Tooltip>
+                                  : <Tooltip>
+                                    {layer[attributeKey].error_msg}
+                                  </Tooltip>
+                              }
+                            >
+                              <div key={cardKey + attributeKey}>
+                                <Form.Label style={{ textTransform: 'capitalize' }}>{attributeKey.replace(/_/g, ' ')}</Form.Label>
+                                <Form.Control isInvalid={!layer[attributeKey].valid} type="text" disabled={1} key={attributeKey + cardKey} placeholder={String(layer[attributeKey].value).replace(null, '')} />
+                              </div>
+                            </OverlayTrigger>
+                            : null
+                        ))
+                      }
+                    </Form.Group>
+                  </Card.Body>
+                </Accordion.Collapse>
+              </Card>
             ))
             }
           </Accordion>
@@ -1,40 +1,26 @@
 import React from 'react';
 import { useState, useEffect } from 'react';
 import { Line } from 'react-chartjs-2';
-
-let frames = [];
-let altitude = [];
+import fetchSeries from '../../../fetchSeries';
 
 function AltitudeGraph(props) {
   const [graphContent, setGraphContent] = useState([]);
-  const createGraphData = (input) => {
-
-    input.forEach(packet => {
-      if (packet.ig_control && packet.entity_control) {
-        frames.push(packet.ig_control.host_frame_number.value)
-        altitude.push(packet.entity_control.alt_zoff.value)
-      }
-    });
 
-    setGraphContent({
-      labels: frames,
+  useEffect(() => {
+    if (!props.captureId)
+      return;
+    Promise.all([
+      fetchSeries(props.captureId, 'ig_control.host_frame_number', 'entity_control.alt_zoff', props.window)
+    ]).then(series => setGraphContent({
       datasets: [
         {
-          label: 'Altitude Data',
-          data: altitude,
+          label: `Altitude Data, Entity ${series[0].entityId}`,
+          data: series[0].points,
           borderColor: 'blue',
         }
       ]
-    });
-  };
-
-  useEffect(() => {
-    while (frames.length)
-      frames.pop();
-    while (altitude.length)
-      altitude.pop();
-    createGraphData(props.graphData);
-  }, [props]);
+    }));
+  }, [props.captureId, props.window]);
 
   return (
     <div className="AltitudeContainer">
@@ -68,6 +54,7 @@ function AltitudeGraph(props) {
                 offset: true
               },
               xAxes: {
+                type: 'linear',
                 title: {
                   display: true,
                   text: "Time by Increasing Frame Number"
@@ -6,37 +6,67 @@ import AltitudeGraph from '../AltitudeGraph/AltitudeGraph';
 
 function GraphContainer(props) {
 const [graphState, setGraphState] = useState(['R','L','A']); // Order in collection is order of rendering: R - Roll Pitch Yaw, L - LatLong, A - Altitude
+const [graphWindow, setGraphWindow] = useState({ min: null, max: null, entityId: null }); // Range of host frame numbers shown, null for the whole capture, and entity plotted, null for the lowest
   
   useEffect(() => {
     setGraphState(['R','L','A']);
   },[]);
 
+  useEffect(() => {
+    setGraphWindow({ min: null, max: null, entityId: null });
+  }, [props.captureId]);
+
+  // Zooming or picking an entity re-queries the series for the window, sampled again at full resolution
+  const handleZoom = (formData) => {
+    formData.preventDefault();
+    const min = formData.target[0].value;
+    const max = formData.target[1].value;
+    const entityId = formData.target[2].value;
+    setGraphWindow({ min: min === '' ? null : Number(min), max: max === '' ? null : Number(max), entityId: entityId === '' ? null : Number(entityId) });
+  };
+
   return (
     <div className='GraphMainContainer'>
+      <form onSubmit={handleZoom}>
+        <label>
+          Frames:
+          <input disabled={!props.captureId} type="text" name="FrameMin" />
+        </label>
+        <label style={{ marginLeft: '1%' }}>
+          to
+          <input disabled={!props.captureId} type="text" name="FrameMax" />
+        </label>
+        <label style={{ marginLeft: '1%' }}>
+          Entity:
+          <input disabled={!props.captureId} type="text" name="EntityId" />
+        </label>
+        <input disabled={!props.captureId} type="submit" value="Zoom" />
+        <input disabled={!props.captureId} type="reset" style={{ marginLeft: '1%' }} onClick={() => setGraphWindow({ min: null, max: null, entityId: null })} />
+      </form>
       <div className="TopGraphContainer"> {/* onClick should pass div index (0 here) and change that this swaps with index 0 and self, here 0 would swap 0 so we dont even need a handler really. */}
         { graphState[0] === 'R' ?
-          <RollPitchYaw graphData={props.graphData} />
+          <RollPitchYaw captureId={props.captureId} window={graphWindow} />
           : graphState[0] === 'L' ?
-          <LatitudeLongitudeGraph graphData={props.graphData} />
-          : <AltitudeGraph graphData={props.graphData} /> /*Final case*/
+          <LatitudeLongitudeGraph captureId={props.captureId} window={graphWindow} />
+          : <AltitudeGraph captureId={props.captureId} window={graphWindow} /> /*Final case*/
         }
       </div>
       <div className='BottomGraph' onClick={() => {setGraphState([graphState[1], graphState[0], graphState[2]])}}>
         {
           graphState[1] === 'R' ?
-          <RollPitchYaw graphData={props.graphData} />
+          <RollPitchYaw captureId={props.captureId} window={graphWindow} />
           : graphState[1] === 'L' ?
-          <LatitudeLongitudeGraph graphData={props.graphData} />
-          : <AltitudeGraph graphData={props.graphData} /> /*Final case*/
+          <LatitudeLongitudeGraph captureId={props.captureId} window={graphWindow} />
+          : <AltitudeGraph captureId={props.captureId} window={graphWindow} /> /*Final case*/
         }
       </div>
       <div className='BottomGraph' onClick={() => {setGraphState([graphState[2], graphState[1], graphState[0]])}}>
         {
           graphState[2] === 'R' ?
-          <RollPitchYaw graphData={props.graphData} />
+          <RollPitchYaw captureId={props.captureId} window={graphWindow} />
           : graphState[2] === 'L' ?
-          <LatitudeLongitudeGraph graphData={props.graphData} />
-          : <AltitudeGraph graphData={props.graphData} /> /*Final case*/
+          <LatitudeLongitudeGraph captureId={props.captureId} window={graphWindow} />
+          : <AltitudeGraph captureId={props.captureId} window={graphWindow} /> /*Final case*/
         }
       </div>
     </div>
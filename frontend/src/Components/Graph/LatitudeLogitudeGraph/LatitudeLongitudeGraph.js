@@ -1,51 +1,33 @@
 import React from 'react';
 import { useState, useEffect } from 'react';
 import { Line } from 'react-chartjs-2';
-
-let frames = [];
-let longitude = [];
-let latitude = [];
+import fetchSeries from '../../../fetchSeries';
 
 function LatitudeLongitudeGraph(props) {
 
   const [graphContent, setGraphContent] = useState([]);
-  const createGraphData = (input) => {
 
-    input.forEach(packet => {
-      if (packet.ig_control && packet.entity_control) {
-        frames.push(packet.ig_control.host_frame_number.value)
-        longitude.push(packet.entity_control.lon_yoff.value)
-        latitude.push(packet.entity_control.lat_xoff.value)
-      }
-    });
-    
-  setGraphContent({
-      labels: frames,
+  useEffect(() => {
+    if (!props.captureId)
+      return;
+    Promise.all([
+      fetchSeries(props.captureId, 'ig_control.host_frame_number', 'entity_control.lon_yoff', props.window),
+      fetchSeries(props.captureId, 'ig_control.host_frame_number', 'entity_control.lat_xoff', props.window)
+    ]).then(series => setGraphContent({
       datasets: [
         {
-          label: 'Longitude Data',
-          data: longitude,
+          label: `Longitude Data, Entity ${series[0].entityId}`,
+          data: series[0].points,
           borderColor: 'pink',
         },
         {
-          label: 'Latitude Data',
-          data: latitude,
+          label: `Latitude Data, Entity ${series[1].entityId}`,
+          data: series[1].points,
           borderColor: '#fc0303',
         }
       ]
-    });
-
-  };
-
-  useEffect(() => {
-    while(frames.length)
-    frames.pop();
-    while (longitude.length)
-    longitude.pop();
-    while (latitude.length)
-    latitude.pop();
-    createGraphData(props.graphData);
-  }, [props]);
+    }));
+  }, [props.captureId, props.window]);
 
   return (
     <div className="LatLongContainer"> 
@@ -78,6 +60,7 @@ function LatitudeLongitudeGraph(props) {
               offset: true
             },
             xAxes: {
+              type: 'linear',
               title: {
                 display: true,
                 text: "Time by Increasing Frame Number"
@@ -1,60 +1,40 @@
 import React from 'react';
 import { useState, useEffect } from 'react';
 import { Line } from 'react-chartjs-2';
+import fetchSeries from '../../../fetchSeries';
 import './RollPitchYaw.css';
 
-let frame = [];
-let roll = [];
-let yaw = [];
-let pitch = [];
-
 function RollPitchYaw(props) {
 
   const [graphContent, setGraphContent] = useState([]);
-  const createGraphData = (input) => {
 
-    input.forEach(packet => {
-      if (packet.ig_control && packet.entity_control) {
-        frame.push(packet.ig_control.host_frame_number.value)
-        roll.push(packet.entity_control.roll.value)
-        yaw.push(packet.entity_control.yaw.value)
-        pitch.push(packet.entity_control.pitch.value)
-      }
-    });
-    
-  setGraphContent({
-      labels: frame,
+  useEffect(() => {
+    if (!props.captureId)
+      return;
+    Promise.all([
+      fetchSeries(props.captureId, 'ig_control.host_frame_number', 'entity_control.roll', props.window),
+      fetchSeries(props.captureId, 'ig_control.host_frame_number', 'entity_control.yaw', props.window),
+      fetchSeries(props.captureId, 'ig_control.host_frame_number', 'entity_control.pitch', props.window)
+    ]).then(series => setGraphContent({
       datasets: [
         {
-          label: 'Roll Data',
-          data: roll,
+          label: `Roll Data, Entity ${series[0].entityId}`,
+          data: series[0].points,
           borderColor: 'blue',
         },
         {
-          label: 'Yaw Data',
-          data: yaw,
+          label: `Yaw Data, Entity ${series[1].entityId}`,
+          data: series[1].points,
           borderColor: 'pink',
         },
         {
-          label: 'Pitch Data',
-          data: pitch,
+          label: `Pitch Data, Entity ${series[2].entityId}`,
+          data: series[2].points,
           borderColor: '#fc0303',
         }
       ]
-    });
-  };
-
-  useEffect(() => {
-    while(frame.length)
-    frame.pop();
-    while (roll.length)
-    roll.pop();
-    while (yaw.length)
-    yaw.pop();
-    while (pitch.length)
-    pitch.pop();
-    createGraphData(props.graphData);
-  }, [props]);
+    }));
+  }, [props.captureId, props.window]);
 
   return (
     <div className="RollPitchYawContainer"> 
@@ -87,6 +67,7 @@ function RollPitchYaw(props) {
               offset: true
             },
             xAxes: {
+              type: 'linear',
               title: {
                 display: true,
                 text: "Time by Increasing Frame Number"
@@ -0,0 +1,86 @@
+import React from 'react';
+import { useState, useEffect, useRef } from 'react';
+import expandPacket from '../../expandPacket';
+import '../Table/table.css';
+const JSON5 = require('json5');
+
+// Most recent packets shown while capturing
+const LIVE_ROWS = 100;
+// Fields of the live packets shown as table columns, the capture table shows /summaries rows instead
+const LIVE_COLUMNS = [
+  {
+    title: 'Host Frame',
+    path: ['ig_control', 'host_frame_number']
+  },
+  {
+    title: 'IG Frame',
+    path: ['sof', 'ig_frame_number']
+  },
+  {
+    title: 'Source',
+    path: ['ip_layer', 'source_ip']
+  },
+  {
+    title: 'Destination',
+    path: ['ip_layer', 'destination_ip']
+  }
+];
+
+function LiveView(props) {
+  const [packets, setPackets] = useState([]);
+  const [stats, setStats] = useState(null);
+  const socket = useRef(null);
+
+  useEffect(() => {
+    if (!props.schema)
+      return;
+    let received = [];
+    socket.current = new WebSocket('ws://127.0.0.1:8000/live/ws');
+    socket.current.onmessage = (event) => {
+      const update = JSON5.parse(event.data);
+      received = received.concat(update.packets.map(packet => expandPacket(props.schema, packet))).slice(-LIVE_ROWS);
+      setPackets(received);
+      setStats(update.stats);
+    };
+    return () => socket.current.close();
+  }, [props.schema]);
+
+  let i = 0;
+  return (
+    <div className='TableWrapper'>
+      {stats ?
+        <div style={{ paddingTop: '1%' }}>
+          Received {stats.received} packets, {stats.window_packets} in window, {stats.dropped_frames} frames dropped
+          {stats.dropped_updates ? `, ${stats.dropped_updates} updates dropped` : ''}
+        </div> : null}
+      <div className='MainTable'>
+        <table id='table'>
+          <thead>
+            <tr>
+              {LIVE_COLUMNS.map(entry => (
+                <th key={entry.title}>{entry.title}</th>
+              ))}
+            </tr>
+          </thead>
+          <tbody>
+            {packets.slice().reverse().map(packet => (
+              <tr key={++i} className={packet.packet_error ? 'Error' : 'NoError'}>
+                {
+                  LIVE_COLUMNS.map(col => (
+                    <td key={col.title}>{
+                      packet[col.path[0]] && packet[col.path[0]][0][col.path[1]] ?
+                        packet[col.path[0]][0][col.path[1]].value
+                        : null
+                    }</td>
+                  ))
+                }
+              </tr>
+            ))}
+          </tbody>
+        </table>
+      </div>
+    </div>
+  )
+}
+
+export default LiveView;
@@ -1,19 +1,24 @@
+// Fields of the /summaries rows shown as table columns
 const Columns = [
   {
     title: 'Host Frame',
-    path: ['ig_control', 'host_frame_number']
+    key: 'host_frame'
   },
   {
     title: 'IG Frame',
-    path: ['sof','ig_frame_number']
+    key: 'ig_frame'
   },
   {
     title: 'Source',
-    path: ['ip_layer','source_ip']
+    key: 'source_ip'
   },
   {
     title: 'Destination',
-    path: ['ip_layer','destination_ip']
+    key: 'destination_ip'
+  },
+  {
+    title: 'Op Codes',
+    key: 'op_codes'
   }
 ]
-export default Columns;
\ No newline at end of file
+export default Columns;
@@ -7,6 +7,11 @@ import { FontAwesomeIcon } from '@fortawesome/react-fontawesome'
 import { faPlus } from '@fortawesome/free-solid-svg-icons'
 import './table.css';
 import ErrorIcon from './warning.png'; // Icons made by Freepik from www.flaticon.com
+import expandPacket from '../../expandPacket';
+import { BINARY_MEDIA_TYPE, readSummaries } from '../../columnTransport';
+const JSON5 = require('json5');
+
+const PAGE_SIZE = 100;
 
 function Table(props) {
   const [displayContent, setDisplayContent] = useState([]);
@@ -14,8 +19,8 @@ function Table(props) {
   const [showTableModal, setShowTableModal] = useState(false);
   const [currentPage, setCurrentPage] = useState(-1);
   const [totalPages, setTotalPages] = useState(-1);
-  const [paginatedData, setPaginatedData] = useState({});
   const [currentFilter, setCurrentFilter] = useState(null);
+  const [errorOnly, setErrorOnly] = useState(false);
 
   const handleShowTableModal = () => {
     setShowTableModal(true);
@@ -28,98 +33,68 @@ function Table(props) {
     setPacketInDetail({});
   };
 
-  useEffect(() => {
-    const Paginated = [];
-    let pages = Math.floor(props.tableData.length / 100);
-    if (props.tableData.length % 100 !== 0)
-      pages++;
-    for (let i = 0; i < pages; ++i) {
-      Paginated.push(props.tableData.slice(i * 100, (i + 1) * 100));
-    }
-    setCurrentPage(0);
-    setTotalPages(pages - 1);
-    if (Paginated.length >= 1) {
-      setDisplayContent(Paginated[0]);
-      setPaginatedData(Paginated);
-    }
+  // Pages are cut and filtered on the server, only the summary rows of the visible page are fetched
+  const fetchPage = (page, filter, errorsOnly) => {
+    const params = new URLSearchParams({ page: page, size: PAGE_SIZE, error_only: errorsOnly });
+    if (filter !== null)
+      params.append('op_code', filter);
+    fetch(`http://127.0.0.1:8000/captures/${props.capture.id}/summaries?${params}`, { headers: { Accept: BINARY_MEDIA_TYPE } })
+      .then(resp => resp.ok ? resp.arrayBuffer().then(readSummaries) : {})
+      .then(body => {
+        if (!body.rows || (body.total === 0 && (filter !== null || errorsOnly))) {
+          alert("No Results!");
+          resetTableData();
+          return;
+        }
+        setCurrentFilter(filter);
+        setErrorOnly(errorsOnly);
+        setCurrentPage(page);
+        setTotalPages(Math.max(body.pages - 1, 0));
+        setDisplayContent(body.rows);
+      });
+  };
 
-  }, [props]);
+  useEffect(() => {
+    if (props.capture)
+      fetchPage(0, null, false);
+  }, [props.capture]); // eslint-disable-line react-hooks/exhaustive-deps
 
   const handleNextPage = () => {
-    if (currentPage !== totalPages) {
-      let nextPage = currentPage + 1;
-      setCurrentPage(nextPage);
-      if (currentFilter !== null)
-        filterEntityControl(currentFilter, paginatedData[nextPage]);
-      else
-        setDisplayContent(paginatedData[nextPage]);
-    }
+    if (currentPage !== totalPages)
+      fetchPage(currentPage + 1, currentFilter, errorOnly);
   };
 
   const handlePrevPage = () => {
-    if (currentPage !== 0) {
-      let nextPage = currentPage - 1;
-      setCurrentPage(nextPage);
-      if (currentFilter !== null)
-        filterEntityControl(currentFilter, paginatedData[nextPage]);
-      else
-        setDisplayContent(paginatedData[nextPage]);
-    }
+    if (currentPage !== 0)
+      fetchPage(currentPage - 1, currentFilter, errorOnly);
   };
 
   const handleDirectPage = (formData) => {
     formData.preventDefault();
     let value = formData.target[0].value;
-    if ((value >= 1) && (value <= (totalPages + 1))) {
-      setCurrentPage(value - 1);
-      if (currentFilter !== null)
-        filterEntityControl(currentFilter, paginatedData[value - 1]);
-      else
-        setDisplayContent(paginatedData[value - 1]);
-    }
+    if ((value >= 1) && (value <= (totalPages + 1)))
+      fetchPage(value - 1, currentFilter, errorOnly);
   };
 
-  const onExpand = (event) => {
-    setPacketInDetail(event);
-    handleShowTableModal();
+  // The layers of a packet are decoded on the server when its row is expanded
+  const onExpand = (row) => {
+    fetch(`http://127.0.0.1:8000/captures/${props.capture.id}/packets/${row.index}?output=compact`)
+      .then(resp => resp.text())
+      .then(text => {
+        setPacketInDetail(expandPacket(props.schema, JSON5.parse(text)));
+        handleShowTableModal();
+      });
   };
 
   const handleSubmitFilter = (formData) => {
     formData.preventDefault();
-    filterEntityControl(formData.target[0].value, paginatedData[currentPage]);
-  };
-
-  const filterEntityControl = (searchValue, packetList) => {
-    setCurrentFilter(searchValue);
-    const newState = [];
-    packetList.forEach(packet => {
-      let shouldAdd = false;
-      Object.keys(packet).forEach(packetKey => {
-        if (packet[packetKey]) {
-          if (packet[packetKey].op_code) {
-            if (String(packet[packetKey].op_code.value) === String(searchValue)) {
-              shouldAdd = true;
-            }
-          }
-        }
-      });
-      if (shouldAdd) {
-        newState.push(packet);
-      }
-    });
-    if (newState.length) {
-      setDisplayContent(newState);
-    } else {
-      alert("No Results!");
-      resetTableData();
-    }
+    const searchValue = formData.target[0].value;
+    fetchPage(0, searchValue === '' ? null : searchValue, formData.target[1].checked);
   };
 
   const resetTableData = () => {
-    setDisplayContent(paginatedData[currentPage]);
-    setCurrentFilter(null);
+    fetchPage(0, null, false);
   };
-  let i = 0;
   return (
     <React.Fragment>
       <div className='TableWrapper'>
@@ -128,6 +103,10 @@ function Table(props) {
             Filter Opcode:
             <input disabled={displayContent.length === 0} type="text" name="Filter" />
           </label>
+          <label style={{ marginLeft: '1%' }}>
+            Errors only:
+            <input disabled={displayContent.length === 0} type="checkbox" name="ErrorOnly" />
+          </label>
           <input disabled={displayContent.length === 0} type="submit" value="Submit" />
           <input disabled={displayContent.length === 0} type="reset" style={{ marginLeft: '1%' }} onClick={resetTableData} />
         </form>
@@ -147,17 +126,15 @@ function Table(props) {
                 </thead>
                 <tbody>
                   {displayContent.length !== 0 ?
-                    displayContent.map(packet => (
-                      <tr key={JSON.stringify(packet) + i} className={packet.packet_error ? 'Error' : 'NoError'}>
-                        <td><button onClick={() => { onExpand(packet); }}><FontAwesomeIcon icon={faPlus} /></button></td>
-                        <td style={{width: '10%'}}><div className="ErrorIconDiv">{packet.packet_error ? <img className="ErrorIconImg" src={ErrorIcon} alt="Error Found" /> : ''}</div></td>
+                    displayContent.map(row => (
+                      <tr key={row.index} className={row.packet_error ? 'Error' : 'NoError'}>
+                        <td><button onClick={() => { onExpand(row); }}><FontAwesomeIcon icon={faPlus} /></button></td>
+                        <td style={{width: '10%'}}><div className="ErrorIconDiv">{row.packet_error ? <img className="ErrorIconImg" src={ErrorIcon} alt="Error Found" /> : ''}</div></td>
                         {
                           Columns.map(col => (
-                            <td key={JSON.stringify(col) + ++i}>{
-                              packet[col.path[0]] ?
-                                packet[col.path[0]][col.path[1]] ?
-                                  packet[col.path[0]][col.path[1]].value
-                                  : null : null
+                            <td key={col.key}>{
+                              row[col.key] === null || Number.isNaN(row[col.key]) ? null
+                                : Array.isArray(row[col.key]) ? row[col.key].join(', ') : row[col.key]
                             }</td>
                           ))
                         }
@@ -170,7 +147,7 @@ function Table(props) {
           <TableModal handleClose={handleHideTableModal} packet={packetInDetail} show={showTableModal} />
         </div>
       </div>
-      <GraphContainer graphData={displayContent} />
+      <GraphContainer captureId={props.capture ? props.capture.id : null} />
       <div className="PageNav">
         <div className='PageButtons'>
           <button disabled={displayContent.length === 0} style={{ marginRight: '5%' }} onClick={handlePrevPage}>Prev</button>
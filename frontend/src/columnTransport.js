@@ -0,0 +1,38 @@
+// Reader of the binary responses sent to requests accepting BINARY_MEDIA_TYPE:
+// a little endian uint32 header length, the JSON header, then 8 byte aligned
+// column buffers wrapped here as typed arrays, without parsing each value.
+export const BINARY_MEDIA_TYPE = 'application/octet-stream';
+
+const TYPED_ARRAYS = {
+  int8: Int8Array,
+  uint8: Uint8Array,
+  int16: Int16Array,
+  uint16: Uint16Array,
+  int32: Int32Array,
+  uint32: Uint32Array,
+  float32: Float32Array,
+  float64: Float64Array,
+};
+
+// {header, column}, column(spec) being the typed array of a column of the header
+export const readColumns = buffer => {
+  const length = new DataView(buffer).getUint32(0, true);
+  const header = JSON.parse(new TextDecoder().decode(new Uint8Array(buffer, 4, length)));
+  const column = spec => new TYPED_ARRAYS[spec.type](buffer, 4 + length + spec.offset, spec.length);
+  return { header, column };
+};
+
+// The /summaries header with its columns as one object per row, NaN where a
+// packet has no value
+export const readSummaries = buffer => {
+  const { header, column } = readColumns(buffer);
+  const names = Object.keys(header.columns);
+  const columns = names.map(name => header.columns[name].values || column(header.columns[name]));
+  const rows = [];
+  for (let row = 0; row < header.columns.index.length; ++row) {
+    const summary = {};
+    names.forEach((name, i) => { summary[name] = columns[i][row]; });
+    rows.push(summary);
+  }
+  return { ...header, rows: rows };
+};
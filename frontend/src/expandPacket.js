@@ -0,0 +1,29 @@
+// Rebuilds the full layer view from a compact packet and the /schema fields,
+// a list of every packet of each layer type
+const expandPacket = (schema, compact) => {
+  const packet = compact.packet_error ? { packet_error: true } : {};
+  Object.keys(compact).forEach(layerKey => {
+    if (layerKey === 'errors' || layerKey === 'packet_error')
+      return;
+    const layerErrors = (compact.errors && compact.errors[layerKey]) || {};
+    packet[layerKey] = compact[layerKey].map((values, position) => {
+      const errors = layerErrors[position] || {};
+      const layer = {};
+      schema[layerKey].fields.forEach((field, i) => {
+        layer[field.name] = {
+          value: values[i],
+          valid: !(field.name in errors),
+          valid_range: field.valid_range,
+          validator: field.validator,
+          error_msg: errors[field.name] || '',
+        };
+        if (field.name === 'control_size')
+          layer.control_error = Object.keys(errors).length > 0;
+      });
+      return layer;
+    });
+  });
+  return packet;
+};
+
+export default expandPacket;
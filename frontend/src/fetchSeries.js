@@ -0,0 +1,32 @@
+import { BINARY_MEDIA_TYPE, readColumns } from './columnTransport';
+
+// Points kept per series, the server reduces longer series with LTTB
+const SERIES_POINTS = 1000;
+
+// Fetches y against x for a capture as Chart.js {x, y} points, with the entity
+// they describe. window.min and window.max zoom into a range of x, sampled again
+// at full resolution, and window.entityId picks the entity, the server defaulting
+// to the lowest so that several entities are never drawn as one line.
+const fetchSeries = (captureId, x, y, window) => {
+  const params = new URLSearchParams({ x: x, y: y, points: SERIES_POINTS });
+  if (window.min !== null)
+    params.append('x_min', window.min);
+  if (window.max !== null)
+    params.append('x_max', window.max);
+  if (window.entityId !== null)
+    params.append('entity_id', window.entityId);
+  return fetch(`http://127.0.0.1:8000/captures/${captureId}/series?${params}`, { headers: { Accept: BINARY_MEDIA_TYPE } })
+    .then(resp => resp.arrayBuffer())
+    .then(buffer => {
+      // float64 x and y columns
+      const { header, column } = readColumns(buffer);
+      const xs = column(header.x);
+      const ys = column(header.y);
+      const points = [];
+      for (let i = 0; i < xs.length; ++i)
+        points.push({ x: xs[i], y: ys[i] });
+      return { entityId: header.entity_id, points: points };
+    });
+};
+
+export default fetchSeries;